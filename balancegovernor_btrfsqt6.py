@@ -0,0 +1,238 @@
+import time
+from dataclasses import dataclass, asdict, fields
+from PyQt6.QtCore import QObject, QSettings, QTimer, pyqtSignal
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, QUERY_TIMEOUT, describe_finish
+from iopressure_btrfsqt6 import (
+    PSI_IO, DISKSTATS, read_psi, read_diskstats, PressureTracker, DiskLatencyTracker
+)
+
+
+@dataclass(slots=True)
+class GovernorSettings:
+    # Pause when either signal reaches its pause level...
+    psi_pause: float = 40.0
+    await_pause_ms: float = 100.0
+    # ...and resume once both stay at or below their resume level for cooldown seconds
+    psi_resume: float = 10.0
+    await_resume_ms: float = 30.0
+    cooldown: float = 60.0
+    interval: float = 2.0
+    # "some" (any task stalled on I/O) or "full" (all non-idle tasks stalled)
+    psi_kind: str = "some"
+
+
+def settings_key(mount_point):
+    """QSettings group for a mount point; "/" separates groups, so it is escaped."""
+    return "balance_governor/" + (mount_point.strip("/").replace("/", "%2F") or "%2F")
+
+
+def load_governor_settings(mount_point, settings=None):
+    """Read the tunables stored for mount_point, falling back to the defaults."""
+    settings = settings or QSettings("btrfs-progs-gui", "btrfs-progs-gui")
+    values = GovernorSettings()
+    settings.beginGroup(settings_key(mount_point))
+    for item in fields(GovernorSettings):
+        default = getattr(values, item.name)
+        stored = settings.value(item.name, default)
+        try:
+            setattr(values, item.name, type(default)(stored))
+        except (TypeError, ValueError):
+            pass
+    settings.endGroup()
+    return values
+
+
+def save_governor_settings(mount_point, values, settings=None):
+    settings = settings or QSettings("btrfs-progs-gui", "btrfs-progs-gui")
+    settings.beginGroup(settings_key(mount_point))
+    for name, value in asdict(values).items():
+        settings.setValue(name, value)
+    settings.endGroup()
+
+
+class PressurePolicy:
+    """Pause/resume decisions with hysteresis.
+
+    decide() returns ("pause" | "resume" | None, reason). Separate pause and
+    resume levels plus the cool-down keep the balance from flapping when
+    pressure hovers around a single threshold.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.calm_since = None
+
+    def decide(self, pressure, await_ms, paused, now=None):
+        now = time.monotonic() if now is None else now
+        settings = self.settings
+        high = []
+        if pressure is not None and pressure >= settings.psi_pause:
+            high.append(f"I/O pressure {pressure:.1f}% >= {settings.psi_pause:g}%")
+        if await_ms >= settings.await_pause_ms:
+            high.append(f"await {await_ms:.1f} ms >= {settings.await_pause_ms:g} ms")
+
+        calm = (pressure is None or pressure <= settings.psi_resume) and \
+            await_ms <= settings.await_resume_ms
+        if not calm:
+            self.calm_since = None
+        elif self.calm_since is None:
+            self.calm_since = now
+
+        if not paused:
+            if high:
+                return "pause", ", ".join(high)
+            return None, ""
+        if self.calm_since is not None and now - self.calm_since >= settings.cooldown:
+            return "resume", f"pressure below resume levels for {now - self.calm_since:.0f}s"
+        return None, ""
+
+
+class BalanceGovernor(QObject):
+    """Pause a running balance while the member devices are under I/O pressure.
+
+    The governor only resumes balances it paused itself; a pause requested
+    by the user is left alone. The balance state has to be fed in through
+    balance_transition(), normally from a BalanceWatcher.
+
+    `balance resume` only exits once the balance ends or is paused again,
+    and killing it cancels the balance, so it runs on a runner of its own
+    without a timeout that is never cancelled. Whether it took effect is
+    learnt from the "resumed" transition, not from its exit.
+    """
+
+    log = pyqtSignal(str)
+    decision = pyqtSignal(str, str)
+
+    def __init__(self, parent=None, btrfs=("btrfs",), psi_path=PSI_IO, diskstats_path=DISKSTATS):
+        super().__init__(parent)
+        self.btrfs = list(btrfs)
+        self.psi_path = psi_path
+        self.diskstats_path = diskstats_path
+        self.path = ""
+        self.devices = []
+        self.settings = GovernorSettings()
+        self.policy = None
+        self.pressure = None
+        self.latency = None
+        self.balance_state = "none"
+        self.paused_by_governor = False
+        self.active = False
+
+        # balance pause
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.command_finished.connect(self.command_finished)
+        self.errors = ""
+        self.runner.error_received.connect(self.error_received)
+
+        # balance resume, running as long as the resumed balance does
+        self.resume_runner = BtrfsCommandRunner(self)
+        self.resume_runner.command_finished.connect(self.resume_finished)
+        self.resume_errors = ""
+        self.resume_runner.error_received.connect(self.resume_error_received)
+
+        self.sample_timer = QTimer(self)
+        self.sample_timer.timeout.connect(self.sample)
+
+    def is_active(self):
+        return self.active
+
+    def start(self, path, devices, settings=None, balance_state="none"):
+        """Govern the balance on path; devices are kernel names as in /proc/diskstats."""
+        self.stop()
+        self.balance_state = balance_state
+        self.path = path
+        self.devices = list(devices)
+        self.settings = settings or load_governor_settings(path)
+        self.policy = PressurePolicy(self.settings)
+        self.pressure = PressureTracker(self.settings.psi_kind)
+        self.latency = DiskLatencyTracker()
+        self.paused_by_governor = False
+        self.active = True
+
+        signals = []
+        if read_psi(self.psi_path):
+            signals.append(f"PSI ({self.settings.psi_kind})")
+        if self.devices:
+            signals.append("await of " + ", ".join(self.devices))
+        if not signals:
+            self.log.emit("Governor: neither PSI nor member device statistics are available.")
+        else:
+            self.log.emit(f"Governor on {path}: watching {' and '.join(signals)}")
+        self.sample_timer.start(int(self.settings.interval * 1000))
+        self.sample()
+
+    def stop(self):
+        """Stop governing; a balance the governor paused is resumed first."""
+        self.sample_timer.stop()
+        if self.active and self.paused_by_governor and self.balance_state == "paused":
+            self.log.emit(f"Governor: resume balance on {self.path}: governor stopped")
+            self.resume()
+        self.active = False
+
+    def balance_transition(self, transition):
+        """Follow the balance state as reported by BalanceWatcher.transition.
+
+        Transitions are used rather than raw samples because a sample taken
+        just before our own pause may arrive after it.
+        """
+        if transition == "paused":
+            self.balance_state = "paused"
+            return
+        # Started, resumed (by us or anyone else), or gone: any pause of ours is over
+        self.paused_by_governor = False
+        self.balance_state = "running" if transition in ("started", "resumed") else "none"
+
+    def sample(self, now=None):
+        if not self.active:
+            return
+        now = time.monotonic() if now is None else now
+        pressure = self.pressure.update(read_psi(self.psi_path), now)
+        latencies = self.latency.update(read_diskstats(set(self.devices), self.diskstats_path), now)
+        worst = max(latencies, key=lambda latency: latency.await_ms, default=None)
+        await_ms = worst.await_ms if worst else 0.0
+
+        paused = self.balance_state == "paused" and self.paused_by_governor
+        if self.balance_state != "running" and not paused:
+            # Nothing to govern: no balance, or a pause the user asked for
+            self.policy.decide(pressure, await_ms, False, now)
+            return
+        action, reason = self.policy.decide(pressure, await_ms, paused, now)
+        if action is None:
+            return
+        if (self.runner if action == "pause" else self.resume_runner).is_running():
+            return
+
+        if worst is not None and "await" in reason:
+            reason += f" on {worst.name}"
+        self.decision.emit(action, reason)
+        self.log.emit(f"Governor: {action} balance on {self.path}: {reason}")
+        if action == "resume":
+            self.resume()
+            return
+        self.paused_by_governor = True
+        self.errors = ""
+        self.runner.run(self.btrfs + ["balance", "pause", self.path], QUERY_TIMEOUT)
+
+    def resume(self):
+        self.resume_errors = ""
+        self.resume_runner.run(self.btrfs + ["balance", "resume", self.path])
+
+    def error_received(self, text):
+        self.errors += text
+
+    def resume_error_received(self, text):
+        self.resume_errors += text
+
+    def command_finished(self, exit_code, status):
+        if exit_code == 0:
+            self.balance_state = "paused"
+            return
+        message = self.errors.strip() or describe_finish(exit_code, status)
+        self.log.emit(f"Governor: balance pause failed: {message}")
+        self.paused_by_governor = False
+
+    def resume_finished(self, exit_code, status):
+        # The resumed balance ended; a later pause (ours or the user's) also ends it
+        message = self.resume_errors.strip()
+        if exit_code != 0 and "by user" not in message:
+            self.log.emit(f"Governor: balance resume failed: {message or describe_finish(exit_code, status)}")
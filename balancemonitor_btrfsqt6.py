@@ -0,0 +1,171 @@
+import time
+from dataclasses import dataclass
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, QUERY_TIMEOUT
+from btrfsparsers_btrfsqt6 import BalanceStatusParser
+
+
+@dataclass(slots=True)
+class BalanceProgress:
+    state: str
+    completed: int
+    total: int
+    considered: int
+    percent_left: int
+    chunks_per_minute: float
+    eta: float
+
+
+class BalanceProgressTracker:
+    """Smooth the chunk rate of a balance and detect state transitions.
+
+    update() returns the progress record and, when the state changed since
+    the last sample, the name of the transition: "started", "paused",
+    "resumed", "cancelled" or "completed".
+    """
+
+    # Weight of the newest sample in the smoothed rate
+    SMOOTHING = 0.3
+
+    def __init__(self):
+        self.state = None
+        self.last_time = None
+        self.last_completed = 0
+        self.rate = 0.0
+        self.cancel_seen = False
+
+    def update(self, status, now=None):
+        now = time.monotonic() if now is None else now
+        transition = None
+
+        if status.state == "running":
+            if self.state == "running" and self.last_time is not None and now > self.last_time:
+                # The completed counter restarts if a new balance was started in between
+                done = max(status.completed - self.last_completed, 0)
+                sample = done / (now - self.last_time) * 60
+                self.rate = sample if self.rate == 0 else \
+                    self.SMOOTHING * sample + (1 - self.SMOOTHING) * self.rate
+            if self.state == "paused":
+                transition = "resumed"
+            elif self.state != "running":
+                transition = "started"
+        elif status.state == "paused" and self.state != "paused":
+            transition = "paused"
+        elif status.state == "none" and self.state in ("running", "paused"):
+            # Once the balance is gone, status no longer says how it ended
+            transition = "cancelled" if self.cancel_seen or self.state == "paused" else "completed"
+
+        if status.cancel_requested:
+            self.cancel_seen = True
+        if status.state == "none":
+            self.cancel_seen = False
+            self.rate = 0.0
+
+        self.state = status.state
+        self.last_time = now
+        self.last_completed = status.completed
+
+        remaining = max(status.total - status.completed, 0)
+        if status.state == "running" and self.rate > 0:
+            eta = remaining / self.rate * 60
+        else:
+            eta = -1.0
+        progress = BalanceProgress(status.state, status.completed, status.total, status.considered,
+                                   status.percent_left, self.rate, eta)
+        return progress, transition
+
+
+class BalanceWatcher(QObject):
+    """Poll `btrfs balance status -v` in the background while a balance runs."""
+
+    progress = pyqtSignal(object)
+    transition = pyqtSignal(str)
+    watch_error = pyqtSignal(str)
+
+    POLL_INTERVAL = 5
+
+    def __init__(self, parent=None, btrfs=("btrfs",), interval=POLL_INTERVAL):
+        super().__init__(parent)
+        self.btrfs = list(btrfs)
+        self.path = ""
+        self.tracker = None
+        self.parser = None
+        self.errors = ""
+        self.finishing = False
+        self.poll_again = False
+
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.output_received)
+        self.runner.error_received.connect(self.error_received)
+        self.runner.command_finished.connect(self.command_finished)
+
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(int(interval * 1000))
+        self.poll_timer.timeout.connect(self.poll)
+
+    def is_active(self):
+        return self.tracker is not None
+
+    def start(self, path):
+        if self.tracker is not None and self.path == path:
+            return
+        self.stop()
+        self.path = path
+        self.tracker = BalanceProgressTracker()
+        self.finishing = False
+        self.poll_again = False
+        self.poll_timer.start()
+        self.poll()
+
+    def stop(self):
+        self.poll_timer.stop()
+        self.tracker = None
+        self.runner.cancel()
+
+    def finish(self):
+        """Take one last sample to catch the final transition, then stop.
+
+        Used when the `balance start` that was being watched has exited.
+        """
+        if self.tracker is None:
+            return
+        self.finishing = True
+        self.poll_timer.stop()
+        if self.runner.is_running():
+            # The sample in flight may predate the exit; take another one after it
+            self.poll_again = True
+        else:
+            self.poll()
+
+    def poll(self):
+        if self.tracker is not None and not self.runner.is_running():
+            self.parser = BalanceStatusParser()
+            self.errors = ""
+            self.runner.run(self.btrfs + ["balance", "status", "-v", self.path], QUERY_TIMEOUT)
+
+    def output_received(self, text):
+        self.parser.feed_text(text)
+
+    def error_received(self, text):
+        self.errors += text
+
+    def command_finished(self, exit_code, status):
+        if self.tracker is None:
+            return
+        # balance status exits with 1 while a balance is running or paused
+        if exit_code not in (0, 1):
+            self.watch_error.emit(self.errors.strip() or f"balance status exited with status {exit_code}")
+            return
+
+        progress, transition = self.tracker.update(self.parser.finish())
+        self.progress.emit(progress)
+        if transition:
+            self.transition.emit(transition)
+        if transition in ("cancelled", "completed"):
+            self.stop()
+        elif self.finishing:
+            if self.poll_again:
+                self.poll_again = False
+                self.poll()
+            else:
+                self.stop()
@@ -0,0 +1,168 @@
+from PyQt6.QtCore import QObject, pyqtSignal
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, QUERY_TIMEOUT, describe_finish
+from btrfsparsers_btrfsqt6 import FilesystemUsageParser, format_bytes
+
+
+def usage_thresholds(cap):
+    """Usage filter steps 0, 5, 10, 20, 30, ... up to and including cap percent."""
+    steps = [0, 5]
+    while steps[-1] < cap:
+        steps.append(steps[-1] + 5 if steps[-1] < 10 else steps[-1] + 10)
+    return [step for step in steps if step < cap] + [cap]
+
+
+def balance_filter(usage, limit=None, devid=None):
+    """Build a balance filter string such as "usage=10,limit=4,devid=2"."""
+    parts = [f"usage={usage}"]
+    if limit:
+        parts.append(f"limit={limit}")
+    if devid:
+        parts.append(f"devid={devid}")
+    return ",".join(parts)
+
+
+class IncrementalBalance(QObject):
+    """Balance with increasing usage filters until enough space is unallocated.
+
+    Each step relocates only the block groups at most N percent full, which
+    packs nearly-empty chunks together at a fraction of the I/O of a full
+    balance. After every step `filesystem usage -b` is read again and the
+    run stops as soon as the unallocated target is met or the cap is reached.
+
+    A step that is paused (by the user or a BalanceGovernor) makes its
+    `balance start` exit; the run is then suspended and continues with the
+    next step once balance_transition() reports the balance completed.
+    """
+
+    log = pyqtSignal(str)
+    step_started = pyqtSignal(int, int)
+    finished = pyqtSignal(bool, str)
+
+    def __init__(self, parent=None, btrfs=("btrfs",)):
+        super().__init__(parent)
+        self.btrfs = list(btrfs)
+        self.path = ""
+        self.target = 0
+        self.thresholds = []
+        self.step = 0
+        self.limit = None
+        self.devid = None
+        self.metadata = True
+        self.active = False
+        self.suspended = False
+        self.parser = None
+        self.errors = ""
+
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.output_received)
+        self.runner.error_received.connect(self.error_received)
+        self.runner.command_finished.connect(self.command_finished)
+
+    def is_active(self):
+        return self.active
+
+    def start(self, path, target_unallocated, cap=50, limit=None, devid=None, metadata=True):
+        if self.active:
+            return False
+        self.path = path
+        self.target = target_unallocated
+        self.thresholds = usage_thresholds(cap)
+        self.step = 0
+        self.limit = limit
+        self.devid = devid
+        self.metadata = metadata
+        self.active = True
+        self.suspended = False
+        self.log.emit(f"Incremental balance on {path}: goal {format_bytes(target_unallocated)} "
+                      f"unallocated, usage steps {', '.join(map(str, self.thresholds))}")
+        self.check_usage()
+        return True
+
+    def stop(self):
+        """Stop after cancelling the step that is running now."""
+        if self.active:
+            self.active = False
+            self.runner.cancel()
+            message = "Incremental balance stopped."
+            if self.suspended:
+                message += " The paused step is left paused."
+            self.suspended = False
+            self.finished.emit(False, message)
+
+    def check_usage(self):
+        self.parser = FilesystemUsageParser()
+        self.run(self.btrfs + ["filesystem", "usage", "-b", self.path], QUERY_TIMEOUT)
+
+    def run_step(self):
+        usage = self.thresholds[self.step]
+        command = self.btrfs + ["balance", "start",
+                                f"-d{balance_filter(usage, self.limit, self.devid)}"]
+        if self.metadata:
+            command.append(f"-m{balance_filter(usage, self.limit, self.devid)}")
+        command.append(self.path)
+
+        self.parser = None
+        self.step_started.emit(self.step + 1, len(self.thresholds))
+        self.log.emit(f"Step {self.step + 1}/{len(self.thresholds)}: {' '.join(command)}")
+        self.run(command)
+
+    def run(self, command, timeout=None):
+        self.errors = ""
+        self.runner.run(command, timeout)
+
+    def output_received(self, text):
+        if self.parser is not None:
+            self.parser.feed_text(text)
+        else:
+            self.log.emit(text.rstrip("\n"))
+
+    def error_received(self, text):
+        self.errors += text
+
+    def command_finished(self, exit_code, status):
+        if not self.active:
+            return
+
+        if self.parser is None and "paused by user" in self.errors:
+            self.suspended = True
+            self.log.emit(f"Step {self.step + 1}/{len(self.thresholds)} paused; "
+                          f"it continues when the balance is resumed.")
+            return
+
+        if exit_code != 0:
+            self.active = False
+            message = self.errors.strip() or describe_finish(exit_code, status)
+            self.finished.emit(False, f"Incremental balance failed: {message}")
+            return
+
+        if self.parser is None:
+            # A balance step finished; measure what it reclaimed
+            self.step += 1
+            self.check_usage()
+            return
+
+        unallocated = self.parser.finish().device_unallocated
+        self.log.emit(f"Unallocated: {format_bytes(unallocated)} (goal {format_bytes(self.target)})")
+        if unallocated >= self.target:
+            self.active = False
+            self.finished.emit(True, "Unallocated space goal reached.")
+        elif self.step >= len(self.thresholds):
+            self.active = False
+            self.finished.emit(False, "Usage cap reached before the unallocated space goal.")
+        else:
+            self.run_step()
+
+    def balance_transition(self, transition):
+        """Follow BalanceWatcher.transition to continue after a paused step."""
+        if not self.active or not self.suspended:
+            return
+        if transition == "resumed":
+            self.log.emit(f"Step {self.step + 1}/{len(self.thresholds)} resumed.")
+        elif transition == "completed":
+            self.suspended = False
+            self.step += 1
+            self.check_usage()
+        elif transition == "cancelled":
+            self.active = False
+            self.suspended = False
+            self.finished.emit(False, "Incremental balance failed: the paused step was cancelled.")
@@ -0,0 +1,170 @@
+"""Throughput benchmark for the streaming parsers in btrfsparsers_btrfsqt6.
+
+Builds large synthetic outputs in memory, feeds them in 64 KiB chunks the
+way BtrfsCommandRunner delivers them and reports lines per second. Exits
+with status 1 when a parser falls below its target or, where a case has a
+check, returns the wrong result.
+
+    python benchmarks/bench_parsers.py [--lines N] [--repeat N]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from btrfsparsers_btrfsqt6 import (  # noqa: E402
+    SubvolumeListParser, QgroupShowParser, DeviceStatsParser, DeviceUsageParser,
+    FilesystemDfParser, FilesystemUsageParser, ScrubStatusParser,
+)
+
+CHUNK_SIZE = 65536
+
+# Minimum lines per second on one core. The headline target: a 200k-line
+# `subvolume list` (or qgroup table) parses in under a second.
+TARGETS = {
+    "subvolume list -puqR": 250000,
+    "qgroup show --raw -pcre": 250000,
+    "qgroup show (6.x header)": 250000,
+    "device stats": 200000,
+    "device usage -b": 200000,
+    "filesystem usage -b -T": 200000,
+    "filesystem df -b": 200000,
+    "scrub status -R -d": 200000,
+}
+
+
+def subvolume_list(lines):
+    return "".join(
+        f"ID {256 + i} gen {1000 + i} parent 5 top level 5 parent_uuid - received_uuid - "
+        f"uuid 6a1d2c3e-{i:04x}-4f5e-9a8b-{i:012x} path snapshots/daily/{i // 1000}/snap-{i}\n"
+        for i in range(lines))
+
+
+def qgroup_show(lines):
+    header = ("qgroupid         rfer         excl     max_rfer     max_excl parent  child\n"
+              "--------         ----         ----     --------     --------  ------  -----\n")
+    return header + "".join(
+        f"0/{256 + i} {16384 * (i % 97 + 1)} {4096 * (i % 13 + 1)} none none 1/{i % 50} -\n"
+        for i in range(lines))
+
+
+def qgroup_show_long(lines):
+    """btrfs-progs 6.x: spelled-out column names and a trailing path column."""
+    header = ("Qgroupid    Referenced    Exclusive Max referenced Max exclusive Parent  Child   Path \n"
+              "--------    ----------    --------- -------------- ------------- ------  -----   ---- \n")
+    return header + "".join(
+        f"0/{256 + i} {16384 * (i % 97 + 1)} {4096 * (i % 13 + 1)} {1 << 30} none 1/{i % 50} - "
+        f"snapshots/daily {i}\n"
+        for i in range(lines))
+
+
+def check_qgroup_show_long(qgroups, lines):
+    last = qgroups[-1] if qgroups else None
+    return len(qgroups) == lines and last.max_rfer == 1 << 30 and last.max_excl == 0 and \
+        last.excl == 4096 * ((lines - 1) % 13 + 1) and last.path == f"snapshots/daily {lines - 1}"
+
+
+def device_stats(lines):
+    counters = ("write_io_errs", "read_io_errs", "flush_io_errs", "corruption_errs", "generation_errs")
+    return "".join(f"[/dev/sd{i // 5}].{counters[i % 5]}   {i % 3}\n" for i in range(lines))
+
+
+def device_usage(lines):
+    blocks = []
+    for i in range(lines // 7):
+        blocks.append(f"/dev/vd{i}, ID: {i + 1}\n   Device size:   10737418240\n"
+                      f"   Device slack:            0\n   Data,single:    8388608\n"
+                      f"   Metadata,DUP:  268435456\n   Unallocated: 10452205568\n\n")
+    return "".join(blocks)
+
+
+def filesystem_usage(lines):
+    header = ("Overall:\n    Device size:    21474836480\n    Device unallocated:  19297992704\n\n"
+              "            Data       Metadata  System\n"
+              "Id Path     RAID1      RAID1     RAID1    Unallocated Total       Slack\n"
+              "-- -------- ---------- --------- -------- ----------- ----------- -----\n")
+    return header + "".join(
+        f"{i + 1:>2} /dev/vd{i} 1073741824 14680064 8388608 9648996352 10737418240 0\n"
+        for i in range(lines))
+
+
+def filesystem_df(lines):
+    kinds = ("Data, single", "System, DUP", "Metadata, DUP", "GlobalReserve, single")
+    return "".join(f"{kinds[i % 4]}: total={8388608 * (i + 1)}, used={16384 * i}\n" for i in range(lines))
+
+
+def scrub_status(lines):
+    blocks = []
+    for i in range(lines // 20):
+        blocks.append(f"Scrub device /dev/vd{i} (id {i + 1}) status\nStatus: running\nDuration: 0:10:00\n"
+                      + "".join(f"\t{name}: {i}\n" for name in (
+                          "data_extents_scrubbed", "tree_extents_scrubbed", "data_bytes_scrubbed",
+                          "tree_bytes_scrubbed", "read_errors", "csum_errors", "verify_errors",
+                          "no_csum", "csum_discards", "super_errors", "malloc_errors",
+                          "uncorrectable_errors", "unverified_errors", "corrected_errors",
+                          "last_physical", "extra_a", "extra_b")))
+    return "".join(blocks)
+
+
+def check_scrub_status(devices, lines):
+    last = devices[-1] if devices else None
+    return len(devices) == lines // 20 and last.path == f"/dev/vd{lines // 20 - 1}" and last.duration == 600
+
+
+# Result checks, called with the parser result and the number of fixture lines
+CHECKS = {
+    "qgroup show (6.x header)": check_qgroup_show_long,
+    "scrub status -R -d": check_scrub_status,
+}
+
+CASES = [
+    ("subvolume list -puqR", SubvolumeListParser, subvolume_list),
+    ("qgroup show --raw -pcre", QgroupShowParser, qgroup_show),
+    ("qgroup show (6.x header)", QgroupShowParser, qgroup_show_long),
+    ("device stats", DeviceStatsParser, device_stats),
+    ("device usage -b", DeviceUsageParser, device_usage),
+    ("filesystem usage -b -T", FilesystemUsageParser, filesystem_usage),
+    ("filesystem df -b", FilesystemDfParser, filesystem_df),
+    ("scrub status -R -d", ScrubStatusParser, scrub_status),
+]
+
+
+def run_case(parser_class, text, repeat):
+    """Best time of repeat runs, feeding text in runner-sized chunks, and the last result."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parser = parser_class()
+        for offset in range(0, len(text), CHUNK_SIZE):
+            parser.feed_text(text[offset:offset + CHUNK_SIZE])
+        result = parser.finish()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=200000, help="synthetic lines per fixture")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per parser, the best is kept")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'parser':<26}{'lines':>10}{'seconds':>10}{'lines/s':>12}{'target':>10}")
+    for name, parser_class, fixture in CASES:
+        text = fixture(args.lines)
+        lines = text.count("\n")
+        elapsed, result = run_case(parser_class, text, args.repeat)
+        rate = lines / elapsed
+        ok = rate >= TARGETS[name]
+        correct = name not in CHECKS or CHECKS[name](result, args.lines)
+        failed = failed or not ok or not correct
+        print(f"{name:<26}{lines:>10}{elapsed:>10.3f}{rate:>12,.0f}{TARGETS[name]:>10,}"
+              f"{'' if ok else '  BELOW TARGET'}{'' if correct else '  WRONG RESULT'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
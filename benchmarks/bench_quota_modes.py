@@ -0,0 +1,207 @@
+"""Quota accounting overhead benchmark on loop-device btrfs filesystems.
+
+For each accounting mode (quotas off, full qgroups, simple quotas) a fresh
+filesystem is made on a sparse loop file. On it the script
+
+  1. writes a data set into a subvolume and takes snapshots of it, each
+     followed by overwrites so the snapshots share some extents and not
+     others, then
+  2. measures 4 KiB write+fsync latency while every snapshot is deleted
+     with one `subvolume delete --commit-after` and the cleaner drains
+     (`subvolume sync`).
+
+It reports write latency percentiles and the time until the deleted
+snapshots are cleaned. Needs root, btrfs-progs, mkfs.btrfs and losetup;
+simple quotas also need btrfs-progs and Linux 6.7 or newer.
+
+    sudo python benchmarks/bench_quota_modes.py [--size 4G] [--snapshots 50]
+        [--files 2000] [--modes off,full,simple] [--workdir /var/tmp] [--json out.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from quotamode_btrfsqt6 import kernel_supports_simple_quota, quota_enable_command  # noqa: E402
+
+MODES = ("off", "full", "simple")
+REQUIRED_TOOLS = ("btrfs", "mkfs.btrfs", "losetup", "mount", "umount")
+
+
+def run(*argv):
+    return subprocess.run(argv, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True).stdout
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class LoopFilesystem:
+    """A btrfs filesystem on a sparse file, torn down on exit."""
+
+    def __init__(self, workdir, size):
+        self.workdir = workdir
+        self.size = size
+        self.image = None
+        self.device = None
+        self.mount_point = None
+
+    def __enter__(self):
+        handle, self.image = tempfile.mkstemp(prefix="quota-bench-", suffix=".img", dir=self.workdir)
+        os.close(handle)
+        run("truncate", "-s", self.size, self.image)
+        self.device = run("losetup", "--find", "--show", self.image).strip()
+        run("mkfs.btrfs", "-q", "-f", self.device)
+        self.mount_point = tempfile.mkdtemp(prefix="quota-bench-", dir=self.workdir)
+        run("mount", self.device, self.mount_point)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.mount_point:
+            subprocess.run(["umount", self.mount_point], check=False)
+            os.rmdir(self.mount_point)
+        if self.device:
+            subprocess.run(["losetup", "-d", self.device], check=False)
+        if self.image:
+            os.unlink(self.image)
+
+
+def write_files(directory, count, size, seed):
+    block = (seed.to_bytes(8, "little") * (size // 8 + 1))[:size]
+    for index in range(count):
+        with open(os.path.join(directory, f"file-{index}"), "wb") as output:
+            output.write(block)
+
+
+def prepare(fs, files, snapshots):
+    source = os.path.join(fs.mount_point, "data")
+    run("btrfs", "subvolume", "create", source)
+    write_files(source, files, 64 * 1024, 1)
+    os.makedirs(os.path.join(fs.mount_point, "snapshots"))
+    paths = []
+    for index in range(snapshots):
+        path = os.path.join(fs.mount_point, "snapshots", f"snap-{index}")
+        run("btrfs", "subvolume", "snapshot", "-r", source, path)
+        paths.append(path)
+        # Rewrite a slice so every snapshot keeps some extents of its own
+        start = index * files // snapshots
+        for name in range(start, start + max(files // snapshots, 1)):
+            with open(os.path.join(source, f"file-{name % files}"), "r+b") as output:
+                output.write(os.urandom(64 * 1024))
+    run("btrfs", "filesystem", "sync", fs.mount_point)
+    return paths
+
+
+def measure_writes(path, stop, latencies):
+    """Append 4 KiB and fsync in a loop, recording each latency, until stop is set."""
+    block = os.urandom(4096)
+    with open(path, "ab") as output:
+        while not stop.is_set():
+            start = time.perf_counter()
+            output.write(block)
+            output.flush()
+            os.fsync(output.fileno())
+            latencies.append(time.perf_counter() - start)
+
+
+def bench_mode(mode, args):
+    with LoopFilesystem(args.workdir, args.size) as fs:
+        if mode != "off":
+            run("btrfs", *quota_enable_command(fs.mount_point, mode))
+            if mode == "full":
+                run("btrfs", "quota", "rescan", "-w", fs.mount_point)
+        snapshots = prepare(fs, args.files, args.snapshots)
+
+        # Baseline write latency without deletions
+        baseline = []
+        stop = threading.Event()
+        writer = threading.Thread(target=measure_writes,
+                                  args=(os.path.join(fs.mount_point, "baseline.log"), stop, baseline))
+        writer.start()
+        time.sleep(args.baseline)
+        stop.set()
+        writer.join()
+
+        latencies = []
+        stop = threading.Event()
+        writer = threading.Thread(target=measure_writes,
+                                  args=(os.path.join(fs.mount_point, "writes.log"), stop, latencies))
+        writer.start()
+        start = time.perf_counter()
+        run("btrfs", "subvolume", "delete", "--commit-after", *snapshots)
+        deleted = time.perf_counter() - start
+        run("btrfs", "subvolume", "sync", fs.mount_point)
+        cleaned = time.perf_counter() - start
+        stop.set()
+        writer.join()
+
+    return {
+        "mode": mode,
+        "delete_seconds": deleted,
+        "cleaned_seconds": cleaned,
+        "baseline_p50_ms": percentile(baseline, 0.5) * 1000,
+        "baseline_p99_ms": percentile(baseline, 0.99) * 1000,
+        "write_p50_ms": percentile(latencies, 0.5) * 1000,
+        "write_p99_ms": percentile(latencies, 0.99) * 1000,
+        "write_max_ms": max(latencies, default=0.0) * 1000,
+        "writes": len(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="4G", help="loop file size")
+    parser.add_argument("--snapshots", type=int, default=50, help="snapshots to delete")
+    parser.add_argument("--files", type=int, default=2000, help="64 KiB files in the data set")
+    parser.add_argument("--baseline", type=float, default=5.0, help="seconds of baseline writes")
+    parser.add_argument("--modes", default=",".join(MODES), help="comma-separated: off, full, simple")
+    parser.add_argument("--workdir", default="/var/tmp", help="where the loop files go")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"unknown mode: {', '.join(unknown)}")
+    if os.geteuid() != 0:
+        print("This benchmark creates loop devices and must run as root.", file=sys.stderr)
+        return 2
+    missing = [tool for tool in REQUIRED_TOOLS if shutil.which(tool) is None]
+    if missing:
+        print(f"Missing tools: {', '.join(missing)}", file=sys.stderr)
+        return 2
+    if "simple" in modes and not kernel_supports_simple_quota():
+        print("Skipping simple quotas: the kernel does not support them.", file=sys.stderr)
+        modes.remove("simple")
+
+    results = []
+    print(f"{'mode':<8}{'delete s':>10}{'cleaned s':>11}{'base p99':>10}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'max ms':>9}{'writes':>8}")
+    for mode in modes:
+        try:
+            result = bench_mode(mode, args)
+        except subprocess.CalledProcessError as error:
+            print(f"{mode:<8}failed: {' '.join(error.cmd)}: {error.stderr.strip()}", file=sys.stderr)
+            continue
+        results.append(result)
+        print(f"{mode:<8}{result['delete_seconds']:>10.2f}{result['cleaned_seconds']:>11.2f}"
+              f"{result['baseline_p99_ms']:>10.2f}{result['write_p50_ms']:>9.2f}{result['write_p99_ms']:>9.2f}"
+              f"{result['write_max_ms']:>9.2f}{result['writes']:>8}")
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+    return 0 if len(results) == len(modes) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
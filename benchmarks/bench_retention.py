@@ -0,0 +1,65 @@
+"""Planning-time benchmark for the snapshot retention engine.
+
+Builds a synthetic inventory of timestamped snapshots, one every few
+minutes, and times plan_retention() on it. Exits with status 1 when
+planning takes longer than the target.
+
+    python benchmarks/bench_retention.py [--snapshots N] [--repeat N]
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from btrfsparsers_btrfsqt6 import SubvolumeRecord  # noqa: E402
+from retention_btrfsqt6 import RetentionPolicy, plan_retention  # noqa: E402
+
+# Seconds allowed to plan 100k snapshots on one core
+TARGET = 0.5
+
+
+def snapshots(count, half_by_otime=True):
+    """count snapshots 7 minutes apart; every other one is dated only by its otime."""
+    start = datetime(2020, 1, 1)
+    records = []
+    for i in range(count):
+        taken = start + timedelta(minutes=7 * i)
+        stamp = taken.strftime("%Y-%m-%d %H:%M:%S")
+        if half_by_otime and i % 2:
+            name = f"snap-{i}"
+        else:
+            name = taken.strftime("home-%Y%m%d-%H%M%S")
+        records.append(SubvolumeRecord(256 + i, gen=1000 + i, top_level=5, otime=stamp,
+                                       parent_uuid="source-uuid", uuid=f"uuid-{i}",
+                                       path=f"snapshots/{name}"))
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--snapshots", type=int, default=100000, help="synthetic snapshots")
+    parser.add_argument("--repeat", type=int, default=3, help="runs, the best is kept")
+    args = parser.parse_args()
+
+    records = snapshots(args.snapshots)
+    policy = RetentionPolicy(keep_last=5, keep_hourly=48, keep_daily=30, keep_weekly=12,
+                             keep_monthly=24, keep_yearly=5)
+    best = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        plan = plan_retention(records, policy)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    target = TARGET * args.snapshots / 100000
+    ok = best <= target
+    print(f"{args.snapshots} snapshots planned in {best:.3f}s (target {target:.3f}s): {plan.summary()}"
+          f"{'' if ok else '  ABOVE TARGET'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
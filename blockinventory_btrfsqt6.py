@@ -0,0 +1,335 @@
+import os
+import json
+import socket
+import subprocess
+from dataclasses import dataclass
+from PyQt6.QtCore import QObject, QSocketNotifier, QTimer, pyqtSignal
+
+SYS_BLOCK = "/sys/class/block"
+SYS_BTRFS = "/sys/fs/btrfs"
+UDEV_DATA = "/run/udev/data"
+MOUNTINFO = "/proc/self/mountinfo"
+
+# Kernel uevent multicast group on the NETLINK_KOBJECT_UEVENT socket
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_KERNEL_GROUP = 1
+
+
+@dataclass(frozen=True, slots=True)
+class BlockDevice:
+    name: str
+    path: str
+    devtype: str
+    size: int
+    fstype: str
+    uuid: str
+    label: str
+    rotational: bool
+
+
+@dataclass(frozen=True, slots=True)
+class BtrfsMount:
+    mount_point: str
+    source: str
+    uuid: str
+    subvol: str
+    subvolid: int
+    options: str
+
+
+def unescape_mount_field(field):
+    """Decode the octal escapes (\\040 for space and so on) used in mountinfo."""
+    if "\\" not in field:
+        return field
+    out = []
+    i = 0
+    while i < len(field):
+        if field[i] == "\\" and field[i + 1:i + 4].isdigit():
+            out.append(chr(int(field[i + 1:i + 4], 8)))
+            i += 4
+        else:
+            out.append(field[i])
+            i += 1
+    return "".join(out)
+
+
+def parse_mountinfo(text, device_uuids=None):
+    """Parse /proc/self/mountinfo text and return the btrfs mounts."""
+    device_uuids = device_uuids or {}
+    mounts = []
+    for line in text.splitlines():
+        fields = line.split()
+        if "-" not in fields:
+            continue
+        sep = fields.index("-")
+        if len(fields) < sep + 4 or fields[sep + 1] != "btrfs":
+            continue
+
+        mount_point = unescape_mount_field(fields[4])
+        source = unescape_mount_field(fields[sep + 2])
+        super_options = fields[sep + 3]
+
+        subvol = ""
+        subvolid = 0
+        for option in super_options.split(","):
+            if option.startswith("subvol="):
+                subvol = unescape_mount_field(option[len("subvol="):])
+            elif option.startswith("subvolid="):
+                subvolid = int(option[len("subvolid="):])
+
+        device_name = os.path.basename(os.path.realpath(source))
+        mounts.append(BtrfsMount(mount_point, source, device_uuids.get(device_name, ""),
+                                 subvol, subvolid, super_options))
+    return mounts
+
+
+def subvolume_relative_path(mount, path):
+    """Where a subvolume lies below a mount point, "" for the mount point itself.
+
+    path is relative to the top-level subvolume, as `subvolume list` prints
+    it. Returns None when the subvolume lies outside the mounted one, e.g.
+    "@snapshots/1/snapshot" with only subvol=/@ mounted.
+    """
+    subvol = mount.subvol.strip("/")
+    path = path.strip("/")
+    if not subvol:
+        return path
+    if path == subvol:
+        return ""
+    if path.startswith(subvol + "/"):
+        return path[len(subvol) + 1:]
+    return None
+
+
+def read_file(path, default=""):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+
+def read_udev_properties(major_minor, udev_root=UDEV_DATA):
+    """Return the E: properties udev recorded for a block device."""
+    properties = {}
+    try:
+        with open(os.path.join(udev_root, f"b{major_minor}")) as f:
+            for line in f:
+                if line.startswith("E:"):
+                    key, _, value = line[2:].rstrip("\n").partition("=")
+                    properties[key] = value
+    except OSError:
+        pass
+    return properties
+
+
+def read_btrfs_device_uuids(sys_btrfs=SYS_BTRFS):
+    """Map kernel device names to the btrfs filesystem UUID they belong to.
+
+    The kernel lists every device of a registered filesystem under
+    /sys/fs/btrfs/<uuid>/devices, so this works without udev.
+    """
+    uuids = {}
+    try:
+        filesystems = os.listdir(sys_btrfs)
+    except OSError:
+        return uuids
+    for uuid in filesystems:
+        try:
+            names = os.listdir(os.path.join(sys_btrfs, uuid, "devices"))
+        except OSError:
+            continue
+        for name in names:
+            uuids[name] = uuid
+    return uuids
+
+
+def read_block_devices(sys_block=SYS_BLOCK, udev_root=UDEV_DATA, sys_btrfs=SYS_BTRFS):
+    """Read every block device from sysfs and the udev database, without forking."""
+    btrfs_uuids = read_btrfs_device_uuids(sys_btrfs)
+    devices = []
+    for name in sorted(os.listdir(sys_block)):
+        device_dir = os.path.join(sys_block, name)
+        major_minor = read_file(os.path.join(device_dir, "dev"))
+        properties = read_udev_properties(major_minor, udev_root)
+
+        fstype = properties.get("ID_FS_TYPE", "")
+        uuid = properties.get("ID_FS_UUID", "")
+        if name in btrfs_uuids:
+            fstype = "btrfs"
+            uuid = btrfs_uuids[name]
+
+        if os.path.exists(os.path.join(device_dir, "partition")):
+            devtype = "part"
+            queue_dir = os.path.join(os.path.dirname(os.path.realpath(device_dir)), "queue")
+        else:
+            devtype = "disk"
+            queue_dir = os.path.join(device_dir, "queue")
+
+        devices.append(BlockDevice(
+            name=name,
+            path=f"/dev/{name}",
+            devtype=devtype,
+            size=int(read_file(os.path.join(device_dir, "size"), "0") or 0) * 512,
+            fstype=fstype,
+            uuid=uuid,
+            label=properties.get("ID_FS_LABEL", ""),
+            rotational=read_file(os.path.join(queue_dir, "rotational"), "0") == "1",
+        ))
+    return devices
+
+
+def read_block_devices_lsblk():
+    """Fallback for systems without a udev database: one lsblk --json call."""
+    result = subprocess.run(
+        ["lsblk", "--json", "--bytes", "-o", "NAME,PATH,TYPE,SIZE,FSTYPE,UUID,LABEL,ROTA"],
+        capture_output=True, text=True)
+    if result.returncode != 0:
+        return []
+
+    devices = []
+    pending = list(json.loads(result.stdout).get("blockdevices", []))
+    while pending:
+        entry = pending.pop(0)
+        pending.extend(entry.get("children") or [])
+        devices.append(BlockDevice(
+            name=entry.get("name") or "",
+            path=entry.get("path") or f"/dev/{entry.get('name')}",
+            devtype=entry.get("type") or "",
+            size=int(entry.get("size") or 0),
+            fstype=entry.get("fstype") or "",
+            uuid=entry.get("uuid") or "",
+            label=entry.get("label") or "",
+            rotational=entry.get("rota") in (True, 1, "1"),
+        ))
+    return devices
+
+
+class BtrfsInventory(QObject):
+    """Cached block device and btrfs mount inventory shared by all panels.
+
+    The cache is dropped and changed is emitted when /proc/self/mountinfo
+    signals a mount table change (POLLPRI) or a block uevent arrives on the
+    kernel netlink socket, so panels can refresh after hot-plug.
+    """
+
+    changed = pyqtSignal()
+
+    # Coalesce bursts of uevents (a disk and all its partitions) into one refresh
+    DEBOUNCE_MS = 300
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.cached_devices = None
+        self.cached_mounts = None
+
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.timeout.connect(self.emit_changed)
+
+        self.mountinfo_file = None
+        self.mountinfo_notifier = None
+        self.uevent_socket = None
+        self.uevent_notifier = None
+        self.watch_mountinfo()
+        self.watch_uevents()
+
+    def watch_mountinfo(self):
+        try:
+            self.mountinfo_file = open(MOUNTINFO)
+            self.mountinfo_file.read()
+        except OSError:
+            return
+        self.mountinfo_notifier = QSocketNotifier(
+            self.mountinfo_file.fileno(), QSocketNotifier.Type.Exception, self)
+        self.mountinfo_notifier.activated.connect(self.mountinfo_changed)
+
+    def watch_uevents(self):
+        try:
+            self.uevent_socket = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM,
+                                               NETLINK_KOBJECT_UEVENT)
+            self.uevent_socket.bind((0, UEVENT_KERNEL_GROUP))
+            self.uevent_socket.setblocking(False)
+        except (OSError, AttributeError):
+            self.uevent_socket = None
+            return
+        self.uevent_notifier = QSocketNotifier(
+            self.uevent_socket.fileno(), QSocketNotifier.Type.Read, self)
+        self.uevent_notifier.activated.connect(self.uevent_received)
+
+    def mountinfo_changed(self):
+        # Re-read from the start so the kernel re-arms the event
+        self.mountinfo_file.seek(0)
+        self.mountinfo_file.read()
+        self.invalidate()
+
+    def uevent_received(self):
+        block_event = False
+        while True:
+            try:
+                message = self.uevent_socket.recv(16384)
+            except BlockingIOError:
+                break
+            except OSError:
+                break
+            if b"\0SUBSYSTEM=block\0" in message:
+                block_event = True
+        if block_event:
+            self.invalidate()
+
+    def invalidate(self):
+        """Drop the cached inventory and notify listeners shortly after."""
+        self.cached_devices = None
+        self.cached_mounts = None
+        self.debounce_timer.start(self.DEBOUNCE_MS)
+
+    def emit_changed(self):
+        self.changed.emit()
+
+    def block_devices(self):
+        """Every block device, cached until the next change notification."""
+        if self.cached_devices is None:
+            if os.path.isdir(UDEV_DATA) and os.path.isdir(SYS_BLOCK):
+                self.cached_devices = read_block_devices()
+            else:
+                self.cached_devices = read_block_devices_lsblk()
+        return self.cached_devices
+
+    def btrfs_devices(self):
+        return [device for device in self.block_devices() if device.fstype == "btrfs"]
+
+    def btrfs_mounts(self):
+        """Mounted btrfs filesystems, cached until the next change notification."""
+        if self.cached_mounts is None:
+            uuids = read_btrfs_device_uuids()
+            self.cached_mounts = parse_mountinfo(read_file(MOUNTINFO), uuids)
+        return self.cached_mounts
+
+    def mount_at(self, mount_point):
+        """The btrfs mount visible at mount_point (the last one mounted there), or None."""
+        mounts = [mount for mount in self.btrfs_mounts() if mount.mount_point == mount_point]
+        return mounts[-1] if mounts else None
+
+    def member_devices(self, mount_point):
+        """Block devices of the btrfs filesystem mounted at mount_point."""
+        uuids = {mount.uuid for mount in self.btrfs_mounts() if mount.mount_point == mount_point}
+        return [device for device in self.btrfs_devices() if device.uuid and device.uuid in uuids]
+
+    def btrfs_mount_points(self):
+        """Distinct btrfs mount points in mount order."""
+        seen = []
+        for mount in self.btrfs_mounts():
+            if mount.mount_point not in seen:
+                seen.append(mount.mount_point)
+        return seen
+
+
+shared_inventory = None
+
+
+def get_inventory():
+    """Return the inventory instance shared by every panel in the process."""
+    global shared_inventory
+    if shared_inventory is None:
+        shared_inventory = BtrfsInventory()
+    return shared_inventory
@@ -0,0 +1,943 @@
+import re
+from dataclasses import dataclass, field
+
+
+class StreamingParser:
+    """Base class for parsers that consume command output as it arrives.
+
+    feed_text() takes arbitrary chunks (as delivered by BtrfsCommandRunner),
+    feed_line() takes one complete line, and finish() flushes a trailing
+    unterminated line and returns the parsed records.
+    """
+
+    def __init__(self):
+        self.partial = ""
+
+    def feed_text(self, text):
+        lines = (self.partial + text).split("\n")
+        self.partial = lines.pop()
+        for line in lines:
+            self.feed_line(line)
+
+    def feed_line(self, line):
+        raise NotImplementedError
+
+    def finish(self):
+        if self.partial:
+            self.feed_line(self.partial)
+            self.partial = ""
+        return self.result()
+
+    def result(self):
+        raise NotImplementedError
+
+
+def parse_duration(text):
+    """Convert "H:MM:SS" (hours may exceed 24) or "Nd H:MM:SS" to seconds."""
+    days = 0
+    text = text.strip()
+    if "d " in text:
+        day_part, text = text.split("d ", 1)
+        days = int(day_part)
+    seconds = 0
+    for part in text.split(":"):
+        seconds = seconds * 60 + int(part)
+    return days * 86400 + seconds
+
+
+def format_duration(seconds):
+    """Format seconds as "H:MM:SS", the way btrfs-progs prints durations."""
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def format_bytes(value):
+    """Format a byte count with binary units, e.g. 1.50GiB."""
+    value = float(value)
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if abs(value) < 1024 or unit == "TiB":
+            return f"{value:.0f}{unit}" if unit == "B" else f"{value:.2f}{unit}"
+        value /= 1024
+
+
+# -- btrfs scrub status -R -d -------------------------------------------------
+
+SCRUB_DEVICE_RE = re.compile(r"^[Ss]crub device (\S+) \(id (\d+)\) (status|history|done)")
+SCRUB_RUNNING_FOR_RE = re.compile(r"and (?:was aborted after|running for|finished after|was interrupted after) (\S+)")
+
+# Counters that btrfs-progs adds up into the "error summary"
+SCRUB_ERROR_COUNTERS = ("read_errors", "csum_errors", "verify_errors", "super_errors")
+
+
+@dataclass(slots=True)
+class ScrubDeviceStatus:
+    devid: int
+    path: str
+    status: str = ""
+    duration: int = 0
+    data_bytes_scrubbed: int = 0
+    tree_bytes_scrubbed: int = 0
+    uncorrectable_errors: int = 0
+    corrected_errors: int = 0
+    last_physical: int = 0
+    counters: dict = field(default_factory=dict)
+
+    @property
+    def bytes_scrubbed(self):
+        return self.data_bytes_scrubbed + self.tree_bytes_scrubbed
+
+    @property
+    def total_errors(self):
+        return sum(self.counters.get(name, 0) for name in SCRUB_ERROR_COUNTERS)
+
+
+class ScrubStatusParser(StreamingParser):
+    """Parse the raw per-device counters of `btrfs scrub status -R -d`."""
+
+    def __init__(self):
+        super().__init__()
+        self.uuid = ""
+        self.devices = []
+        self.current = None
+
+    def feed_line(self, line):
+        stripped = line.strip()
+        if not stripped:
+            return
+
+        match = SCRUB_DEVICE_RE.match(stripped)
+        if match:
+            self.current = ScrubDeviceStatus(devid=int(match.group(2)), path=match.group(1))
+            self.devices.append(self.current)
+            return
+
+        key, sep, value = stripped.partition(":")
+        value = value.strip()
+        if stripped.startswith("scrub status for "):
+            self.uuid = stripped[len("scrub status for "):]
+        elif key == "UUID":
+            self.uuid = value
+        elif self.current is None:
+            return
+        elif key == "Status":
+            self.current.status = value
+        elif key == "Duration":
+            self.current.duration = parse_duration(value)
+        elif stripped.startswith("scrub started at"):
+            # Older btrfs-progs: "scrub started at <date> and running for 0:01:02"
+            match = SCRUB_RUNNING_FOR_RE.search(stripped)
+            if match:
+                self.current.duration = parse_duration(match.group(1))
+            self.current.status = "running" if "running for" in stripped else "finished"
+        elif sep and value.isdigit():
+            number = int(value)
+            self.current.counters[key] = number
+            if key in ("data_bytes_scrubbed", "tree_bytes_scrubbed", "uncorrectable_errors",
+                       "corrected_errors", "last_physical"):
+                setattr(self.current, key, number)
+
+    def result(self):
+        return self.devices
+
+
+def parse_scrub_status(text):
+    parser = ScrubStatusParser()
+    parser.feed_text(text)
+    return parser.finish()
+
+
+# -- btrfs filesystem show --raw ----------------------------------------------
+
+FI_SHOW_DEVICE_RE = re.compile(r"^\s*devid\s+(\d+)\s+size\s+(\d+)\s+used\s+(\d+)\s+path\s+(.+?)\s*$")
+
+
+@dataclass(slots=True)
+class FilesystemDevice:
+    devid: int
+    size: int
+    used: int
+    path: str
+
+
+class FilesystemShowParser(StreamingParser):
+    """Parse the per-device lines of `btrfs filesystem show --raw`.
+
+    "used" is the space allocated to chunks on that device.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.uuid = ""
+        self.label = ""
+        self.devices = []
+
+    def feed_line(self, line):
+        match = FI_SHOW_DEVICE_RE.match(line)
+        if match:
+            self.devices.append(FilesystemDevice(int(match.group(1)), int(match.group(2)),
+                                                 int(match.group(3)), match.group(4)))
+        elif line.startswith("Label:"):
+            label, _, uuid = line[len("Label:"):].partition("uuid:")
+            self.label = label.strip().strip("'")
+            self.uuid = uuid.strip()
+
+    def result(self):
+        return self.devices
+
+
+def parse_filesystem_show(text):
+    parser = FilesystemShowParser()
+    parser.feed_text(text)
+    return parser.finish()
+
+
+# -- btrfs filesystem usage -b [-T] -----------------------------------------
+
+@dataclass(slots=True)
+class SpaceInfo:
+    type: str
+    profile: str
+    total: int
+    used: int
+
+
+@dataclass(slots=True)
+class DeviceAllocation:
+    devid: int
+    path: str
+    # "Data,single" -> bytes allocated on this device
+    allocations: dict = field(default_factory=dict)
+    unallocated: int = 0
+    total: int = 0
+    slack: int = 0
+
+
+@dataclass(slots=True)
+class FilesystemUsage:
+    device_size: int = 0
+    device_allocated: int = 0
+    device_unallocated: int = 0
+    device_missing: int = 0
+    used: int = 0
+    free_estimated: int = 0
+    free_min: int = 0
+    data_ratio: float = 1.0
+    metadata_ratio: float = 1.0
+    global_reserve: int = 0
+    # Block group types ("Data,single" and so on) as SpaceInfo records
+    profiles: list = field(default_factory=list)
+    # Per-device allocation, from the -T table or the per-type sections
+    devices: list = field(default_factory=list)
+
+
+USAGE_OVERALL_FIELDS = {
+    "Device size": "device_size",
+    "Device allocated": "device_allocated",
+    "Device unallocated": "device_unallocated",
+    "Device missing": "device_missing",
+    "Used": "used",
+    "Free (estimated)": "free_estimated",
+    "Free (statfs, df)": "free_min",
+    "Data ratio": "data_ratio",
+    "Metadata ratio": "metadata_ratio",
+    "Global reserve": "global_reserve",
+}
+
+USAGE_PROFILE_RE = re.compile(r"^(\w+),([\w/]+): Size:(\d+), Used:(\d+)")
+USAGE_PROFILE_DEVICE_RE = re.compile(r"^\s+(/\S.*?)\s+(\d+)\s*$")
+
+
+# Columns of the -T table after the block group types
+USAGE_TABLE_EXTRAS = {"Unallocated": "unallocated", "Total": "total", "Slack": "slack"}
+
+
+class FilesystemUsageParser(StreamingParser):
+    """Parse `btrfs filesystem usage -b`, with or without the -T table.
+
+    result() is a FilesystemUsage: the "Overall:" section, one SpaceInfo per
+    block group type and the per-device allocations.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.usage = FilesystemUsage()
+        self.in_overall = False
+        # Per-type sections (without -T)
+        self.profile = None
+        self.devices_by_path = {}
+        # -T table: first header line (types), then the column keys
+        self.table_types = None
+        self.table_columns = None
+        self.table_profiles = 0
+        self.table_extras = []
+
+    def feed_line(self, line):
+        stripped = line.strip()
+        if self.table_columns is not None:
+            self.feed_table(stripped)
+            return
+        if stripped == "Overall:":
+            self.in_overall = True
+            return
+        if self.in_overall:
+            if not stripped:
+                # A blank line ends the Overall section
+                self.in_overall = False
+            else:
+                self.feed_overall(stripped)
+            return
+
+        match = USAGE_PROFILE_RE.match(stripped)
+        if match:
+            self.profile = f"{match.group(1)},{match.group(2)}"
+            self.usage.profiles.append(SpaceInfo(match.group(1), match.group(2),
+                                                 int(match.group(3)), int(match.group(4))))
+            return
+        if self.profile is not None:
+            match = USAGE_PROFILE_DEVICE_RE.match(line)
+            if match:
+                device = self.device(match.group(1))
+                if self.profile == "Unallocated":
+                    device.unallocated = int(match.group(2))
+                else:
+                    device.allocations[self.profile] = int(match.group(2))
+                return
+            if stripped.startswith("Unallocated:"):
+                self.profile = "Unallocated"
+                return
+            if not stripped:
+                return
+        self.feed_table(stripped)
+
+    def feed_overall(self, stripped):
+        key, sep, value = stripped.partition(":")
+        name = USAGE_OVERALL_FIELDS.get(key)
+        if not sep or name is None:
+            return
+        value = value.split()[0] if value.split() else ""
+        try:
+            number = float(value) if name.endswith("_ratio") else int(value)
+        except ValueError:
+            return
+        setattr(self.usage, name, number)
+
+    def device(self, path, devid=0):
+        device = self.devices_by_path.get(path)
+        if device is None:
+            device = self.devices_by_path[path] = DeviceAllocation(devid, path)
+            self.usage.devices.append(device)
+        return device
+
+    def feed_table(self, stripped):
+        if not stripped or stripped.startswith("--"):
+            return
+        words = stripped.split()
+        if self.table_columns is None:
+            if stripped.startswith("Id Path"):
+                # "Id Path single DUP DUP Unallocated Total Slack" under "Data Metadata System"
+                types = self.table_types or []
+                self.table_columns = [f"{types[index]},{profile}" if index < len(types) else profile
+                                      for index, profile in enumerate(words[2:])]
+                self.table_profiles = len(types)
+                self.table_extras = [(2 + index, USAGE_TABLE_EXTRAS[column])
+                                     for index, column in enumerate(self.table_columns)
+                                     if column in USAGE_TABLE_EXTRAS]
+            elif all(word.isalpha() for word in words):
+                self.table_types = words
+            return
+        if not words[0].isdigit() or len(words) < 2 + len(self.table_columns):
+            return
+
+        profiles = self.table_profiles
+        device = DeviceAllocation(int(words[0]), words[1], {
+            column: int(value) for column, value in zip(self.table_columns, words[2:2 + profiles])
+            if value != "-"
+        })
+        for index, name in self.table_extras:
+            value = words[index]
+            setattr(device, name, 0 if value == "-" else int(value))
+        self.usage.devices.append(device)
+
+    def result(self):
+        return self.usage
+
+
+def parse_filesystem_usage(text):
+    parser = FilesystemUsageParser()
+    parser.feed_text(text)
+    return parser.finish()
+
+
+# -- btrfs balance status -v --------------------------------------------------
+
+BALANCE_STATE_RE = re.compile(r"^Balance on '(.*)' is (running|paused)(.*)$")
+BALANCE_PROGRESS_RE = re.compile(
+    r"^(\d+) out of about (\d+) chunks balanced \((\d+) considered\),\s+(\d+)% left")
+
+
+@dataclass(slots=True)
+class BalanceStatus:
+    state: str = "none"
+    pause_requested: bool = False
+    cancel_requested: bool = False
+    completed: int = 0
+    total: int = 0
+    considered: int = 0
+    percent_left: int = 0
+
+
+class BalanceStatusParser(StreamingParser):
+    """Parse `btrfs balance status -v`.
+
+    state is "running", "paused" or "none" when no balance was found.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.status = BalanceStatus()
+
+    def feed_line(self, line):
+        stripped = line.strip()
+        match = BALANCE_STATE_RE.match(stripped)
+        if match:
+            self.status.state = match.group(2)
+            self.status.pause_requested = "pause requested" in match.group(3)
+            self.status.cancel_requested = "cancel requested" in match.group(3)
+            return
+        match = BALANCE_PROGRESS_RE.match(stripped)
+        if match:
+            self.status.completed = int(match.group(1))
+            self.status.total = int(match.group(2))
+            self.status.considered = int(match.group(3))
+            self.status.percent_left = int(match.group(4))
+
+    def result(self):
+        return self.status
+
+
+def parse_balance_status(text):
+    parser = BalanceStatusParser()
+    parser.feed_text(text)
+    return parser.finish()
+
+
+# -- btrfs scrub limit --raw --------------------------------------------------
+
+SCRUB_LIMIT_RE = re.compile(r"^\s*(\d+)\s+(unlimited|\d+)\s+(\S.*?)\s*$")
+
+
+@dataclass(slots=True)
+class ScrubLimit:
+    devid: int
+    limit: int
+    path: str
+
+
+class ScrubLimitParser(StreamingParser):
+    """Parse the per-device table of `btrfs scrub limit --raw`; 0 means unlimited."""
+
+    def __init__(self):
+        super().__init__()
+        self.uuid = ""
+        self.limits = []
+
+    def feed_line(self, line):
+        if line.startswith("UUID:"):
+            self.uuid = line[len("UUID:"):].strip()
+            return
+        match = SCRUB_LIMIT_RE.match(line)
+        if match:
+            limit = 0 if match.group(2) == "unlimited" else int(match.group(2))
+            self.limits.append(ScrubLimit(int(match.group(1)), limit, match.group(3)))
+
+    def result(self):
+        return self.limits
+
+
+def parse_scrub_limit(text):
+    parser = ScrubLimitParser()
+    parser.feed_text(text)
+    return parser.finish()
+
+
+# -- btrfs device stats -------------------------------------------------------
+
+DEVICE_STATS_RE = re.compile(r"^\[(.+)\]\.(\w+)\s+(-?\d+)\s*$")
+
+# Counter order shared by `device stats` and the sysfs error_stats files
+DEVICE_ERROR_COUNTERS = ("write_io_errs", "read_io_errs", "flush_io_errs",
+                         "corruption_errs", "generation_errs")
+
+
+class DeviceStatsParser(StreamingParser):
+    """Parse `btrfs device stats` into {device path: {counter: value}}."""
+
+    def __init__(self):
+        super().__init__()
+        self.devices = {}
+
+    def feed_line(self, line):
+        match = DEVICE_STATS_RE.match(line.strip())
+        if match:
+            self.devices.setdefault(match.group(1), {})[match.group(2)] = int(match.group(3))
+
+    def result(self):
+        return self.devices
+
+
+def parse_device_stats(text):
+    parser = DeviceStatsParser()
+    parser.feed_text(text)
+    return parser.finish()
+
+
+# -- btrfs subvolume list -puqR (also -c, -g, -o, -s) ------------------------
+
+@dataclass(slots=True)
+class SubvolumeRecord:
+    id: int
+    gen: int = 0
+    cgen: int = 0
+    parent: int = 0
+    top_level: int = 0
+    otime: str = ""
+    parent_uuid: str = ""
+    received_uuid: str = ""
+    uuid: str = ""
+    path: str = ""
+
+
+# Fields appear in this order; which ones are present depends on -c, -p, -s/-o, -q, -R, -u
+SUBVOLUME_LIST_RE = re.compile(
+    r"ID (\d+) gen (\d+)(?: cgen (\d+))?(?: parent (\d+))? top level (\d+)"
+    r"(?: otime (\S+ \S+))?(?: parent_uuid (\S+))?(?: received_uuid (\S+))?(?: uuid (\S+))? path (.*)")
+
+
+def none_if_dash(value):
+    return "" if value == "-" else value
+
+
+class SubvolumeListParser(StreamingParser):
+    """Parse `btrfs subvolume list` lines such as
+
+    ID 257 gen 9 parent 5 top level 5 parent_uuid - received_uuid - uuid 0c3f... path home
+
+    The path is everything after " path ", so it may contain spaces.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.subvolumes = []
+
+    def feed_line(self, line):
+        match = SUBVOLUME_LIST_RE.match(line)
+        if match is None:
+            return
+        (subvolume_id, gen, cgen, parent, top_level, otime,
+         parent_uuid, received_uuid, uuid, path) = match.groups()
+        self.subvolumes.append(SubvolumeRecord(
+            int(subvolume_id), int(gen), int(cgen or 0), int(parent or 0), int(top_level), otime or "",
+            none_if_dash(parent_uuid or ""), none_if_dash(received_uuid or ""), none_if_dash(uuid or ""),
+            path))
+
+    def result(self):
+        return self.subvolumes
+
+
+def parse_subvolume_list(text):
+    parser = SubvolumeListParser()
+    parser.feed_text(text)
+    return parser.finish()
+
+
+# -- btrfs filesystem df -b ---------------------------------------------------
+
+FI_DF_RE = re.compile(r"^(\w+), ([\w/]+): total=(\d+), used=(\d+)")
+
+
+class FilesystemDfParser(StreamingParser):
+    """Parse `btrfs filesystem df -b` into one SpaceInfo per block group type."""
+
+    def __init__(self):
+        super().__init__()
+        self.spaces = []
+
+    def feed_line(self, line):
+        match = FI_DF_RE.match(line.strip())
+        if match:
+            self.spaces.append(SpaceInfo(match.group(1), match.group(2),
+                                         int(match.group(3)), int(match.group(4))))
+
+    def result(self):
+        return self.spaces
+
+
+def parse_filesystem_df(text):
+    parser = FilesystemDfParser()
+    parser.feed_text(text)
+    return parser.finish()
+
+
+# -- btrfs device usage -b ----------------------------------------------------
+
+DEVICE_USAGE_HEADER_RE = re.compile(r"^(\S.*), ID: (\d+)\s*$")
+
+
+@dataclass(slots=True)
+class DeviceUsage:
+    path: str
+    devid: int
+    size: int = 0
+    slack: int = 0
+    unallocated: int = 0
+    # "Data,single" -> bytes allocated on this device
+    allocations: dict = field(default_factory=dict)
+
+
+class DeviceUsageParser(StreamingParser):
+    """Parse `btrfs device usage -b`, one DeviceUsage per device block."""
+
+    def __init__(self):
+        super().__init__()
+        self.devices = []
+        self.current = None
+
+    def feed_line(self, line):
+        match = DEVICE_USAGE_HEADER_RE.match(line)
+        if match:
+            self.current = DeviceUsage(match.group(1), int(match.group(2)))
+            self.devices.append(self.current)
+            return
+        if self.current is None:
+            return
+        key, sep, value = line.strip().partition(":")
+        value = value.split()[0] if value.split() else ""
+        if not sep or not value.isdigit():
+            return
+        if key == "Device size":
+            self.current.size = int(value)
+        elif key == "Device slack":
+            self.current.slack = int(value)
+        elif key == "Unallocated":
+            self.current.unallocated = int(value)
+        else:
+            self.current.allocations[key] = int(value)
+
+    def result(self):
+        return self.devices
+
+
+def parse_device_usage(text):
+    parser = DeviceUsageParser()
+    parser.feed_text(text)
+    return parser.finish()
+
+
+# -- btrfs qgroup show --raw (-p -c -r -e -F) ---------------------------------
+
+@dataclass(slots=True)
+class QgroupRecord:
+    qgroupid: str
+    level: int
+    id: int
+    rfer: int = 0
+    excl: int = 0
+    # 0 means no limit
+    max_rfer: int = 0
+    max_excl: int = 0
+    parents: tuple = ()
+    children: tuple = ()
+    path: str = ""
+
+
+def qgroup_limit(value):
+    return 0 if value in ("none", "-") else int(value)
+
+
+def qgroup_list(value):
+    return () if value in ("-", "---", "") else tuple(value.split(","))
+
+
+def set_qgroup_rfer(record, value):
+    record.rfer = int(value)
+
+
+def set_qgroup_excl(record, value):
+    record.excl = int(value)
+
+
+def set_qgroup_max_rfer(record, value):
+    record.max_rfer = qgroup_limit(value)
+
+
+def set_qgroup_max_excl(record, value):
+    record.max_excl = qgroup_limit(value)
+
+
+def set_qgroup_parents(record, value):
+    record.parents = qgroup_list(value)
+
+
+def set_qgroup_children(record, value):
+    record.children = qgroup_list(value)
+
+
+def set_qgroup_path(record, value):
+    record.path = none_if_dash(value)
+
+
+QGROUP_COLUMN_SETTERS = {
+    "rfer": set_qgroup_rfer,
+    "excl": set_qgroup_excl,
+    "max_rfer": set_qgroup_max_rfer,
+    "max_excl": set_qgroup_max_excl,
+    "parent": set_qgroup_parents,
+    "child": set_qgroup_children,
+    "path": set_qgroup_path,
+}
+
+
+# btrfs-progs 6.x spells the columns out; map them to the older short names
+QGROUP_LONG_HEADERS = (
+    ("max referenced", "max_rfer"), ("max exclusive", "max_excl"),
+    ("referenced", "rfer"), ("exclusive", "excl"),
+)
+
+
+def qgroup_header_columns(header):
+    header = header.lower()
+    for long_name, short_name in QGROUP_LONG_HEADERS:
+        header = header.replace(long_name, short_name)
+    return header.split()
+
+
+class QgroupShowParser(StreamingParser):
+    """Parse `btrfs qgroup show --raw` with any of the optional columns.
+
+    The header line decides which column is which; the path column of newer
+    btrfs-progs is last and may contain spaces.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.columns = None
+        self.setters = []
+        self.qgroups = []
+
+    def feed_line(self, line):
+        if self.columns is None:
+            stripped = line.strip()
+            if stripped.startswith("qgroupid") or stripped.startswith("Qgroupid"):
+                self.columns = qgroup_header_columns(stripped)
+                self.setters = [(index, QGROUP_COLUMN_SETTERS[column])
+                                for index, column in enumerate(self.columns)
+                                if column in QGROUP_COLUMN_SETTERS]
+            return
+
+        # Blank and "----" separator lines have no qgroup id
+        values = line.strip().split(None, len(self.columns) - 1)
+        if not values or "/" not in values[0]:
+            return
+        level, _, subvolume = values[0].partition("/")
+        record = QgroupRecord(values[0], int(level), int(subvolume))
+        count = len(values)
+        for index, setter in self.setters:
+            if index < count:
+                setter(record, values[index])
+        self.qgroups.append(record)
+
+    def result(self):
+        return self.qgroups
+
+
+def parse_qgroup_show(text):
+    parser = QgroupShowParser()
+    parser.feed_text(text)
+    return parser.finish()
+
+
+# -- btrfs quota rescan -s ----------------------------------------------------
+
+RESCAN_RUNNING_RE = re.compile(r"rescan operation running \(current key (-?\d+)\)")
+
+
+@dataclass(slots=True)
+class RescanStatus:
+    running: bool = False
+    # Extent tree key (a logical byte address) the rescan has reached
+    current_key: int = 0
+
+
+class QuotaRescanStatusParser(StreamingParser):
+    """Parse "rescan operation running (current key N)" or "no rescan operation in progress"."""
+
+    def __init__(self):
+        super().__init__()
+        self.status = RescanStatus()
+
+    def feed_line(self, line):
+        match = RESCAN_RUNNING_RE.search(line)
+        if match:
+            self.status = RescanStatus(True, int(match.group(1)))
+
+    def result(self):
+        return self.status
+
+
+def parse_quota_rescan_status(text):
+    parser = QuotaRescanStatusParser()
+    parser.feed_text(text)
+    return parser.finish()
+
+
+# -- btrfs inspect-internal dump-tree -t chunk --------------------------------
+
+CHUNK_ITEM_RE = re.compile(r"key \(FIRST_CHUNK_TREE CHUNK_ITEM (\d+)\)")
+CHUNK_LENGTH_RE = re.compile(r"^\s*length (\d+)")
+
+
+class ChunkRangeParser(StreamingParser):
+    """Find the logical address range covered by the chunks in a chunk tree dump.
+
+    Each CHUNK_ITEM key carries the chunk's logical start; the "length"
+    line that follows gives its size. The result is (start, end), or
+    (0, 0) when no chunk was found.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.start = None
+        self.end = 0
+        self.chunk_start = None
+
+    def feed_line(self, line):
+        match = CHUNK_ITEM_RE.search(line)
+        if match:
+            self.chunk_start = int(match.group(1))
+            return
+        if self.chunk_start is None:
+            return
+        match = CHUNK_LENGTH_RE.match(line)
+        if match:
+            self.start = self.chunk_start if self.start is None else min(self.start, self.chunk_start)
+            self.end = max(self.end, self.chunk_start + int(match.group(1)))
+            self.chunk_start = None
+
+    def result(self):
+        return (self.start or 0, self.end)
+
+
+def parse_chunk_range(text):
+    parser = ChunkRangeParser()
+    parser.feed_text(text)
+    return parser.finish()
+
+
+# -- btrfs restore -v ---------------------------------------------------------
+
+RESTORE_RESTORING_RE = re.compile(r"^Restoring (.+)$")
+RESTORE_SKIPPING_RE = re.compile(r"^Skipping existing file (.+)$")
+RESTORE_SYMLINK_RE = re.compile(r"^SYMLINK: '(.+)' => '(.*)'$")
+RESTORE_ERROR_RE = re.compile(r"^(?:ERROR|Error|error)[: ]")
+
+
+@dataclass(slots=True)
+class RestoreEntry:
+    # "restored" (file or directory), "skipped", "symlink" or "error"
+    kind: str
+    # Output path as btrfs restore prints it, i.e. under the target directory
+    path: str = ""
+    message: str = ""
+
+
+class RestoreLogParser(StreamingParser):
+    """Parse `btrfs restore -v` output into RestoreEntry records.
+
+    "Restoring <path>" is printed before a file or directory is written,
+    so a path is only complete once the next entry (or the end) arrives.
+    take() hands out the entries parsed so far, for callers that follow
+    the restore while it runs.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.entries = []
+
+    def feed_line(self, line):
+        line = line.rstrip("\r")
+        match = RESTORE_RESTORING_RE.match(line)
+        if match:
+            self.entries.append(RestoreEntry("restored", match.group(1)))
+            return
+        match = RESTORE_SKIPPING_RE.match(line)
+        if match:
+            self.entries.append(RestoreEntry("skipped", match.group(1)))
+            return
+        match = RESTORE_SYMLINK_RE.match(line)
+        if match:
+            self.entries.append(RestoreEntry("symlink", match.group(1), match.group(2)))
+            return
+        if RESTORE_ERROR_RE.match(line):
+            self.entries.append(RestoreEntry("error", message=line))
+
+    def take(self):
+        entries = self.entries
+        self.entries = []
+        return entries
+
+    def result(self):
+        return self.take()
+
+
+def parse_restore_log(text):
+    parser = RestoreLogParser()
+    parser.feed_text(text)
+    return parser.finish()
+
+
+# -- btrfs-find-root ----------------------------------------------------------
+
+FIND_ROOT_FOUND_RE = re.compile(r"Found tree root at (\d+) gen (\d+) level (\d+)")
+FIND_ROOT_WELL_BLOCK_RE = re.compile(r"Well block (\d+)\s*\(gen: (\d+) level: (\d+)\)")
+
+
+@dataclass(slots=True)
+class RootCandidate:
+    bytenr: int
+    generation: int
+    level: int
+    # The root the superblock points at
+    current: bool = False
+    # Paths a dry run listed from this root, -1 before probing
+    files: int = -1
+    # The probe stopped at its file limit, so files is a lower bound
+    capped: bool = False
+    error: str = ""
+
+
+class FindRootParser(StreamingParser):
+    """Parse btrfs-find-root output into RootCandidate records, newest generation first."""
+
+    def __init__(self):
+        super().__init__()
+        self.candidates = {}
+
+    def feed_line(self, line):
+        match = FIND_ROOT_FOUND_RE.search(line)
+        current = match is not None
+        if match is None:
+            match = FIND_ROOT_WELL_BLOCK_RE.search(line)
+        if match is None:
+            return
+        bytenr = int(match.group(1))
+        if bytenr not in self.candidates or current:
+            self.candidates[bytenr] = RootCandidate(bytenr, int(match.group(2)), int(match.group(3)), current)
+
+    def result(self):
+        return sorted(self.candidates.values(), key=lambda candidate: (-candidate.generation, -candidate.bytenr))
+
+
+def parse_find_root(text):
+    parser = FindRootParser()
+    parser.feed_text(text)
+    return parser.finish()
@@ -0,0 +1,268 @@
+import os
+import re
+import time
+from collections import deque
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, describe_finish
+
+# Keep each command line well below ARG_MAX even with long paths
+MAX_BATCH_BYTES = 64 * 1024
+
+# "Delete subvolume (commit): '/mnt/a'", "Delete subvolume 257 (no-commit): '/mnt/a'"
+DELETED_RE = re.compile(r"^Delete subvolume .*?: '(.*)'$")
+
+
+def delete_batches(paths, batch_size, max_bytes=MAX_BATCH_BYTES):
+    """Split paths into lists of at most batch_size paths and max_bytes of arguments."""
+    batches = []
+    batch = []
+    size = 0
+    for path in paths:
+        length = len(os.fsencode(path)) + 1
+        if batch and (len(batch) >= batch_size or size + length > max_bytes):
+            batches.append(batch)
+            batch = []
+            size = 0
+        batch.append(path)
+        size += length
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def delete_results(batch, stdout, stderr):
+    """Match `subvolume delete` output to the paths of one batch.
+
+    btrfs prints a "Delete subvolume" line before each deletion and an
+    ERROR line if it fails, then goes on with the next path. Returns
+    {path: error message or ""}; paths never announced keep None.
+    """
+    results = dict.fromkeys(batch)
+    normalized = {os.path.normpath(path): path for path in batch}
+    current = None
+    for line in (stdout + stderr).splitlines():
+        match = DELETED_RE.match(line)
+        if match:
+            current = normalized.get(os.path.normpath(match.group(1)), current)
+            if current is not None:
+                results[current] = ""
+            continue
+        if not line.startswith("ERROR"):
+            continue
+        # Attribute the error to the path it names, else to the last announced one
+        target = next((path for key, path in normalized.items() if key in line), current)
+        if target is not None:
+            results[target] = line
+    return results
+
+
+class BulkSubvolumeJob(QObject):
+    """Common progress reporting and pacing for bulk subvolume operations.
+
+    progress(done, total) is emitted after every item, item_failed(path,
+    message) for each item that could not be processed, and
+    finished(succeeded, failed) once at the end or after cancel().
+    """
+
+    progress = pyqtSignal(int, int)
+    item_failed = pyqtSignal(str, str)
+    log = pyqtSignal(str)
+    finished = pyqtSignal(int, int)
+
+    def __init__(self, parent=None, btrfs=("sudo", "btrfs")):
+        super().__init__(parent)
+        self.btrfs = list(btrfs)
+        self.total = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.active = False
+
+        # Delays the next command so transaction commits are spread out
+        self.pace_timer = QTimer(self)
+        self.pace_timer.setSingleShot(True)
+        self.pace_timer.timeout.connect(self.run_next)
+
+    def is_active(self):
+        return self.active
+
+    def begin(self, total):
+        self.total = total
+        self.succeeded = 0
+        self.failed = 0
+        self.active = True
+
+    def item_done(self, path, error):
+        if error:
+            self.failed += 1
+            self.item_failed.emit(path, error)
+        else:
+            self.succeeded += 1
+        self.progress.emit(self.succeeded + self.failed, self.total)
+
+    def end(self):
+        if not self.active:
+            return
+        self.active = False
+        self.pace_timer.stop()
+        self.finished.emit(self.succeeded, self.failed)
+
+    def run_next(self):
+        raise NotImplementedError
+
+
+class BulkDeleteJob(BulkSubvolumeJob):
+    """Delete many subvolumes with few `subvolume delete --commit-after` calls.
+
+    Each call takes a whole batch of paths and commits the transaction once
+    after the last of them, instead of once per subvolume. pacing seconds
+    pass between batches so writers are not stalled by back-to-back commits.
+    """
+
+    DEFAULT_BATCH_SIZE = 100
+
+    def __init__(self, parent=None, btrfs=("sudo", "btrfs")):
+        super().__init__(parent, btrfs)
+        self.batches = deque()
+        self.batch = []
+        self.pacing = 0.0
+        self.stdout = ""
+        self.stderr = ""
+
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.output_received)
+        self.runner.error_received.connect(self.error_received)
+        self.runner.command_finished.connect(self.command_finished)
+
+    def start(self, paths, batch_size=DEFAULT_BATCH_SIZE, pacing=0.0):
+        if self.active:
+            return False
+        self.batches = deque(delete_batches(paths, batch_size))
+        self.pacing = pacing
+        self.begin(len(paths))
+        self.log.emit(f"Deleting {len(paths)} subvolumes in {len(self.batches)} batches.")
+        self.run_next()
+        return True
+
+    def cancel(self):
+        self.batches.clear()
+        if self.runner.is_running():
+            # command_finished reports the interrupted batch, then ends the job
+            self.runner.cancel()
+        else:
+            self.end()
+
+    def run_next(self):
+        if not self.active:
+            return
+        if not self.batches:
+            self.end()
+            return
+        self.batch = self.batches.popleft()
+        self.stdout = ""
+        self.stderr = ""
+        self.runner.run(self.btrfs + ["subvolume", "delete", "--commit-after"] + self.batch)
+
+    def output_received(self, text):
+        self.stdout += text
+
+    def error_received(self, text):
+        self.stderr += text
+
+    def command_finished(self, exit_code, status):
+        fallback = self.stderr.strip() or describe_finish(exit_code, status) or "not deleted"
+        for path, error in delete_results(self.batch, self.stdout, self.stderr).items():
+            if error is None:
+                # Never announced: btrfs stopped before reaching this path
+                error = fallback if exit_code != 0 else ""
+            self.item_done(path, error)
+        if status == "cancelled" or not self.batches:
+            self.end()
+        elif self.pacing > 0:
+            self.pace_timer.start(int(self.pacing * 1000))
+        else:
+            self.run_next()
+
+
+class BulkSnapshotJob(BulkSubvolumeJob):
+    """Take many snapshots with at most concurrency `subvolume snapshot` calls at once.
+
+    Every snapshot commits a transaction, so starts are spaced at least
+    pacing seconds apart on top of the concurrency bound.
+    """
+
+    DEFAULT_CONCURRENCY = 2
+
+    def __init__(self, parent=None, btrfs=("sudo", "btrfs")):
+        super().__init__(parent, btrfs)
+        self.queue = deque()
+        self.readonly = False
+        self.pacing = 0.0
+        self.last_start = 0.0
+        self.concurrency = self.DEFAULT_CONCURRENCY
+        self.runners = []
+        # runner -> [source, destination, stderr]
+        self.running = {}
+
+    def start(self, pairs, readonly=False, concurrency=DEFAULT_CONCURRENCY, pacing=0.0):
+        """pairs is a list of (source, destination) paths."""
+        if self.active:
+            return False
+        self.queue = deque(pairs)
+        self.readonly = readonly
+        self.pacing = pacing
+        self.last_start = 0.0
+        self.set_concurrency(concurrency)
+        self.begin(len(pairs))
+        self.log.emit(f"Creating {len(pairs)} snapshots, {concurrency} at a time.")
+        self.run_next()
+        return True
+
+    def set_concurrency(self, concurrency):
+        while len(self.runners) < concurrency:
+            runner = BtrfsCommandRunner(self)
+            runner.error_received.connect(lambda text, runner=runner: self.error_received(runner, text))
+            runner.command_finished.connect(
+                lambda exit_code, status, runner=runner: self.command_finished(runner, exit_code, status))
+            self.runners.append(runner)
+        self.concurrency = concurrency
+
+    def cancel(self):
+        self.queue.clear()
+        if self.running:
+            for runner in list(self.running):
+                runner.cancel()
+        else:
+            self.end()
+
+    def run_next(self):
+        if not self.active:
+            return
+        idle = [runner for runner in self.runners[:self.concurrency] if runner not in self.running]
+        while self.queue and idle:
+            wait = self.last_start + self.pacing - time.monotonic()
+            if wait > 0:
+                if not self.pace_timer.isActive():
+                    self.pace_timer.start(int(wait * 1000) + 1)
+                return
+            source, destination = self.queue.popleft()
+            runner = idle.pop()
+            self.running[runner] = [source, destination, ""]
+            self.last_start = time.monotonic()
+            options = ["-r"] if self.readonly else []
+            runner.run(self.btrfs + ["subvolume", "snapshot"] + options + [source, destination])
+        if not self.queue and not self.running:
+            self.end()
+
+    def error_received(self, runner, text):
+        if runner in self.running:
+            self.running[runner][2] += text
+
+    def command_finished(self, runner, exit_code, status):
+        source, destination, errors = self.running.pop(runner)
+        error = ""
+        if exit_code != 0:
+            error = errors.strip() or describe_finish(exit_code, status)
+        self.item_done(source, error)
+        if not error:
+            self.log.emit(f"Snapshot {source} -> {destination}")
+        self.run_next()
@@ -0,0 +1,179 @@
+import os
+import time
+from dataclasses import dataclass
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, QUERY_TIMEOUT, describe_finish
+from btrfsparsers_btrfsqt6 import SubvolumeListParser
+
+
+@dataclass(slots=True)
+class CleanerProgress:
+    pending: int
+    cleaned: int
+    subvolumes_per_minute: float
+    bytes_freed: int
+    bytes_per_second: float
+    eta: float
+
+
+def free_bytes(path):
+    """Bytes available to unprivileged users on the filesystem of path, or -1."""
+    try:
+        stat = os.statvfs(path)
+    except OSError:
+        return -1
+    return stat.f_bavail * stat.f_frsize
+
+
+class CleanerProgressTracker:
+    """Follow the deleted-but-not-cleaned subvolumes as the cleaner drains them.
+
+    Subvolumes are tracked by id, so deletions made while watching add to
+    the backlog instead of looking like negative progress.
+    """
+
+    # Weight of the newest sample in the smoothed rates
+    SMOOTHING = 0.3
+
+    def __init__(self):
+        self.pending = None
+        self.cleaned = 0
+        self.start_free = None
+        self.last_time = None
+        self.last_free = None
+        self.rate = 0.0
+        self.byte_rate = 0.0
+
+    def smooth(self, average, sample):
+        return sample if average == 0 else self.SMOOTHING * sample + (1 - self.SMOOTHING) * average
+
+    def update(self, pending_ids, free=-1, now=None):
+        now = time.monotonic() if now is None else now
+        pending_ids = set(pending_ids)
+        if self.pending is not None and now > self.last_time:
+            done = len(self.pending - pending_ids)
+            self.cleaned += done
+            elapsed = now - self.last_time
+            self.rate = self.smooth(self.rate, done / elapsed * 60)
+            if free >= 0 and self.last_free is not None and self.last_free >= 0:
+                self.byte_rate = self.smooth(self.byte_rate, max(free - self.last_free, 0) / elapsed)
+        if self.start_free is None and free >= 0:
+            self.start_free = free
+        self.pending = pending_ids
+        self.last_time = now
+        self.last_free = free
+
+        freed = max(free - self.start_free, 0) if free >= 0 and self.start_free is not None else 0
+        eta = len(pending_ids) / self.rate * 60 if pending_ids and self.rate > 0 else -1.0
+        if not pending_ids:
+            eta = 0.0
+        return CleanerProgress(len(pending_ids), self.cleaned, self.rate, freed, self.byte_rate, eta)
+
+
+class CleanerWatcher(QObject):
+    """Watch the btrfs-cleaner work through deleted subvolumes on a filesystem.
+
+    `subvolume list -d` is polled for the backlog while `subvolume sync`
+    runs alongside and returns once every subvolume deleted before it
+    started is gone. space_reclaimed(path, bytes_freed) is emitted once,
+    when sync returns or, if sync is unavailable, when the backlog is empty.
+    """
+
+    progress = pyqtSignal(object)
+    space_reclaimed = pyqtSignal(str, int)
+    watch_error = pyqtSignal(str)
+
+    POLL_INTERVAL = 5
+
+    def __init__(self, parent=None, btrfs=("sudo", "btrfs"), interval=POLL_INTERVAL):
+        super().__init__(parent)
+        self.btrfs = list(btrfs)
+        self.path = ""
+        self.tracker = None
+        self.parser = None
+        self.errors = ""
+        self.sync_errors = ""
+        self.last_progress = None
+        self.synced = False
+
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.output_received)
+        self.runner.error_received.connect(self.error_received)
+        self.runner.command_finished.connect(self.command_finished)
+
+        # `subvolume sync` blocks until the cleaner is done, so it gets its own runner
+        self.sync_runner = BtrfsCommandRunner(self)
+        self.sync_runner.error_received.connect(self.sync_error_received)
+        self.sync_runner.command_finished.connect(self.sync_finished)
+
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(int(interval * 1000))
+        self.poll_timer.timeout.connect(self.poll)
+
+    def is_active(self):
+        return self.tracker is not None
+
+    def start(self, path):
+        if self.tracker is not None and self.path == path:
+            return
+        self.stop()
+        self.path = path
+        self.tracker = CleanerProgressTracker()
+        self.last_progress = None
+        self.synced = False
+        self.sync_errors = ""
+        self.sync_runner.run(self.btrfs + ["subvolume", "sync", path])
+        self.poll_timer.start()
+        self.poll()
+
+    def stop(self):
+        self.poll_timer.stop()
+        self.tracker = None
+        self.runner.cancel()
+        self.sync_runner.cancel()
+
+    def poll(self):
+        if self.tracker is not None and not self.runner.is_running():
+            self.parser = SubvolumeListParser()
+            self.errors = ""
+            self.runner.run(self.btrfs + ["subvolume", "list", "-d", self.path], QUERY_TIMEOUT)
+
+    def output_received(self, text):
+        self.parser.feed_text(text)
+
+    def error_received(self, text):
+        self.errors += text
+
+    def command_finished(self, exit_code, status):
+        if self.tracker is None:
+            return
+        if exit_code != 0:
+            self.watch_error.emit(self.errors.strip() or describe_finish(exit_code, status))
+            return
+        pending = [record.id for record in self.parser.finish()]
+        self.last_progress = self.tracker.update(pending, free_bytes(self.path))
+        self.progress.emit(self.last_progress)
+        if self.synced or (not pending and not self.sync_runner.is_running()):
+            self.reclaimed()
+
+    def sync_error_received(self, text):
+        self.sync_errors += text
+
+    def sync_finished(self, exit_code, status):
+        if self.tracker is None or status == "cancelled":
+            return
+        if exit_code != 0:
+            # Old btrfs-progs or no permission: the polled backlog decides instead
+            self.watch_error.emit("subvolume sync: " + (self.sync_errors.strip() or
+                                                       describe_finish(exit_code, status)))
+            return
+        # One more sample, or the one in flight, gives the final numbers
+        self.synced = True
+        self.poll_timer.stop()
+        self.poll()
+
+    def reclaimed(self):
+        freed = self.last_progress.bytes_freed if self.last_progress else 0
+        path = self.path
+        self.stop()
+        self.space_reclaimed.emit(path, freed)
@@ -0,0 +1,229 @@
+import os
+import time
+import signal
+import shutil
+import codecs
+from PyQt6.QtCore import QObject, QProcess, QTimer, pyqtSignal
+from resultcache_btrfsqt6 import ResultCache, get_result_cache
+
+# Default timeout (seconds) for read-only queries such as stats, usage or list
+QUERY_TIMEOUT = 300
+
+
+def describe_finish(exit_code, status):
+    """Return the message to show when a command ends, or an empty string on success."""
+    if status == "cancelled":
+        return "Command cancelled."
+    if status == "timeout":
+        return "Command timed out and was terminated."
+    if status == "failed":
+        return "Command failed to run."
+    if exit_code != 0:
+        return f"Error: command exited with status {exit_code}"
+    return ""
+
+
+class BtrfsCommandRunner(QObject):
+    """Run one command at a time through QProcess without blocking the Qt event loop.
+
+    Output is streamed through signals as it arrives and the exit status is
+    reported through command_finished(exit_code, status), where status is one
+    of "exited", "cancelled", "timeout" or "failed".
+
+    With run(..., cache=True) a fresh cached result of a read-only query is
+    replayed through the same signals instead of starting a process;
+    from_cache tells the receiver which happened. Every mutating command
+    invalidates the cached results it affects, whichever runner starts it.
+    """
+
+    command_started = pyqtSignal(list)
+    output_received = pyqtSignal(str)
+    error_received = pyqtSignal(str)
+    command_finished = pyqtSignal(int, str)
+
+    # Seconds to wait after SIGTERM before the process group gets SIGKILL
+    KILL_GRACE_PERIOD = 5
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.process = QProcess(self)
+        self.process.readyReadStandardOutput.connect(self.read_output)
+        self.process.readyReadStandardError.connect(self.read_error)
+        self.process.finished.connect(self.process_finished)
+        self.process.errorOccurred.connect(self.process_error)
+
+        # Per-command timeout
+        self.timeout_timer = QTimer(self)
+        self.timeout_timer.setSingleShot(True)
+        self.timeout_timer.timeout.connect(self.timeout_expired)
+
+        # Escalation from SIGTERM to SIGKILL
+        self.kill_timer = QTimer(self)
+        self.kill_timer.setSingleShot(True)
+        self.kill_timer.timeout.connect(self.kill_process_group)
+
+        self.argv = []
+        self.stop_reason = None
+        self.stdout_decoder = None
+        self.stderr_decoder = None
+
+        # Result cache state: output captured for storing, or an entry being replayed
+        self.capture = None
+        self.capture_size = 0
+        self.replay = None
+        self.from_cache = False
+        self.cached_at = 0.0
+
+    def is_running(self):
+        return self.replay is not None or self.process.state() != QProcess.ProcessState.NotRunning
+
+    def run(self, argv, timeout=None, cache=False):
+        """Start argv asynchronously. timeout is in seconds; None means no limit."""
+        if self.is_running():
+            return False
+
+        self.argv = list(argv)
+        self.stop_reason = None
+        self.from_cache = False
+        self.capture = None
+        self.capture_size = 0
+        result_cache = get_result_cache()
+        result_cache.invalidate_for(self.argv)
+        if cache:
+            entry = result_cache.lookup(self.argv)
+            if entry is not None:
+                self.replay = entry
+                self.from_cache = True
+                self.cached_at = entry.stored
+                self.command_started.emit(self.argv)
+                # Deliver asynchronously, like a real process would
+                QTimer.singleShot(0, self.replay_cached)
+                return True
+            self.capture = []
+        self.stdout_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.stderr_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+        # setsid makes the child the leader of a new process group, so cancel()
+        # reaches everything it spawns (sudo, btrfs and any helpers).
+        setsid = shutil.which("setsid")
+        if setsid:
+            self.process.start(setsid, self.argv)
+        else:
+            self.process.start(self.argv[0], self.argv[1:])
+
+        if timeout:
+            self.timeout_timer.start(int(timeout * 1000))
+        self.command_started.emit(self.argv)
+        return True
+
+    def cancel(self):
+        """Terminate the running command and its whole process group."""
+        if self.replay is not None:
+            self.replay = None
+            self.command_finished.emit(-1, "cancelled")
+        elif self.is_running():
+            self.stop("cancelled")
+
+    def replay_cached(self):
+        entry = self.replay
+        if entry is None:
+            return
+        self.replay = None
+        for stream, text in entry.chunks:
+            if stream == "stdout":
+                self.output_received.emit(text)
+            else:
+                self.error_received.emit(text)
+        self.command_finished.emit(0, "exited")
+
+    def cache_age(self):
+        """Seconds since the result of the last cached run was produced."""
+        return time.monotonic() - self.cached_at
+
+    def stop(self, reason):
+        self.stop_reason = reason
+        self.timeout_timer.stop()
+        self.signal_process_group(signal.SIGTERM)
+        self.kill_timer.start(self.KILL_GRACE_PERIOD * 1000)
+
+    def timeout_expired(self):
+        if self.is_running():
+            self.stop("timeout")
+
+    def kill_process_group(self):
+        if self.is_running():
+            self.signal_process_group(signal.SIGKILL)
+
+    def signal_process_group(self, signum):
+        pid = self.process.processId()
+        if not pid:
+            return
+        try:
+            os.killpg(pid, signum)
+        except (ProcessLookupError, PermissionError):
+            # Not a group leader (no setsid) or already gone
+            if signum == signal.SIGKILL:
+                self.process.kill()
+            else:
+                self.process.terminate()
+
+    def read_output(self):
+        data = bytes(self.process.readAllStandardOutput())
+        self.emit_output(self.stdout_decoder.decode(data))
+
+    def read_error(self):
+        data = bytes(self.process.readAllStandardError())
+        self.emit_error(self.stderr_decoder.decode(data))
+
+    def capture_text(self, stream, text):
+        if self.capture is None:
+            return
+        self.capture_size += len(text)
+        if self.capture_size > ResultCache.MAX_ENTRY_BYTES:
+            # Too large to be cached; stop holding it in memory
+            self.capture = None
+            return
+        self.capture.append((stream, text))
+
+    def emit_output(self, text):
+        if text:
+            self.capture_text("stdout", text)
+            self.output_received.emit(text)
+
+    def emit_error(self, text):
+        if text:
+            self.capture_text("stderr", text)
+            self.error_received.emit(text)
+
+    def process_finished(self, exit_code, exit_status):
+        self.timeout_timer.stop()
+        self.kill_timer.stop()
+
+        # Flush anything still buffered in the decoders
+        self.read_output()
+        self.read_error()
+        self.emit_output(self.stdout_decoder.decode(b"", final=True))
+        self.emit_error(self.stderr_decoder.decode(b"", final=True))
+
+        result_cache = get_result_cache()
+        # A mutation may have changed things while it ran, so drop stale results again
+        result_cache.invalidate_for(self.argv)
+        if self.capture is not None and not self.stop_reason and \
+                exit_status == QProcess.ExitStatus.NormalExit and exit_code == 0:
+            result_cache.store(self.argv, self.capture)
+        self.capture = None
+
+        if self.stop_reason:
+            self.command_finished.emit(-1, self.stop_reason)
+        elif exit_status == QProcess.ExitStatus.CrashExit:
+            self.command_finished.emit(-1, "failed")
+        else:
+            self.command_finished.emit(exit_code, "exited")
+
+    def process_error(self, error):
+        # Only start failures never reach process_finished
+        if error == QProcess.ProcessError.FailedToStart:
+            self.timeout_timer.stop()
+            self.error_received.emit(f"Failed to start {self.argv[0]}: {self.process.errorString()}\n")
+            self.command_finished.emit(-1, "failed")
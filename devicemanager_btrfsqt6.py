@@ -1,17 +1,43 @@
 import sys
-import subprocess
-from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QTextEdit, QLineEdit, QComboBox
-from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QLineEdit, QComboBox, QSpinBox, QTableWidget, QTableWidgetItem, QHeaderView
+from PyQt6.QtGui import QColor
+from PyQt6.QtCore import Qt, pyqtSignal
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, QUERY_TIMEOUT, describe_finish
+from outputconsole_btrfsqt6 import BtrfsOutputConsole
+from blockinventory_btrfsqt6 import get_inventory
+from devicestats_btrfsqt6 import DeviceErrorCollector
 
 class BtrfsGUI(QWidget):
+    # Emitted when the user asks to return to the main menu
+    back_requested = pyqtSignal()
+
     def __init__(self):
         super().__init__()
 
         self.setWindowTitle("Btrfs Device Management")
         self.setGeometry(200, 200, 600, 500)
-        
+
+        # Asynchronous command runner
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.append_output)
+        self.runner.error_received.connect(self.append_output)
+        self.runner.command_finished.connect(self.command_finished)
+
+        # Background error counter collector
+        self.collector = DeviceErrorCollector(self)
+        self.collector.sample_ready.connect(self.update_error_table)
+        self.collector.alarm.connect(self.error_alarm)
+        self.collector.collector_error.connect(
+            lambda message: self.output_display.append_line(f"Error counters: {message}"))
+        self.alarmed = set()
+
         self.initUI()
+        self.collector.start(self.stats_interval.value())
     
+    ERROR_COLUMNS = ["Device", "Write", "Read", "Flush", "Corruption", "Generation", "Errors/h (24h)"]
+    # Window for the error rate column
+    RATE_WINDOW = 24 * 3600
+
     def initUI(self):
         # Main layout
         main_layout = QVBoxLayout(self)
@@ -27,6 +53,7 @@ class BtrfsGUI(QWidget):
         self.device_combo.setStyleSheet(self.get_styles())
         self.device_combo.setPlaceholderText("Select or enter a device")
         self.update_device_list()
+        get_inventory().changed.connect(self.update_device_list)
         main_layout.addWidget(self.device_combo)
 
         # Manual device input field
@@ -71,10 +98,32 @@ class BtrfsGUI(QWidget):
         self.device_usage_button.clicked.connect(self.device_usage_action)
         main_layout.addWidget(self.device_usage_button)
 
+        # Cancel command button
+        self.cancel_button = QPushButton("Cancel Command", self)
+        self.cancel_button.setStyleSheet(self.get_styles())
+        self.cancel_button.clicked.connect(self.runner.cancel)
+        main_layout.addWidget(self.cancel_button)
+
+        # Error counter time series
+        stats_layout = QHBoxLayout()
+        stats_layout.addWidget(QLabel("Error counters, sampled every (s):", self))
+        self.stats_interval = QSpinBox(self)
+        self.stats_interval.setRange(5, 3600)
+        self.stats_interval.setValue(DeviceErrorCollector.DEFAULT_INTERVAL)
+        self.stats_interval.valueChanged.connect(self.collector.set_interval)
+        stats_layout.addWidget(self.stats_interval)
+        main_layout.addLayout(stats_layout)
+
+        self.error_table = QTableWidget(0, len(self.ERROR_COLUMNS), self)
+        self.error_table.setHorizontalHeaderLabels(self.ERROR_COLUMNS)
+        self.error_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.error_table.verticalHeader().setVisible(False)
+        self.error_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        main_layout.addWidget(self.error_table)
+
         # Output display area
-        self.output_display = QTextEdit(self)
+        self.output_display = BtrfsOutputConsole(self)
         self.output_display.setStyleSheet(self.get_styles())
-        self.output_display.setReadOnly(True)
         main_layout.addWidget(self.output_display)
 
         # Back button
@@ -139,7 +188,7 @@ class BtrfsGUI(QWidget):
                 padding: 10px;
             }
 
-            QTextEdit {
+            QTextEdit, QPlainTextEdit {
                 background-color: #444A53;
                 color: white;
                 font-family: Consolas, monospace;
@@ -158,18 +207,38 @@ class BtrfsGUI(QWidget):
         """
 
     def update_device_list(self):
-        devices = self.get_devices_from_lsblk()
+        """List every non-empty block device from the shared inventory."""
+        current = self.device_combo.currentText()
+        devices = [device.path for device in get_inventory().block_devices() if device.size > 0]
         self.device_combo.clear()
         self.device_combo.addItems(devices)
-
-    def get_devices_from_lsblk(self):
-        try:
-            result = subprocess.run(['lsblk', '-o', 'NAME,SIZE'], capture_output=True, text=True)
-            devices = result.stdout.splitlines()
-            return [line.split()[0] for line in devices if line.startswith('sd')]
-        except Exception as e:
-            self.output_display.setPlainText(f"Error fetching devices: {e}")
-            return []
+        self.device_combo.setCurrentIndex(self.device_combo.findText(current))
+
+    def update_error_table(self):
+        """Show the newest counters of every device, red for devices that alarmed."""
+        keys = sorted(self.collector.series, key=self.collector.labels.get)
+        if self.error_table.rowCount() != len(keys):
+            self.error_table.setRowCount(len(keys))
+        for row, key in enumerate(keys):
+            series = self.collector.series[key]
+            rate = sum(series.rates(self.RATE_WINDOW))
+            values = [self.collector.labels[key]] + [str(value) for value in series.counters_at(-1)]
+            values.append(f"{rate:.2f}" if rate else "0")
+            color = QColor("#D9534F") if key in self.alarmed else QColor("white")
+            for column, text in enumerate(values):
+                item = self.error_table.item(row, column)
+                if item is None:
+                    item = QTableWidgetItem()
+                    self.error_table.setItem(row, column, item)
+                if item.text() != text:
+                    item.setText(text)
+                item.setForeground(color)
+
+    def error_alarm(self, label, counter, delta):
+        for key, known in self.collector.labels.items():
+            if known == label:
+                self.alarmed.add(key)
+        self.output_display.append_line(f"ALARM: {label} {counter} increased by {delta}")
 
     def add_device_action(self):
         device = self.get_selected_device()
@@ -198,34 +267,39 @@ class BtrfsGUI(QWidget):
     def device_stats_action(self):
         device = self.get_selected_device()
         if device:
-            self.run_btrfs_command(f"device stats {device}")
+            self.run_btrfs_command(f"device stats {device}", QUERY_TIMEOUT)
         else:
             self.output_display.setPlainText("Please select or enter a device.")
 
     def device_usage_action(self):
         device = self.get_selected_device()
         if device:
-            self.run_btrfs_command(f"device usage {device}")
+            self.run_btrfs_command(f"device usage {device}", QUERY_TIMEOUT)
         else:
             self.output_display.setPlainText("Please select or enter a device.")
 
     def go_back(self):
-        try:
-            subprocess.run(["./main-btrfsqt6"], check=True)
-        except FileNotFoundError:
-            print("main-btrfsqt6.elf64 not found!")
-        except subprocess.CalledProcessError as e:
-            print(f"main-btrfsqt6.elf64 failed to execute: {e}")
-
-    def run_btrfs_command(self, command):
-        try:
-            result = subprocess.run(['sudo', 'btrfs'] + command.split(), capture_output=True, text=True)
-            if result.returncode == 0:
-                self.output_display.setPlainText(result.stdout)
-            else:
-                self.output_display.setPlainText(f"Error: {result.stderr}")
-        except Exception as e:
-            self.output_display.setPlainText(f"Error executing command: {e}")
+        """Return to the main menu."""
+        self.back_requested.emit()
+
+    def run_btrfs_command(self, command, timeout=None):
+        """Start the btrfs command and stream its output into the display."""
+        if self.runner.is_running():
+            self.output_display.append_line("A command is already running. Cancel it first.")
+            return
+        self.output_display.clear()
+        self.runner.run(['sudo', 'btrfs'] + command.split(), timeout, cache=True)
+
+    def append_output(self, text):
+        self.output_display.append_text(text)
+
+    def command_finished(self, exit_code, status):
+        self.output_display.finish()
+        if self.runner.from_cache:
+            self.output_display.append_line(f"(cached result from {self.runner.cache_age():.0f}s ago)")
+        message = describe_finish(exit_code, status)
+        if message:
+            self.output_display.append_line(message)
 
     def get_selected_device(self):
         device = self.device_combo.currentText()
@@ -234,5 +308,6 @@ class BtrfsGUI(QWidget):
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = BtrfsGUI()
+    window.back_requested.connect(window.close)
     window.show()
     sys.exit(app.exec())
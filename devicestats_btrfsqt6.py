@@ -0,0 +1,229 @@
+import os
+import time
+from array import array
+from collections import deque
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, QUERY_TIMEOUT, describe_finish
+from btrfsparsers_btrfsqt6 import DeviceStatsParser, DEVICE_ERROR_COUNTERS
+from blockinventory_btrfsqt6 import SYS_BTRFS, read_file, get_inventory
+
+# sysfs error_stats names, in DEVICE_ERROR_COUNTERS order
+SYSFS_ERROR_COUNTERS = ("write_errs", "read_errs", "flush_errs", "corruption_errs", "generation_errs")
+
+
+def read_sysfs_error_stats(sys_btrfs=SYS_BTRFS):
+    """Read /sys/fs/btrfs/<uuid>/devinfo/<devid>/error_stats (Linux 5.14+).
+
+    Returns ({(uuid, devid): [counters]}, uuids without error_stats).
+    """
+    stats = {}
+    missing = set()
+    try:
+        filesystems = os.listdir(sys_btrfs)
+    except OSError:
+        return stats, missing
+    for uuid in filesystems:
+        devinfo = os.path.join(sys_btrfs, uuid, "devinfo")
+        try:
+            devids = os.listdir(devinfo)
+        except OSError:
+            continue
+        for devid in devids:
+            text = read_file(os.path.join(devinfo, devid, "error_stats"), None)
+            if text is None:
+                missing.add(uuid)
+                break
+            values = dict(line.split() for line in text.splitlines() if len(line.split()) == 2)
+            stats[(uuid, int(devid))] = [int(values.get(name, 0)) for name in SYSFS_ERROR_COUNTERS]
+    return stats, missing
+
+
+class CounterRing:
+    """Fixed-capacity time series of error counters in flat typed arrays.
+
+    Timestamps and counters live in preallocated array('d') and array('q')
+    buffers, so a series costs 8 * (1 + width) bytes per sample no matter
+    how long it has been collecting.
+    """
+
+    def __init__(self, capacity, width=len(DEVICE_ERROR_COUNTERS)):
+        self.capacity = capacity
+        self.width = width
+        self.times = array("d", bytes(8 * capacity))
+        self.values = array("q", bytes(8 * capacity * width))
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, now, counters):
+        slot = (self.start + self.count) % self.capacity
+        if self.count == self.capacity:
+            self.start = (self.start + 1) % self.capacity
+        else:
+            self.count += 1
+        self.times[slot] = now
+        offset = slot * self.width
+        self.values[offset:offset + self.width] = array("q", counters)
+
+    def slot(self, index):
+        """Physical slot of the index-th oldest sample; negative counts from the newest."""
+        if index < 0:
+            index += self.count
+        return (self.start + index) % self.capacity
+
+    def time_at(self, index):
+        return self.times[self.slot(index)]
+
+    def counters_at(self, index):
+        offset = self.slot(index) * self.width
+        return self.values[offset:offset + self.width]
+
+    def delta(self):
+        """Change of every counter between the last two samples."""
+        if self.count < 2:
+            return [0] * self.width
+        newest, previous = self.counters_at(-1), self.counters_at(-2)
+        return [new - old for new, old in zip(newest, previous)]
+
+    def rates(self, window):
+        """Increase per hour of every counter over the last window seconds.
+
+        A counter that went down (reset with `device stats -z`) counts from zero.
+        """
+        if self.count < 2:
+            return [0.0] * self.width
+        newest_time = self.time_at(-1)
+        # Binary search for the oldest sample inside the window
+        low, high = 0, self.count - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.time_at(middle) < newest_time - window:
+                low = middle + 1
+            else:
+                high = middle
+        low = min(low, self.count - 2)
+        elapsed = newest_time - self.time_at(low)
+        if elapsed <= 0:
+            return [0.0] * self.width
+        newest, oldest = self.counters_at(-1), self.counters_at(low)
+        return [(new - old if new >= old else new) * 3600 / elapsed for new, old in zip(newest, oldest)]
+
+
+class DeviceErrorCollector(QObject):
+    """Sample the error counters of every mounted btrfs device at a fixed interval.
+
+    sysfs is read directly; filesystems on kernels without error_stats fall
+    back to one `btrfs device stats` call per mount point. Series of devices
+    that disappear are dropped, so memory depends only on the device count.
+    """
+
+    sample_ready = pyqtSignal()
+    alarm = pyqtSignal(str, str, int)
+    collector_error = pyqtSignal(str)
+
+    DEFAULT_INTERVAL = 60
+    # One week of samples at the default interval
+    DEFAULT_CAPACITY = 7 * 24 * 60
+
+    def __init__(self, parent=None, capacity=DEFAULT_CAPACITY, sys_btrfs=SYS_BTRFS):
+        super().__init__(parent)
+        self.capacity = capacity
+        self.sys_btrfs = sys_btrfs
+        self.series = {}
+        self.labels = {}
+        self.seen = set()
+        self.round_failed = False
+        self.queue = deque()
+        self.round_time = 0.0
+        self.parser = None
+        self.errors = ""
+
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.output_received)
+        self.runner.error_received.connect(self.error_received)
+        self.runner.command_finished.connect(self.command_finished)
+
+        self.sample_timer = QTimer(self)
+        self.sample_timer.timeout.connect(self.sample)
+
+    def is_active(self):
+        return self.sample_timer.isActive()
+
+    def start(self, interval=DEFAULT_INTERVAL):
+        self.sample_timer.start(int(interval * 1000))
+        self.sample()
+
+    def stop(self):
+        self.sample_timer.stop()
+        self.queue.clear()
+        self.runner.cancel()
+
+    def set_interval(self, interval):
+        self.sample_timer.setInterval(int(interval * 1000))
+
+    def sample(self):
+        # Skip a tick while the fallback commands of the last round still run
+        if self.runner.is_running() or self.queue:
+            return
+        self.round_time = time.monotonic()
+        self.seen = set()
+        self.round_failed = False
+        mount_points = {}
+        for mount in get_inventory().btrfs_mounts():
+            mount_points.setdefault(mount.uuid, mount.mount_point)
+
+        stats, missing = read_sysfs_error_stats(self.sys_btrfs)
+        for (uuid, devid), counters in stats.items():
+            label = f"{mount_points.get(uuid, uuid[:8])} devid {devid}"
+            self.record(f"{uuid}:{devid}", label, counters)
+        for uuid in missing:
+            if uuid in mount_points:
+                self.queue.append(mount_points[uuid])
+        self.run_next()
+
+    def record(self, key, label, counters):
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = CounterRing(self.capacity)
+        self.labels[key] = label
+        self.seen.add(key)
+        series.append(self.round_time, counters)
+        for name, delta in zip(DEVICE_ERROR_COUNTERS, series.delta()):
+            # A negative delta is a counter reset, not an error
+            if delta > 0:
+                self.alarm.emit(label, name, delta)
+
+    def run_next(self):
+        if not self.queue:
+            self.finish_round()
+            return
+        self.parser = DeviceStatsParser()
+        self.errors = ""
+        self.runner.run(['sudo', 'btrfs', 'device', 'stats', self.queue.popleft()], QUERY_TIMEOUT)
+
+    def output_received(self, text):
+        self.parser.feed_text(text)
+
+    def error_received(self, text):
+        self.errors += text
+
+    def command_finished(self, exit_code, status):
+        devices = self.parser.finish()
+        if exit_code != 0:
+            self.round_failed = True
+            self.collector_error.emit(self.errors.strip() or describe_finish(exit_code, status))
+        for path, counters in devices.items():
+            self.record(path, path, [counters.get(name, 0) for name in DEVICE_ERROR_COUNTERS])
+        if status == "cancelled":
+            return
+        self.run_next()
+
+    def finish_round(self):
+        # Keep the history of devices a failed command could not report on
+        for key in [] if self.round_failed else list(self.series):
+            if key not in self.seen:
+                del self.series[key]
+                del self.labels[key]
+        self.sample_ready.emit()
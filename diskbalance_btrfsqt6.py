@@ -1,19 +1,54 @@
 import sys
-import subprocess
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
-    QComboBox, QTextEdit, QGroupBox
+    QComboBox, QGroupBox, QFormLayout, QSpinBox, QDoubleSpinBox, QCheckBox, QProgressBar
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, pyqtSignal
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, QUERY_TIMEOUT, describe_finish
+from outputconsole_btrfsqt6 import BtrfsOutputConsole
+from blockinventory_btrfsqt6 import get_inventory
+from balancescheduler_btrfsqt6 import IncrementalBalance
+from balancemonitor_btrfsqt6 import BalanceWatcher
+from balancegovernor_btrfsqt6 import BalanceGovernor, load_governor_settings, save_governor_settings
+from btrfsparsers_btrfsqt6 import format_duration
 
 
 class BtrfsBalanceDebugger(QWidget):
+    # Emitted when the user asks to return to the main menu
+    back_requested = pyqtSignal()
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Btrfs Balance Debugger")
         self.resize(800, 600)
         self.setStyleSheet(self.get_styles())
 
+        # Asynchronous command runner
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.append_output)
+        self.runner.error_received.connect(self.append_output)
+        self.runner.command_finished.connect(self.command_finished)
+
+        # Incremental balance scheduler
+        self.incremental = IncrementalBalance(self)
+        self.incremental.log.connect(self.append_log)
+        self.incremental.finished.connect(self.incremental_finished)
+        self.incremental.step_started.connect(lambda step, steps: self.watcher.start(self.incremental.path))
+
+        # Background balance progress watcher
+        self.watcher = BalanceWatcher(self)
+        self.watcher.progress.connect(self.show_balance_progress)
+        self.watcher.transition.connect(self.balance_transition)
+        self.watcher.watch_error.connect(lambda message: self.debug_console.append_line(f"Watcher: {message}"))
+        self.balance_state = "none"
+
+        # Pressure-aware pause/resume governor
+        self.governor = BalanceGovernor(self)
+        self.governor.log.connect(self.append_log)
+        self.watcher.transition.connect(self.governor.balance_transition)
+        # A step paused by the governor or the user continues once the balance completes
+        self.watcher.transition.connect(self.incremental.balance_transition)
+
         # Main Layout
         layout = QVBoxLayout()
 
@@ -31,13 +66,75 @@ class BtrfsBalanceDebugger(QWidget):
         path_layout = QVBoxLayout()
         self.path_select = QComboBox()
         self.populate_mount_points()
+        get_inventory().changed.connect(self.populate_mount_points)
+        self.path_select.currentTextChanged.connect(self.load_governor_settings)
         path_layout.addWidget(QLabel("Available Paths:"))
         path_layout.addWidget(self.path_select)
         path_group.setLayout(path_layout)
 
+        # Incremental Balance
+        incremental_group = QGroupBox("Incremental Balance")
+        incremental_layout = QFormLayout()
+        self.target_unallocated = QDoubleSpinBox()
+        self.target_unallocated.setRange(0.1, 1048576)
+        self.target_unallocated.setValue(10)
+        self.target_unallocated.setSuffix(" GiB")
+        incremental_layout.addRow("Unallocated goal:", self.target_unallocated)
+        self.usage_cap = QSpinBox()
+        self.usage_cap.setRange(0, 100)
+        self.usage_cap.setValue(50)
+        self.usage_cap.setSuffix(" %")
+        incremental_layout.addRow("Usage cap:", self.usage_cap)
+        self.chunk_limit = QSpinBox()
+        self.chunk_limit.setRange(0, 100000)
+        self.chunk_limit.setSpecialValueText("No limit")
+        incremental_layout.addRow("Chunks per step (limit=):", self.chunk_limit)
+        self.devid_filter = QSpinBox()
+        self.devid_filter.setRange(0, 65535)
+        self.devid_filter.setSpecialValueText("All devices")
+        incremental_layout.addRow("Device (devid=):", self.devid_filter)
+        self.metadata_checkbox = QCheckBox("Also balance metadata (-musage)")
+        self.metadata_checkbox.setChecked(True)
+        incremental_layout.addRow(self.metadata_checkbox)
+        self.incremental_button = QPushButton("Start Incremental Balance")
+        self.incremental_button.clicked.connect(self.toggle_incremental_balance)
+        incremental_layout.addRow(self.incremental_button)
+        incremental_group.setLayout(incremental_layout)
+
+        # Balance Progress
+        progress_group = QGroupBox("Balance Progress")
+        progress_layout = QVBoxLayout()
+        self.balance_progress = QProgressBar()
+        self.balance_progress.setRange(0, 100)
+        self.balance_progress.setValue(0)
+        progress_layout.addWidget(self.balance_progress)
+        self.balance_progress_label = QLabel("Not watching")
+        progress_layout.addWidget(self.balance_progress_label)
+        self.watch_button = QPushButton("Watch Balance")
+        self.watch_button.clicked.connect(self.toggle_watch)
+        progress_layout.addWidget(self.watch_button)
+        progress_group.setLayout(progress_layout)
+
+        # Pressure Governor
+        self.loading_governor_settings = False
+        governor_group = QGroupBox("Pressure Governor")
+        governor_layout = QFormLayout()
+        self.governor_checkbox = QCheckBox("Pause the balance automatically under I/O pressure")
+        self.governor_checkbox.toggled.connect(self.toggle_governor)
+        governor_layout.addRow(self.governor_checkbox)
+        self.psi_pause = self.governor_spin_box(0, 100, " %")
+        self.psi_resume = self.governor_spin_box(0, 100, " %")
+        governor_layout.addRow("I/O pressure pause / resume:", self.spin_box_pair(self.psi_pause, self.psi_resume))
+        self.await_pause = self.governor_spin_box(0, 100000, " ms")
+        self.await_resume = self.governor_spin_box(0, 100000, " ms")
+        governor_layout.addRow("Device await pause / resume:", self.spin_box_pair(self.await_pause, self.await_resume))
+        self.cooldown = self.governor_spin_box(0, 86400, " s")
+        governor_layout.addRow("Resume after calm for:", self.cooldown)
+        governor_group.setLayout(governor_layout)
+        self.load_governor_settings(self.path_select.currentText())
+
         # Debug Console
-        self.debug_console = QTextEdit()
-        self.debug_console.setReadOnly(True)
+        self.debug_console = BtrfsOutputConsole()
         self.debug_console.setPlaceholderText("Debug output will appear here...")
 
         # Buttons Layout
@@ -48,6 +145,11 @@ class BtrfsBalanceDebugger(QWidget):
         run_button.clicked.connect(self.run_command)
         buttons_layout.addWidget(run_button)
 
+        # Cancel Button
+        cancel_button = QPushButton("Cancel")
+        cancel_button.clicked.connect(self.runner.cancel)
+        buttons_layout.addWidget(cancel_button)
+
         # Back Button
         back_button = QPushButton("Back")
         back_button.clicked.connect(self.run_back_process)
@@ -56,23 +158,27 @@ class BtrfsBalanceDebugger(QWidget):
         # Layout Setup
         layout.addWidget(command_group)
         layout.addWidget(path_group)
+        layout.addWidget(incremental_group)
+        layout.addWidget(progress_group)
+        layout.addWidget(governor_group)
         layout.addWidget(self.debug_console)
         layout.addLayout(buttons_layout)
         self.setLayout(layout)
 
     def populate_mount_points(self):
-        """Populate the combo box with available mount points."""
-        try:
-            result = subprocess.run(["lsblk", "-o", "MOUNTPOINT"], capture_output=True, text=True)
-            if result.returncode == 0:
-                mount_points = result.stdout.splitlines()[1:]
-                for mount_point in mount_points:
-                    if mount_point.strip():  # Ignore empty entries
-                        self.path_select.addItem(mount_point.strip())
-            else:
-                self.debug_console.append("Error fetching mount points!")
-        except Exception as e:
-            self.debug_console.append(f"Error: {str(e)}")
+        """Populate the combo box with mounted btrfs filesystems, keeping the selection."""
+        current = self.path_select.currentText()
+        # Repopulating passes through an empty selection; only a real change
+        # of mount point may reload the settings or stop the governor
+        self.path_select.blockSignals(True)
+        self.path_select.clear()
+        self.path_select.addItems(get_inventory().btrfs_mount_points())
+        index = self.path_select.findText(current)
+        if index >= 0:
+            self.path_select.setCurrentIndex(index)
+        self.path_select.blockSignals(False)
+        if self.path_select.currentText() != current:
+            self.path_select.currentTextChanged.emit(self.path_select.currentText())
 
     def run_command(self):
         """Run the selected btrfs command and display debug output."""
@@ -80,34 +186,168 @@ class BtrfsBalanceDebugger(QWidget):
         path = self.path_select.currentText()
 
         if not path:
-            self.debug_console.append("Error: No path selected!")
+            self.debug_console.append_line("Error: No path selected!")
+            return
+
+        if self.runner.is_running():
+            self.debug_console.append_line("Error: A command is already running!")
+            return
+
+        full_command = ["btrfs", "balance", command, path]
+        self.debug_console.append_line(f"Running command: {' '.join(full_command)}")
+        self.debug_console.append_line("Output:")
+        timeout = QUERY_TIMEOUT if command == "status" else None
+        self.runner.run(full_command, timeout)
+        if command in ("start", "resume"):
+            self.start_watch(path)
+
+    def append_output(self, text):
+        self.debug_console.append_text(text)
+
+    def command_finished(self, exit_code, status):
+        if self.runner.argv[2] in ("start", "resume") and not self.governor.is_active():
+            # A foreground balance ended; let the watcher record how. The governor
+            # keeps it watching: a balance it paused is resumed in the background
+            self.watcher.finish()
+        self.debug_console.finish()
+        message = describe_finish(exit_code, status)
+        if message:
+            self.debug_console.append_line(message)
+
+    def toggle_incremental_balance(self):
+        """Start or stop the incremental usage-filtered balance."""
+        if self.incremental.is_active():
+            self.incremental.stop()
+            return
+
+        path = self.path_select.currentText()
+        if not path:
+            self.debug_console.append_line("Error: No path selected!")
+            return
+        if self.runner.is_running():
+            self.debug_console.append_line("Error: A command is already running!")
+            return
+
+        target = int(self.target_unallocated.value() * 1024 ** 3)
+        self.incremental.start(path, target, self.usage_cap.value(),
+                               self.chunk_limit.value() or None,
+                               self.devid_filter.value() or None,
+                               self.metadata_checkbox.isChecked())
+        self.incremental_button.setText("Stop Incremental Balance")
+
+    def toggle_watch(self):
+        if self.watcher.is_active():
+            self.watcher.stop()
+            self.watch_button.setText("Watch Balance")
+            self.balance_progress_label.setText("Not watching")
+            return
+        path = self.path_select.currentText()
+        if not path:
+            self.debug_console.append_line("Error: No path selected!")
+            return
+        self.start_watch(path)
+
+    def start_watch(self, path):
+        self.watcher.start(path)
+        self.watch_button.setText("Stop Watching")
+        self.balance_progress_label.setText(f"Watching {path}...")
+
+    def governor_spin_box(self, minimum, maximum, suffix):
+        spin_box = QDoubleSpinBox()
+        spin_box.setRange(minimum, maximum)
+        spin_box.setDecimals(1)
+        spin_box.setSuffix(suffix)
+        spin_box.valueChanged.connect(self.save_governor_settings)
+        return spin_box
+
+    def spin_box_pair(self, first, second):
+        pair = QHBoxLayout()
+        pair.addWidget(first)
+        pair.addWidget(second)
+        return pair
+
+    def load_governor_settings(self, path):
+        """Show the governor tunables stored for the selected mount point."""
+        if not path:
+            return
+        if self.governor.is_active() and self.governor.path != path:
+            self.governor_checkbox.setChecked(False)
+        settings = load_governor_settings(path)
+        self.loading_governor_settings = True
+        self.psi_pause.setValue(settings.psi_pause)
+        self.psi_resume.setValue(settings.psi_resume)
+        self.await_pause.setValue(settings.await_pause_ms)
+        self.await_resume.setValue(settings.await_resume_ms)
+        self.cooldown.setValue(settings.cooldown)
+        self.loading_governor_settings = False
+
+    def save_governor_settings(self):
+        path = self.path_select.currentText()
+        if self.loading_governor_settings or not path:
+            return
+        settings = load_governor_settings(path)
+        settings.psi_pause = self.psi_pause.value()
+        settings.psi_resume = self.psi_resume.value()
+        settings.await_pause_ms = self.await_pause.value()
+        settings.await_resume_ms = self.await_resume.value()
+        settings.cooldown = self.cooldown.value()
+        save_governor_settings(path, settings)
+        if self.governor.is_active():
+            # The policy holds a reference, so new levels apply from the next sample
+            self.governor.settings.psi_pause = settings.psi_pause
+            self.governor.settings.psi_resume = settings.psi_resume
+            self.governor.settings.await_pause_ms = settings.await_pause_ms
+            self.governor.settings.await_resume_ms = settings.await_resume_ms
+            self.governor.settings.cooldown = settings.cooldown
+
+    def toggle_governor(self, enabled):
+        if not enabled:
+            if self.governor.is_active():
+                self.governor.stop()
+                self.debug_console.append_line("Governor stopped.")
+            return
+        path = self.path_select.currentText()
+        if not path:
+            self.debug_console.append_line("Error: No path selected!")
+            self.governor_checkbox.setChecked(False)
             return
+        devices = [device.name for device in get_inventory().member_devices(path)]
+        self.governor.start(path, devices, balance_state=self.balance_state)
+        # The governor learns about pauses and resumes from the watcher
+        self.start_watch(path)
+
+    def show_balance_progress(self, progress):
+        self.balance_state = progress.state
+        if progress.state == "none":
+            self.balance_progress_label.setText("No balance running")
+            return
+        if progress.total:
+            self.balance_progress.setValue(100 - progress.percent_left)
+        text = (f"{progress.state}: {progress.completed} out of about {progress.total} chunks "
+                f"({progress.considered} considered), {progress.percent_left}% left")
+        if progress.chunks_per_minute > 0:
+            text += f" | {progress.chunks_per_minute:.1f} chunks/min"
+        if progress.eta >= 0:
+            text += f", ETA {format_duration(progress.eta)}"
+        self.balance_progress_label.setText(text)
+
+    def balance_transition(self, transition):
+        self.debug_console.append_line(f"Balance {transition}.")
+        if transition == "completed":
+            self.balance_progress.setValue(100)
+        if not self.watcher.is_active():
+            self.watch_button.setText("Watch Balance")
 
-        try:
-            full_command = ["btrfs", "balance", command, path]
-            self.debug_console.append(f"Running command: {' '.join(full_command)}")
-            result = subprocess.run(full_command, capture_output=True, text=True)
+    def append_log(self, message):
+        self.debug_console.append_line(message)
 
-            if result.returncode == 0:
-                self.debug_console.append(f"Output:\n{result.stdout}")
-            else:
-                self.debug_console.append(f"Error:\n{result.stderr}")
-        except Exception as e:
-            self.debug_console.append(f"Exception: {str(e)}")
+    def incremental_finished(self, success, message):
+        self.debug_console.append_line(message)
+        self.incremental_button.setText("Start Incremental Balance")
 
     def run_back_process(self):
-        """Trigger subprocess for 'btrfsqt6-main.elf64' when Back button is pressed."""
-        try:
-            # Run the subprocess command for btrfsqt6-main.elf64
-            self.debug_console.append("Running btrfsqt6-main.elf64 process...")
-            result = subprocess.run(["./btrfsqt6-main.elf64"], capture_output=True, text=True)
-
-            if result.returncode == 0:
-                self.debug_console.append(f"Process Output:\n{result.stdout}")
-            else:
-                self.debug_console.append(f"Error:\n{result.stderr}")
-        except Exception as e:
-            self.debug_console.append(f"Exception: {str(e)}")
+        """Return to the main menu."""
+        self.back_requested.emit()
 
     def get_styles(self):
         return """
@@ -146,7 +386,7 @@ class BtrfsBalanceDebugger(QWidget):
                 padding: 10px;
             }
 
-            QTextEdit {
+            QTextEdit, QPlainTextEdit {
                 background-color: #444A53;
                 color: white;
                 font-family: Consolas, monospace;
@@ -168,5 +408,6 @@ class BtrfsBalanceDebugger(QWidget):
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = BtrfsBalanceDebugger()
+    window.back_requested.connect(window.close)
     window.show()
     sys.exit(app.exec())
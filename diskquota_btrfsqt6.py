@@ -1,19 +1,64 @@
 import sys
-import subprocess
-from PyQt6.QtCore import QProcess
-from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QTextEdit, QComboBox
+from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtWidgets import (
+    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QComboBox, QLineEdit,
+    QGroupBox, QSpinBox, QTableView, QAbstractItemView, QProgressBar, QTableWidget, QTableWidgetItem,
+    QHeaderView, QFileDialog
+)
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, describe_finish
+from outputconsole_btrfsqt6 import BtrfsOutputConsole
+from blockinventory_btrfsqt6 import get_inventory
+from btrfsparsers_btrfsqt6 import format_bytes, format_duration
+from qgroupmodel_btrfsqt6 import QgroupTableModel, QgroupRefresher
+from quotarescan_btrfsqt6 import QuotaRescanMonitor
+from quotamode_btrfsqt6 import QUOTA_MODES, QuotaCapabilityProbe, quota_enable_command, quota_mode
+from resultcache_btrfsqt6 import filesystem_uuid
+from qgroupbatch_btrfsqt6 import (
+    QGROUP_BATCH_COLUMNS, QgroupBatchJob, parse_batch_rows, parse_batch_csv, plan_qgroup_batch
+)
 
 class BtrfsQuotaGUI(QWidget):
+    # Emitted when the user asks to return to the main menu
+    back_requested = pyqtSignal()
+
     def __init__(self):
         super().__init__()
 
         self.setWindowTitle("Btrfs Disk Quota Management")
         self.setGeometry(200, 200, 600, 500)
-        
+
+        # Asynchronous command runner
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.append_output)
+        self.runner.error_received.connect(self.append_output)
+        self.runner.command_finished.connect(self.command_finished)
+
+        # Qgroup usage table, refreshed in place
+        self.qgroup_model = QgroupTableModel(self)
+        self.qgroup_refresher = QgroupRefresher(self.qgroup_model, self)
+        self.qgroup_refresher.refreshed.connect(self.qgroups_refreshed)
+        self.qgroup_refresher.refresh_error.connect(self.append_line)
+
+        # Quota rescans run in the kernel; this only starts and follows them
+        self.rescan_monitor = QuotaRescanMonitor(self)
+        self.rescan_monitor.progress.connect(self.show_rescan_progress)
+        self.rescan_monitor.log.connect(self.append_line)
+        self.rescan_monitor.rescan_finished.connect(self.rescan_finished)
+        # Filesystem waiting for the rescan a qgroup batch skipped, and whether it is running
+        self.pending_rescan = ""
+        self.pending_rescan_started = False
+
+        # Bulk qgroup create/assign/limit with one rescan at the end
+        self.qgroup_batch = QgroupBatchJob(self)
+        self.qgroup_batch.log.connect(self.append_line)
+        self.qgroup_batch.finished.connect(self.qgroup_batch_finished)
+
         self.initUI()
 
-        # Subprocess setup
-        self.process = QProcess(self)
+        # Simple quotas need both btrfs-progs and kernel 6.7 or newer
+        self.capability_probe = QuotaCapabilityProbe(self)
+        self.capability_probe.detected.connect(self.quota_capabilities_detected)
+        self.capability_probe.probe()
 
     def initUI(self):
         main_layout = QVBoxLayout(self)
@@ -26,10 +71,18 @@ class BtrfsQuotaGUI(QWidget):
         # Device Selection ComboBox
         self.device_combo = QComboBox(self)
         self.device_combo.setStyleSheet(self.get_styles())
-        self.device_combo.addItem("Select a device")
         self.populate_devices()
+        get_inventory().changed.connect(self.populate_devices)
         main_layout.addWidget(self.device_combo)
 
+        # Accounting Mode for Enable Quota
+        self.quota_mode_combo = QComboBox(self)
+        self.quota_mode_combo.setStyleSheet(self.get_styles())
+        for mode, label in QUOTA_MODES.items():
+            self.quota_mode_combo.addItem(label, mode)
+        main_layout.addWidget(self.quota_mode_combo)
+        self.device_combo.currentTextChanged.connect(self.show_quota_mode)
+
         # Enable Quota Button
         self.enable_quota_button = QPushButton("Enable Quota", self)
         self.enable_quota_button.setStyleSheet(self.get_styles())
@@ -48,16 +101,85 @@ class BtrfsQuotaGUI(QWidget):
         self.rescan_quota_button.clicked.connect(self.rescan_quota_action)
         main_layout.addWidget(self.rescan_quota_button)
 
+        # Rescan Progress
+        self.rescan_progress = QProgressBar(self)
+        self.rescan_progress.setRange(0, 1000)
+        self.rescan_progress.setValue(0)
+        main_layout.addWidget(self.rescan_progress)
+        self.rescan_label = QLabel("No rescan followed", self)
+        main_layout.addWidget(self.rescan_label)
+
+        # Cancel Command Button
+        self.cancel_button = QPushButton("Cancel Command", self)
+        self.cancel_button.setStyleSheet(self.get_styles())
+        self.cancel_button.clicked.connect(self.runner.cancel)
+        main_layout.addWidget(self.cancel_button)
+
         # Back Button
         self.back_button = QPushButton("Back", self)
         self.back_button.setStyleSheet(self.get_styles())
         self.back_button.clicked.connect(self.back_action)
         main_layout.addWidget(self.back_button)
 
+        # Qgroup Usage
+        qgroup_group = QGroupBox("Qgroup Usage")
+        qgroup_layout = QVBoxLayout()
+        controls = QHBoxLayout()
+        self.qgroup_filter_input = QLineEdit()
+        self.qgroup_filter_input.setPlaceholderText("Only qgroups affecting this path (optional)")
+        controls.addWidget(self.qgroup_filter_input)
+        self.qgroup_refresh_interval = QSpinBox()
+        self.qgroup_refresh_interval.setRange(0, 3600)
+        self.qgroup_refresh_interval.setSuffix(" s")
+        self.qgroup_refresh_interval.setSpecialValueText("No auto refresh")
+        self.qgroup_refresh_interval.valueChanged.connect(self.qgroup_refresher.set_auto_refresh)
+        controls.addWidget(self.qgroup_refresh_interval)
+        self.show_qgroups_button = QPushButton("Show Qgroups")
+        self.show_qgroups_button.clicked.connect(self.show_qgroups_action)
+        controls.addWidget(self.show_qgroups_button)
+        qgroup_layout.addLayout(controls)
+
+        self.qgroup_view = QTableView()
+        self.qgroup_view.setModel(self.qgroup_model)
+        self.qgroup_view.setSortingEnabled(True)
+        self.qgroup_view.sortByColumn(0, Qt.SortOrder.AscendingOrder)
+        self.qgroup_view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.qgroup_view.verticalHeader().hide()
+        self.qgroup_view.selectionModel().currentRowChanged.connect(self.qgroup_selected)
+        qgroup_layout.addWidget(self.qgroup_view)
+        self.qgroup_freed_label = QLabel("Select a qgroup to see what deleting its subvolume frees.")
+        qgroup_layout.addWidget(self.qgroup_freed_label)
+        qgroup_group.setLayout(qgroup_layout)
+        qgroup_group.setStyleSheet(self.get_styles())
+        main_layout.addWidget(qgroup_group, 2)
+
+        # Bulk Qgroup Changes
+        batch_group = QGroupBox("Bulk Qgroup Changes")
+        batch_layout = QVBoxLayout()
+        self.batch_table = QTableWidget(1, len(QGROUP_BATCH_COLUMNS))
+        self.batch_table.setHorizontalHeaderLabels(["Qgroup or subvolume id", "Parent qgroup",
+                                                    "Referenced limit", "Exclusive limit"])
+        self.batch_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.batch_table.setToolTip("Limits take sizes like 10G or none; leave a cell empty to keep it as is")
+        batch_layout.addWidget(self.batch_table)
+        batch_buttons = QHBoxLayout()
+        self.batch_add_button = QPushButton("Add Row")
+        self.batch_add_button.clicked.connect(lambda: self.batch_table.insertRow(self.batch_table.rowCount()))
+        batch_buttons.addWidget(self.batch_add_button)
+        self.batch_load_button = QPushButton("Load CSV")
+        self.batch_load_button.clicked.connect(self.load_batch_csv)
+        batch_buttons.addWidget(self.batch_load_button)
+        self.batch_apply_button = QPushButton("Apply Changes")
+        self.batch_apply_button.clicked.connect(self.apply_batch_action)
+        batch_buttons.addWidget(self.batch_apply_button)
+        batch_layout.addLayout(batch_buttons)
+        batch_group.setLayout(batch_layout)
+        batch_group.setStyleSheet(self.get_styles())
+        main_layout.addWidget(batch_group, 1)
+
         # Output Display Area
-        self.output_display = QTextEdit(self)
+        self.output_display = BtrfsOutputConsole(self)
         self.output_display.setStyleSheet(self.get_styles())
-        self.output_display.setReadOnly(True)
         main_layout.addWidget(self.output_display)
 
         # Set Layout
@@ -93,14 +215,27 @@ class BtrfsQuotaGUI(QWidget):
                 background-color: #2E353F;
             }
 
-            QComboBox {
+            QComboBox, QLineEdit, QSpinBox {
                 background-color: #444A53;
                 color: white;
                 border-radius: 8px;
                 padding: 10px;
             }
 
-            QTextEdit {
+            QTableView {
+                background-color: #444A53;
+                color: white;
+                border: 1px solid #555;
+            }
+
+            QGroupBox {
+                border: 1px solid #555;
+                border-radius: 10px;
+                margin-top: 20px;
+                padding: 15px;
+            }
+
+            QTextEdit, QPlainTextEdit {
                 background-color: #444A53;
                 color: white;
                 font-family: Consolas, monospace;
@@ -112,29 +247,42 @@ class BtrfsQuotaGUI(QWidget):
         """
 
     def populate_devices(self):
-        """Populate the ComboBox with block devices from lsblk."""
-        try:
-            result = subprocess.run(['lsblk', '--output', 'NAME,MOUNTPOINT'], capture_output=True, text=True)
-            if result.returncode == 0:
-                # Parse the output to get the list of devices with mount points
-                devices = []
-                for line in result.stdout.splitlines()[1:]:  # Skip the header line
-                    parts = line.split()
-                    if len(parts) > 1 and parts[1]:  # Ensure it has a mount point
-                        devices.append(parts[1])  # Add the mount point to the list
-                for device in devices:
-                    self.device_combo.addItem(device)
-            else:
-                self.output_display.setPlainText(f"Error: {result.stderr}")
-        except Exception as e:
-            self.output_display.setPlainText(f"Error fetching devices: {e}")
+        """Populate the ComboBox with mounted btrfs filesystems, keeping the selection."""
+        current = self.device_combo.currentText()
+        self.device_combo.clear()
+        self.device_combo.addItem("Select a device")
+        self.device_combo.addItems(get_inventory().btrfs_mount_points())
+        index = self.device_combo.findText(current)
+        if index > 0:
+            self.device_combo.setCurrentIndex(index)
+
+    def quota_capabilities_detected(self, progs, kernel):
+        item = self.quota_mode_combo.model().item(self.quota_mode_combo.findData("simple"))
+        item.setEnabled(progs and kernel)
+        if progs and kernel:
+            item.setToolTip("Accounts extents to the subvolume that created them; far cheaper "
+                            "for snapshot deletion and balance than full qgroups")
+            return
+        missing = [name for name, ok in (("btrfs-progs 6.7+", progs), ("Linux 6.7+", kernel)) if not ok]
+        item.setToolTip("Needs " + " and ".join(missing))
+        if self.quota_mode_combo.currentData() == "simple":
+            self.quota_mode_combo.setCurrentIndex(self.quota_mode_combo.findData("full"))
+
+    def show_quota_mode(self, device):
+        uuid = filesystem_uuid([device]) if device != "Select a device" else ""
+        mode = quota_mode(uuid) if uuid else ""
+        self.enable_quota_button.setToolTip(f"Current accounting mode: {mode}" if mode else "")
 
     def enable_quota_action(self):
         device = self.device_combo.currentText()
-        if device != "Select a device":
-            self.run_btrfs_command(f"quota enable {device}")
-        else:
+        if device == "Select a device":
             self.output_display.setPlainText("Please select a device.")
+            return
+        mode = self.quota_mode_combo.currentData()
+        if mode == "simple" and not (self.capability_probe.progs and self.capability_probe.kernel):
+            self.output_display.setPlainText("Simple quotas are not supported here.")
+            return
+        self.run_btrfs_command(" ".join(quota_enable_command(device, mode)))
 
     def disable_quota_action(self):
         device = self.device_combo.currentText()
@@ -145,51 +293,193 @@ class BtrfsQuotaGUI(QWidget):
 
     def rescan_quota_action(self):
         device = self.device_combo.currentText()
-        if device != "Select a device":
-            self.run_btrfs_command(f"quota rescan {device}")
+        if device == "Select a device":
+            self.output_display.setPlainText("Please select a device.")
+            return
+        if self.rescan_monitor.start(device):
+            self.rescan_progress.setRange(0, 1000)
+            self.rescan_progress.setValue(0)
+            self.rescan_label.setText(f"Checking for a running rescan on {device}...")
+
+    def show_rescan_progress(self, progress):
+        if not progress.running:
+            self.rescan_progress.setRange(0, 1000)
+            self.rescan_progress.setValue(1000)
+            return
+        text = f"Rescanning, current key {progress.current_key}"
+        if progress.percent >= 0:
+            self.rescan_progress.setRange(0, 1000)
+            self.rescan_progress.setValue(int(progress.percent * 10))
+            text += f" ({progress.percent:.1f}%)"
+        else:
+            # Range unknown: busy indicator
+            self.rescan_progress.setRange(0, 0)
+        if progress.bytes_per_second > 0:
+            text += f", {format_bytes(progress.bytes_per_second)}/s of address space"
+        if progress.eta >= 0:
+            text += f", ETA {format_duration(progress.eta)}"
+        self.rescan_label.setText(text)
+
+    def start_pending_rescan(self):
+        """Start the rescan a qgroup batch needs, or leave it queued behind the one being followed."""
+        device = self.pending_rescan
+        self.pending_rescan_started = self.rescan_monitor.start(device)
+        if self.pending_rescan_started:
+            self.rescan_progress.setRange(0, 1000)
+            self.rescan_progress.setValue(0)
+            self.rescan_label.setText(f"Checking for a running rescan on {device}...")
+        elif self.rescan_monitor.is_active() and self.rescan_monitor.path == device:
+            self.output_display.append_line("The rescan starts once the running one finishes.")
         else:
+            self.pending_rescan = ""
+            self.output_display.append_line(f"A quota rescan of {device} is still needed once the one followed "
+                                            f"elsewhere finishes; qgroup numbers are inconsistent until then.")
+
+    def rescan_finished(self, path, ok):
+        self.rescan_label.setText(f"Rescan of {path} {'finished' if ok else 'failed'}")
+        if self.pending_rescan == path:
+            # A rescan that was running before the assignments does not cover them
+            if ok and (not self.pending_rescan_started or self.rescan_monitor.joined):
+                self.start_pending_rescan()
+                return
+            self.pending_rescan = ""
+            if not ok:
+                self.output_display.append_line(f"The rescan the qgroup assignments need failed; run a quota "
+                                                f"rescan of {path} again.")
+        if ok and self.qgroup_refresher.path == path:
+            # Rescanned numbers replace the cached ones
+            self.qgroup_refresher.refresh()
+
+    def show_qgroups_action(self):
+        device = self.device_combo.currentText()
+        if device == "Select a device":
             self.output_display.setPlainText("Please select a device.")
+            return
+        self.qgroup_refresher.set_target(device, self.qgroup_filter_input.text().strip())
+        self.qgroup_refresher.refresh(cache=True)
+
+    def qgroups_refreshed(self, changed, added, removed):
+        if added or removed:
+            self.output_display.append_line(f"Qgroups: {self.qgroup_model.rowCount()} shown, "
+                                            f"{added} new, {removed} gone, {changed} changed.")
+        self.qgroup_selected(self.qgroup_view.currentIndex())
+
+    def qgroup_selected(self, index):
+        record = self.qgroup_model.record(index)
+        if record is None:
+            return
+        if record.level == 0:
+            freed = self.qgroup_model.table.freed_by_deleting(record.id)
+            self.qgroup_freed_label.setText(f"Deleting subvolume {record.id} frees about {format_bytes(freed)} "
+                                            f"(its exclusive bytes; shared extents stay).")
+        else:
+            members, members_excl = self.qgroup_model.table.rollup(record)
+            self.qgroup_freed_label.setText(f"Deleting all {members} members of {record.qgroupid} frees about "
+                                            f"{format_bytes(record.excl)}; {format_bytes(members_excl)} of it "
+                                            f"is exclusive to single members.")
+
+    def load_batch_csv(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Load Qgroup CSV", "", "CSV files (*.csv);;All files (*)")
+        if not path:
+            return
+        try:
+            with open(path, newline="") as csv_file:
+                rows = parse_batch_csv(csv_file.read())
+        except (OSError, UnicodeDecodeError, ValueError) as error:
+            self.output_display.setPlainText(f"Cannot load {path}: {error}")
+            return
+        self.batch_table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            cells = (values.qgroupid, values.parent,
+                     "" if values.max_rfer is None else str(values.max_rfer or "none"),
+                     "" if values.max_excl is None else str(values.max_excl or "none"))
+            for column, text in enumerate(cells):
+                self.batch_table.setItem(row, column, QTableWidgetItem(text))
+        self.output_display.setPlainText(f"Loaded {len(rows)} rows from {path}.")
+
+    def batch_rows(self):
+        rows = []
+        for row in range(self.batch_table.rowCount()):
+            items = [self.batch_table.item(row, column) for column in range(len(QGROUP_BATCH_COLUMNS))]
+            rows.append([item.text() if item is not None else "" for item in items])
+        return rows
+
+    def apply_batch_action(self):
+        device = self.device_combo.currentText()
+        if device == "Select a device":
+            self.output_display.setPlainText("Please select a device.")
+            return
+        if self.qgroup_batch.is_active():
+            self.output_display.append_line("Qgroup changes are already being applied.")
+            return
+        if self.qgroup_refresher.path != device or self.qgroup_refresher.filter_path or \
+                not self.qgroup_model.rowCount():
+            self.output_display.setPlainText("Show all qgroups of this filesystem first; "
+                                             "changes are checked against them.")
+            return
+        try:
+            operations = plan_qgroup_batch(parse_batch_rows(self.batch_rows()), self.qgroup_model.table)
+        except ValueError as error:
+            self.output_display.setPlainText(f"Nothing was changed:\n{error}")
+            return
+        self.output_display.clear()
+        if not operations:
+            self.output_display.append_line("Every qgroup is already set up as listed.")
+            return
+        for operation in operations:
+            self.output_display.append_line(f"  {operation.description}")
+        self.qgroup_batch.start(device, operations)
+
+    def qgroup_batch_finished(self, ok, needs_rescan):
+        device = self.qgroup_batch.path
+        if needs_rescan:
+            self.output_display.append_line("Assignments skipped their rescan; running one rescan now.")
+            self.pending_rescan = device
+            self.start_pending_rescan()
+        elif self.qgroup_refresher.path == device:
+            self.qgroup_refresher.refresh()
+
+    def append_line(self, text):
+        self.output_display.append_line(text)
 
     def back_action(self):
         """Back button action: reset the device selection and clear the output."""
         self.device_combo.setCurrentIndex(0)  # Reset ComboBox to default
         self.output_display.clear()  # Clear the output display
 
-        # Optionally terminate the subprocess if running
-        self.process.terminate()
-        self.output_display.setPlainText("Subprocess terminated.")
+        self.qgroup_refresher.stop()
+        self.rescan_monitor.stop()
+        self.qgroup_refresh_interval.setValue(0)
 
-    def run_btrfs_command(self, command):
-        """Run the btrfs command and display the output."""
-        try:
-            result = subprocess.run(['sudo', 'btrfs'] + command.split(), capture_output=True, text=True)
-            if result.returncode == 0:
-                self.output_display.setPlainText(result.stdout)
-            else:
-                self.output_display.setPlainText(f"Error: {result.stderr}")
-        except Exception as e:
-            self.output_display.setPlainText(f"Error executing command: {e}")
-
-    def start_subprocess(self):
-        """Start the subprocess."""
-        self.process.start("./main-btrfsqt6")
-
-        # Capture output from the subprocess
-        self.process.readyReadStandardOutput.connect(self.read_output)
-        self.process.readyReadStandardError.connect(self.read_error)
-
-    def read_output(self):
-        """Read output from subprocess."""
-        output = bytes(self.process.readAllStandardOutput()).decode("utf-8")
-        self.output_display.append(output)
-
-    def read_error(self):
-        """Read error output from subprocess."""
-        error = bytes(self.process.readAllStandardError()).decode("utf-8")
-        self.output_display.append(error)
+        # Cancel the running command, if any
+        if self.runner.is_running():
+            self.runner.cancel()
+            self.output_display.setPlainText("Subprocess terminated.")
+
+        self.back_requested.emit()
+
+    def run_btrfs_command(self, command, timeout=None):
+        """Start the btrfs command and stream its output into the display."""
+        if self.runner.is_running():
+            self.output_display.append_line("A command is already running. Cancel it first.")
+            return
+        self.output_display.clear()
+        self.runner.run(['sudo', 'btrfs'] + command.split(), timeout, cache=True)
+
+    def append_output(self, text):
+        self.output_display.append_text(text)
+
+    def command_finished(self, exit_code, status):
+        self.output_display.finish()
+        if self.runner.from_cache:
+            self.output_display.append_line(f"(cached result from {self.runner.cache_age():.0f}s ago)")
+        message = describe_finish(exit_code, status)
+        if message:
+            self.output_display.append_line(message)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = BtrfsQuotaGUI()
+    window.back_requested.connect(window.close)
     window.show()
     sys.exit(app.exec())
@@ -1,17 +1,80 @@
 import sys
 import re
-import subprocess
-from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QLineEdit, QCheckBox, QGroupBox, QFormLayout, QFileDialog, QComboBox, QHBoxLayout, QScrollArea
-from PyQt6.QtCore import Qt
+import json
+import sqlite3
+import tempfile
+from datetime import datetime
+from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QLineEdit, QCheckBox, QGroupBox, QFormLayout, QFileDialog, QComboBox, QHBoxLayout, QScrollArea, QPlainTextEdit, QTreeView, QSpinBox, QTableWidget, QTableWidgetItem, QHeaderView
+from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6.QtGui import QColor
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, QUERY_TIMEOUT, describe_finish
+from outputconsole_btrfsqt6 import BtrfsOutputConsole
+from blockinventory_btrfsqt6 import get_inventory
+from btrfsparsers_btrfsqt6 import format_bytes, format_duration
+from restorejob_btrfsqt6 import RestoreJob, ParallelRestoreJob, compile_path_regex, compile_selection_regex, plan_shards, \
+    source_concurrency
+from restorejournal_btrfsqt6 import RestoreJournal, journal_path
+from restoreindex_btrfsqt6 import RestoreIndexStore, RestoreIndexBuilder, RestoreIndexModel, device_identity
+from rootfinder_btrfsqt6 import RootFinder
 
 class BtrfsRestoreUI(QWidget):
+    # Emitted when the user asks to return to the main menu
+    back_requested = pyqtSignal()
+
+    ROOT_COLUMNS = ["Bytenr", "Generation", "Level", "Paths listed", "Note"]
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Btrfs Restore")
         self.setGeometry(100, 100, 600, 500)
         self.setStyleSheet(self.get_styles())
+        self.restore_path = ""
+
+        # Asynchronous command runner
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.append_output)
+        self.runner.error_received.connect(self.append_output)
+        self.runner.command_finished.connect(self.command_finished)
+
+        # btrfs restore, followed line by line
+        self.restore_job = RestoreJob(self)
+        self.restore_job.output.connect(self.append_output)
+        self.restore_job.progress.connect(self.show_restore_progress)
+        self.restore_job.finished.connect(self.restore_finished)
+
+        # The same restore split over several processes
+        self.parallel_job = ParallelRestoreJob(self)
+        self.parallel_job.output.connect(self.append_output)
+        self.parallel_job.progress.connect(self.show_restore_progress)
+        self.parallel_job.finished.connect(self.restore_finished)
+
+        # Dry-run listings kept on disk, one per device and tree root
+        try:
+            self.index_store = RestoreIndexStore()
+        except (OSError, sqlite3.Error) as error:
+            self.index_store = None
+            self.index_store_error = str(error)
+        self.index_builder = None
+        self.index_model = None
+        if self.index_store is not None:
+            self.index_builder = RestoreIndexBuilder(self.index_store, self)
+            self.index_builder.progress.connect(self.show_index_progress)
+            self.index_builder.finished.connect(self.index_finished)
+            self.index_model = RestoreIndexModel(self.index_store, self)
+
+        # Checkpoint journal of the restore that is running
+        self.journal = None
+
+        # Tree root candidates ranked by bounded dry runs, kept with the indexes
+        self.root_finder = RootFinder(self.index_store, self)
+        self.root_finder.output.connect(self.append_output)
+        self.root_finder.progress.connect(self.show_root_progress)
+        self.root_finder.finished.connect(self.roots_finished)
+        self.root_candidates = []
+
         self.create_main_menu()
+        self.load_index()
+        self.load_root_candidates()
 
     def get_styles(self):
         return """
@@ -88,16 +151,29 @@ class BtrfsRestoreUI(QWidget):
             QScrollArea {
                 background-color: #2C2F36;
             }
+
+            QTextEdit, QPlainTextEdit {
+                background-color: #444A53;
+                color: white;
+                font-family: Consolas, monospace;
+                font-size: 14px;
+                border: 1px solid #555;
+                border-radius: 8px;
+                padding: 10px;
+            }
         """
 
     def create_main_menu(self):
         """ Create the main menu with dynamic clickable options """
         menu_layout = QVBoxLayout()
 
-        # Device Selection using lsblk
+        # Device Selection from the shared device inventory
         self.device_select = QComboBox(self)
-        self.device_select.addItem("Select a disk...")
+        self.device_select.setEditable(True)
         self.populate_device_list()
+        self.device_select.currentTextChanged.connect(self.load_index)
+        self.device_select.currentTextChanged.connect(self.load_root_candidates)
+        get_inventory().changed.connect(self.populate_device_list)
         menu_layout.addWidget(self.device_select)
 
         # Button to open file manager for selecting restore path
@@ -112,15 +188,33 @@ class BtrfsRestoreUI(QWidget):
         options_group = QGroupBox("Restore Options", self)
         options_layout = QFormLayout()
 
-        self.dry_run_checkbox = QCheckBox("Dry run (list files to be recovered)", self)
+        self.dry_run_checkbox = QCheckBox("Dry run (index files to be recovered)", self)
         options_layout.addRow(self.dry_run_checkbox)
 
+        self.tree_root_input = QLineEdit(self)
+        self.tree_root_input.setPlaceholderText("Default root")
+        self.tree_root_input.setToolTip("Bytenr of the tree root to read (-t), e.g. from btrfs-find-root")
+        self.tree_root_input.editingFinished.connect(self.load_index)
+        options_layout.addRow("Tree root:", self.tree_root_input)
+
+        self.parallel_spin = QSpinBox(self)
+        self.parallel_spin.setRange(1, 16)
+        self.parallel_spin.setToolTip("Split the restore by top-level directory over this many processes.\n"
+                                      "Needs an index; a rotational source is always read by one process.")
+        options_layout.addRow("Parallel restores:", self.parallel_spin)
+
         self.ignore_errors_checkbox = QCheckBox("Ignore errors", self)
         options_layout.addRow(self.ignore_errors_checkbox)
 
         self.overwrite_checkbox = QCheckBox("Overwrite existing files", self)
         options_layout.addRow(self.overwrite_checkbox)
 
+        self.resume_checkbox = QCheckBox("Resume an interrupted restore (skip what is already restored)", self)
+        self.resume_checkbox.setChecked(True)
+        self.resume_checkbox.setToolTip("Restores keep a checkpoint journal of the files they complete.\n"
+                                        "Overwriting existing files starts over instead.")
+        options_layout.addRow(self.resume_checkbox)
+
         self.metadata_checkbox = QCheckBox("Restore metadata (owner, mode, times)", self)
         options_layout.addRow(self.metadata_checkbox)
 
@@ -133,11 +227,106 @@ class BtrfsRestoreUI(QWidget):
         options_group.setLayout(options_layout)
         menu_layout.addWidget(options_group)
 
+        # Older tree roots to read from when the current one is damaged
+        roots_group = QGroupBox("Tree Roots", self)
+        roots_layout = QVBoxLayout()
+
+        self.roots_status_label = QLabel("", self)
+        self.roots_status_label.setWordWrap(True)
+        roots_layout.addWidget(self.roots_status_label)
+
+        self.roots_table = QTableWidget(0, len(self.ROOT_COLUMNS), self)
+        self.roots_table.setHorizontalHeaderLabels(self.ROOT_COLUMNS)
+        self.roots_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.roots_table.verticalHeader().setVisible(False)
+        self.roots_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.roots_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.roots_table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
+        self.roots_table.cellDoubleClicked.connect(self.use_selected_root)
+        self.roots_table.setMinimumHeight(150)
+        roots_layout.addWidget(self.roots_table)
+
+        roots_buttons = QHBoxLayout()
+        self.find_roots_button = QPushButton("Find Roots", self)
+        self.find_roots_button.setToolTip("Run btrfs-find-root and rank the roots it finds by dry runs.\n"
+                                          "Uses the parallel restores setting for concurrent probes.")
+        self.find_roots_button.clicked.connect(self.find_roots)
+        roots_buttons.addWidget(self.find_roots_button)
+        self.use_root_button = QPushButton("Use Selected Root", self)
+        self.use_root_button.clicked.connect(self.use_selected_root)
+        roots_buttons.addWidget(self.use_root_button)
+        roots_layout.addLayout(roots_buttons)
+
+        roots_group.setLayout(roots_layout)
+        menu_layout.addWidget(roots_group)
+
+        # Restrict the restore to part of the tree (--path-regex)
+        scope_group = QGroupBox("Restore Scope", self)
+        scope_layout = QFormLayout()
+
+        self.include_edit = QPlainTextEdit(self)
+        self.include_edit.setPlaceholderText("One path or glob per line, e.g. /home/user/Documents or /etc/*.conf\n"
+                                             "Empty restores everything")
+        self.include_edit.setFixedHeight(80)
+        scope_layout.addRow("Include:", self.include_edit)
+
+        self.exclude_edit = QPlainTextEdit(self)
+        self.exclude_edit.setPlaceholderText("One literal path per line, e.g. /home/user/.cache")
+        self.exclude_edit.setFixedHeight(80)
+        scope_layout.addRow("Exclude:", self.exclude_edit)
+
+        scope_group.setLayout(scope_layout)
+        menu_layout.addWidget(scope_group)
+
+        # Files found by the last dry run of this device and root
+        index_group = QGroupBox("Recoverable Files", self)
+        index_layout = QVBoxLayout()
+
+        self.index_status_label = QLabel("", self)
+        self.index_status_label.setWordWrap(True)
+        index_layout.addWidget(self.index_status_label)
+
+        self.index_search_input = QLineEdit(self)
+        self.index_search_input.setPlaceholderText("Search file names")
+        self.index_search_input.returnPressed.connect(self.search_index)
+        index_layout.addWidget(self.index_search_input)
+
+        self.index_view = QTreeView(self)
+        self.index_view.setUniformRowHeights(True)
+        self.index_view.setHeaderHidden(True)
+        self.index_view.setMinimumHeight(200)
+        if self.index_model is not None:
+            self.index_view.setModel(self.index_model)
+        index_layout.addWidget(self.index_view)
+
+        index_buttons = QHBoxLayout()
+        self.build_index_button = QPushButton("Build Index", self)
+        self.build_index_button.clicked.connect(self.build_index)
+        index_buttons.addWidget(self.build_index_button)
+        self.restore_selected_button = QPushButton("Restore Selected", self)
+        self.restore_selected_button.clicked.connect(self.restore_selected)
+        index_buttons.addWidget(self.restore_selected_button)
+        index_layout.addLayout(index_buttons)
+
+        index_group.setLayout(index_layout)
+        menu_layout.addWidget(index_group)
+        if self.index_store is None:
+            index_group.setEnabled(False)
+            self.index_status_label.setText(f"The file index is unavailable: {self.index_store_error}")
+
         # File Restore Button
         self.restore_data_button = QPushButton("Restore Data", self)
         self.restore_data_button.clicked.connect(self.start_restore)
         menu_layout.addWidget(self.restore_data_button)
 
+        self.cancel_restore_button = QPushButton("Cancel", self)
+        self.cancel_restore_button.clicked.connect(self.cancel_command)
+        menu_layout.addWidget(self.cancel_restore_button)
+
+        # Running file and byte counts of the restore
+        self.restore_progress_label = QLabel("", self)
+        menu_layout.addWidget(self.restore_progress_label)
+
         # Warning Message next to the "Restore Data" button
         self.warning_label = QLabel("WARNING: FILE BRICK! BACKUP FILE AND DISK STRUCTURE", self)
         self.warning_label.setObjectName("warningLabel")
@@ -157,62 +346,336 @@ class BtrfsRestoreUI(QWidget):
         self.output_label = QLabel("", self)
         menu_layout.addWidget(self.output_label)
 
+        # Streaming command output
+        self.output_display = BtrfsOutputConsole(self)
+        menu_layout.addWidget(self.output_display)
+
         self.setLayout(menu_layout)
     
     def populate_device_list(self):
-        """ Populate the combo box with devices from lsblk """
-        try:
-            result = subprocess.run(["lsblk", "-o", "NAME,SIZE"], capture_output=True, text=True)
-            if result.returncode == 0:
-                devices = result.stdout.splitlines()[1:]
-                for device in devices:
-                    device_name = device.split()[0]
-                    self.device_select.addItem(f"/dev/{device_name}")
-        except Exception as e:
-            self.output_label.setText(f"Error fetching devices: {str(e)}")
-            
+        """ Populate the combo box with btrfs devices from the shared inventory """
+        current = self.device_select.currentText()
+        self.device_select.clear()
+        self.device_select.addItem("Select a disk...")
+        for device in get_inventory().btrfs_devices():
+            self.device_select.addItem(device.path)
+        if current:
+            self.device_select.setCurrentText(current)
+
     def open_file_dialog(self):
         """ Open a file dialog for selecting the restore path """
         restore_path = QFileDialog.getExistingDirectory(self, "Select Restore Path")
         if restore_path:
+            self.restore_path = restore_path
             self.output_label.setText(f"Restore path: {restore_path}")
 
+    def selected_device(self):
+        device = self.device_select.currentText()
+        return "" if device == "Select a disk..." else device
+
     def start_restore(self):
         """ Trigger btrfs restore process """
-        device = self.device_select.currentText()
-        restore_path = self.output_label.text().replace("Restore path: ", "")
+        device = self.selected_device()
+        restore_path = self.restore_path
 
-        if not device or device == "Select a disk...":
+        if not device:
             self.output_label.setText("Please select a valid device.")
             return
 
+        if self.dry_run_checkbox.isChecked():
+            self.build_index()
+            return
+
         if not restore_path:
             self.output_label.setText("Please select a restore path.")
             return
 
-        # Constructing the restore command
-        command = f"btrfs restore {device} {restore_path}"
+        if self.is_busy():
+            self.output_label.setText("A command is already running.")
+            return
 
-        # Add selected options to the command
-        if self.dry_run_checkbox.isChecked():
-            command += " -D"
+        try:
+            path_regex = compile_path_regex(self.include_edit.toPlainText().splitlines(),
+                                            self.exclude_edit.toPlainText().splitlines())
+        except ValueError as error:
+            self.output_label.setText(f"Invalid restore scope: {error}")
+            return
+
+        # Without include/exclude patterns the whole tree can be split by the index
+        self.run_restore(device, restore_path, path_regex, None if path_regex else {"/": True})
+
+    def restore_options(self):
+        """ Options for btrfs restore from the checkboxes and the tree root """
+        options = []
+        if self.tree_root_input.text().strip():
+            options += ["-t", self.tree_root_input.text().strip()]
         if self.ignore_errors_checkbox.isChecked():
-            command += " -i"
+            options.append("-i")
         if self.overwrite_checkbox.isChecked():
-            command += " -o"
+            options.append("-o")
         if self.metadata_checkbox.isChecked():
-            command += " -m"
+            options.append("-m")
         if self.symlink_checkbox.isChecked():
-            command += " -S"
+            options.append("-S")
         if self.subvolume_checkbox.isChecked():
-            command += " -s"
+            options.append("-s")
+        return options
+
+    def run_restore(self, device, restore_path, path_regex, rules=None):
+        """ Run one restore, or one per shard when parallel restores are asked for and possible """
+        self.output_display.clear()
+        self.restore_progress_label.setText("")
+        self.journal = self.open_journal(device, restore_path, path_regex, rules)
+        if self.journal is not None and not self.journal.is_empty():
+            path_regex, rules = self.resume_scope(restore_path, path_regex, rules)
+            if path_regex is None:
+                self.journal.close()
+                self.journal = None
+                return
+        requested = self.parallel_spin.value()
+        workers = source_concurrency(device, requested)
+        shards = []
+        if workers > 1 and rules is not None and self.index_model is not None and \
+                self.index_model.index_id is not None:
+            try:
+                shards = plan_shards(self.index_store.top_level_counts(self.index_model.index_id), rules, workers)
+            except ValueError as error:
+                self.output_display.append_line(f"Not splitting the restore: {error}")
+        if len(shards) > 1:
+            self.output_label.setText(f"Restore running in {len(shards)} processes...")
+            self.parallel_job.start(device, restore_path, self.restore_options(), shards, journal=self.journal)
+            return
+        if requested > 1:
+            if workers == 1:
+                reason = "the source is a rotational disk"
+            elif rules is None:
+                reason = "include/exclude patterns are set"
+            elif self.index_model is None or self.index_model.index_id is None:
+                reason = "there is no index to split it by"
+            else:
+                reason = "there is only one top-level entry to restore"
+            self.output_display.append_line(f"Restoring with one process: {reason}.")
+        self.output_label.setText("Restore running...")
+        self.restore_job.start(device, restore_path, self.restore_options(), path_regex, journal=self.journal)
+
+    def open_journal(self, device, restore_path, path_regex, rules):
+        """ The checkpoint journal of this device, root, target and scope; emptied unless resuming """
+        scope = json.dumps(sorted(rules.items())) if rules is not None else path_regex
+        path = journal_path(device_identity(device), self.tree_root_input.text().strip(), restore_path, scope)
+        try:
+            journal = RestoreJournal(path)
+            if self.overwrite_checkbox.isChecked() or not self.resume_checkbox.isChecked():
+                journal.reset()
+        except (OSError, ValueError) as error:
+            self.output_display.append_line(f"Restoring without a checkpoint journal: {error}")
+            return None
+        return journal
+
+    def resume_scope(self, restore_path, path_regex, rules):
+        """ Clean up after the interrupted run and narrow the scope to what is left, None if nothing is """
+        try:
+            removed = self.journal.prepare(restore_path)
+        except OSError as error:
+            self.output_display.append_line(f"Cannot resume from the checkpoint journal: {error}")
+            self.journal.reset()
+            return path_regex, rules
+        directories = self.journal.completed_directories()
+        self.output_display.append_line(
+            f"Resuming: {len(self.journal.files)} files already restored are skipped, "
+            f"{removed} incomplete or changed files are restored again.")
+        if rules is None or not directories:
+            return path_regex, rules
+        rules = self.journal.resume_rules(rules)
+        try:
+            path_regex = compile_selection_regex(rules)
+        except ValueError as error:
+            if not any(rules.values()):
+                self.output_label.setText("Nothing left to restore: the checkpoint journal has all of it.")
+                return None, rules
+            # Too long: restore walks the finished directories again, but still skips their files
+            self.output_display.append_line(f"Walking finished directories again: {error}")
+            return path_regex, rules
+        self.output_display.append_line(f"{len(directories)} finished directories are not read again.")
+        return path_regex, rules
+
+    def show_restore_progress(self, progress):
+        text = f"{progress.files} files, {progress.directories} directories"
+        text += f", {format_bytes(progress.bytes_restored)} restored"
+        text += f" in {format_duration(progress.elapsed)}"
+        text += f" | {format_bytes(progress.bytes_per_second)}/s, {progress.files_per_second:.0f} files/s"
+        if progress.skipped:
+            text += f" | {progress.skipped} skipped"
+        if progress.errors:
+            text += f" | {progress.errors} errors"
+        if progress.current:
+            text += f"\n{progress.current}"
+        self.restore_progress_label.setText(text)
+
+    def restore_finished(self, exit_code, status):
+        self.output_display.finish()
+        message = describe_finish(exit_code, status)
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+            if message:
+                message += " Restore again to resume where it stopped."
+        self.output_label.setText(message if message else "Restore finished successfully.")
+
+    def load_index(self):
+        """ Show the stored index of the selected device and tree root, if there is one """
+        if self.index_store is None or self.index_builder.is_active():
+            return
+        device = self.selected_device()
+        info = None
+        if device:
+            info = self.index_store.lookup(device_identity(device), self.tree_root_input.text().strip())
+        if info is not None and info.id == self.index_model.index_id:
+            return
+        self.index_model.set_index(info.id if info is not None else None)
+        self.index_search_input.clear()
+        self.show_index_info(info)
 
+    def show_index_info(self, info):
+        if info is None:
+            self.index_status_label.setText("No index for this device and tree root yet; build one with a dry run.")
+            return
+        created = datetime.fromtimestamp(info.created).strftime("%Y-%m-%d %H:%M")
+        self.index_status_label.setText(f"{info.files} files in {info.directories} directories, "
+                                        f"indexed {created} from {info.device}.")
+
+    def build_index(self):
+        """ Dry run the restore once and keep the listing """
+        device = self.selected_device()
+        if not device:
+            self.output_label.setText("Please select a valid device.")
+            return
+        if self.index_store is None:
+            self.output_label.setText(self.index_status_label.text())
+            return
+        if self.is_busy():
+            self.output_label.setText("A command is already running.")
+            return
+        # Nothing is written; the target only prefixes the listed paths
+        target = self.restore_path or tempfile.gettempdir()
+        self.output_display.clear()
+        self.index_builder.start(device, target, self.tree_root_input.text().strip())
+        self.output_label.setText("Indexing recoverable files...")
+
+    def show_index_progress(self, count):
+        self.index_status_label.setText(f"Indexing: {count} paths listed...")
+
+    def index_finished(self, info, message):
+        self.output_label.setText(message)
+        if info is None:
+            self.load_index()
+            return
+        self.index_model.set_index(info.id)
+        self.index_search_input.clear()
+        self.show_index_info(info)
+
+    def load_root_candidates(self):
+        """ Show the ranked roots of the last search on the selected device """
+        if self.root_finder.is_active():
+            return
+        device = self.selected_device()
+        candidates, probed = [], None
+        if device and self.index_store is not None:
+            try:
+                candidates, probed = self.index_store.root_candidates(device_identity(device))
+            except sqlite3.Error as error:
+                self.roots_status_label.setText(f"Cannot read the kept roots: {error}")
+        self.show_root_candidates(candidates)
+        if probed is not None:
+            searched = datetime.fromtimestamp(probed).strftime("%Y-%m-%d %H:%M")
+            self.roots_status_label.setText(f"{len(candidates)} tree roots, ranked {searched}.")
+        elif device:
+            self.roots_status_label.setText("Find roots when the default tree root is damaged.")
+
+    def show_root_candidates(self, candidates):
+        self.root_candidates = candidates
+        self.roots_table.setRowCount(len(candidates))
+        for row, candidate in enumerate(candidates):
+            if candidate.files < 0:
+                listed, note = "", "not probed"
+            else:
+                listed = f"{candidate.files}+" if candidate.capped else str(candidate.files)
+                note = candidate.error or ("probe stopped early" if candidate.capped else "")
+            if candidate.current:
+                note = "superblock root" + (f"; {note}" if note else "")
+            values = [str(candidate.bytenr), str(candidate.generation), str(candidate.level), listed, note]
+            for column, text in enumerate(values):
+                self.roots_table.setItem(row, column, QTableWidgetItem(text))
+
+    def find_roots(self):
+        """ Find tree roots and rank them by how many paths a bounded dry run lists from each """
+        device = self.selected_device()
+        if not device:
+            self.output_label.setText("Please select a valid device.")
+            return
+        if self.is_busy():
+            self.output_label.setText("A command is already running.")
+            return
+        self.output_display.clear()
+        self.show_root_candidates([])
+        # Nothing is written; the target only prefixes the listed paths
+        self.root_finder.start(device, tempfile.gettempdir(), self.parallel_spin.value())
+        self.roots_status_label.setText("Searching for tree roots...")
+        self.output_label.setText("Finding tree roots...")
+
+    def show_root_progress(self, done, total):
+        self.roots_status_label.setText(f"Probing tree roots: {done} of {total} done...")
+
+    def roots_finished(self, candidates, message):
+        self.output_display.finish()
+        self.output_label.setText(message)
+        if candidates is None:
+            self.load_root_candidates()
+            return
+        self.show_root_candidates(candidates)
+        self.roots_status_label.setText(f"{len(candidates)} tree roots, best first.")
+
+    def use_selected_root(self):
+        """ Restore and index from the selected tree root """
+        row = self.roots_table.currentRow()
+        if row < 0 or row >= len(self.root_candidates):
+            self.output_label.setText("Select a tree root first.")
+            return
+        candidate = self.root_candidates[row]
+        # The superblock root is the default, so its index is shared with plain restores
+        self.tree_root_input.setText("" if candidate.current else str(candidate.bytenr))
+        self.load_index()
+        self.output_label.setText(f"Reading from tree root {candidate.bytenr} (generation {candidate.generation}).")
+
+    def search_index(self):
+        if self.index_model is None or self.index_model.index_id is None:
+            return
+        text = self.index_search_input.text().strip()
+        found = self.index_model.set_search(text)
+        if text:
+            self.output_label.setText(f"{found} matches" + (" (first ones only)"
+                                      if found >= self.index_model.SEARCH_LIMIT else ""))
+
+    def restore_selected(self):
+        """ Restore the checked files and directories of the index """
+        device = self.selected_device()
+        if not device:
+            self.output_label.setText("Please select a valid device.")
+            return
+        if self.index_model is None or self.index_model.index_id is None:
+            self.output_label.setText("Build an index first.")
+            return
+        if not self.restore_path:
+            self.output_label.setText("Please select a restore path.")
+            return
+        if self.is_busy():
+            self.output_label.setText("A command is already running.")
+            return
         try:
-            # Run the btrfs restore command
-            result = subprocess.run(command, shell=True, check=True, text=True, capture_output=True)
-            self.output_label.setText(f"Restore successful: {result.stdout}")
-        except subprocess.CalledProcessError as e:
-            self.output_label.setText(f"Error: {e.stderr}")
+            path_regex = self.index_model.selection_regex()
+        except ValueError as error:
+            self.output_label.setText(f"Cannot restore the selection: {error}")
+            return
+        self.run_restore(device, self.restore_path, path_regex, self.index_model.selection_rules())
 
     def create_btrfs_subvolume(self):
         """ Create a new Btrfs subvolume """
@@ -221,11 +684,8 @@ class BtrfsRestoreUI(QWidget):
             self.output_label.setText("Please select a valid device.")
             return
 
-        try:
-            result = subprocess.run(f"sudo btrfs subvolume create {device}/subvolume_name", shell=True, check=True, text=True, capture_output=True)
-            self.output_label.setText(f"Subvolume created: {result.stdout}")
-        except subprocess.CalledProcessError as e:
-            self.output_label.setText(f"Error creating subvolume: {e.stderr}")
+        self.output_label.setText("Creating subvolume...")
+        self.run_command(["sudo", "btrfs", "subvolume", "create", f"{device}/subvolume_name"])
 
     def list_subvolumes(self):
         """ List all Btrfs subvolumes for the selected device """
@@ -234,22 +694,40 @@ class BtrfsRestoreUI(QWidget):
             self.output_label.setText("Please select a valid device.")
             return
 
-        try:
-            # List all subvolumes for the selected device
-            result = subprocess.run(f"sudo btrfs subvolume list {device}", shell=True, check=True, text=True, capture_output=True)
-            subvolumes = result.stdout.strip()
-            if subvolumes:
-                self.output_label.setText(f"Subvolumes:\n{subvolumes}")
-            else:
-                self.output_label.setText("No subvolumes found.")
-        except subprocess.CalledProcessError as e:
-            self.output_label.setText(f"Error listing subvolumes: {e.stderr}")
+        self.output_label.setText("Subvolumes:")
+        self.run_command(["sudo", "btrfs", "subvolume", "list", device], QUERY_TIMEOUT)
+
+    def run_command(self, command, timeout=None):
+        """ Start a command and stream its output into the output area """
+        if self.is_busy():
+            self.output_label.setText("A command is already running.")
+            return
+        self.output_display.clear()
+        self.runner.run(command, timeout)
+
+    def is_busy(self):
+        return self.runner.is_running() or self.restore_job.is_active() or self.parallel_job.is_active() or \
+            (self.index_builder is not None and self.index_builder.is_active()) or self.root_finder.is_active()
+
+    def cancel_command(self):
+        self.runner.cancel()
+        self.restore_job.cancel()
+        self.parallel_job.cancel()
+        if self.index_builder is not None:
+            self.index_builder.cancel()
+        self.root_finder.cancel()
+
+    def append_output(self, text):
+        self.output_display.append_text(text)
+
+    def command_finished(self, exit_code, status):
+        self.output_display.finish()
+        message = describe_finish(exit_code, status)
+        self.output_label.setText(message if message else "Command finished successfully.")
+
     def execute_back_command(self):
-        try:
-            result = subprocess.run(["./main-btrfsqt6"], check=True, text=True, capture_output=True)
-            self.output_label.setText(f"Back command executed successfully: {result.stdout}")
-        except subprocess.CalledProcessError as e:
-            self.output_label.setText(f"Error executing back command: {e.stderr}")
+        """Return to the main menu."""
+        self.back_requested.emit()
 
     def contextMenuEvent(self, event):
        context_menu = QMenu(self)
@@ -266,5 +744,6 @@ class BtrfsRestoreUI(QWidget):
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = BtrfsRestoreUI()
+    window.back_requested.connect(window.close)
     window.show()
     sys.exit(app.exec())
@@ -1,17 +1,46 @@
 import sys
-import subprocess
-from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QTextEdit, QComboBox
-from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QComboBox, QSpinBox, QDoubleSpinBox, QCheckBox, QTableWidget, QTableWidgetItem, QHeaderView
+from PyQt6.QtGui import QColor
+from PyQt6.QtCore import Qt, pyqtSignal
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, QUERY_TIMEOUT, describe_finish
+from outputconsole_btrfsqt6 import BtrfsOutputConsole
+from blockinventory_btrfsqt6 import get_inventory
+from scrubmonitor_btrfsqt6 import ScrubMonitor, ScrubSparkline
+from btrfsparsers_btrfsqt6 import format_bytes, format_duration
+from scrubthrottle_btrfsqt6 import AdaptiveScrubLimiter, ThrottleSettings, scrub_start_command
 
 class BtrfsScrubGUI(QWidget):
+    # Emitted when the user asks to return to the main menu
+    back_requested = pyqtSignal()
+
     def __init__(self):
         super().__init__()
 
         self.setWindowTitle("Btrfs Scrub Management")
         self.setGeometry(200, 200, 600, 500)
-        
+
+        # Asynchronous command runner
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.append_output)
+        self.runner.error_received.connect(self.append_output)
+        self.runner.command_finished.connect(self.command_finished)
+
+        # Live scrub monitor
+        self.monitor = ScrubMonitor(self)
+        self.monitor.sample_ready.connect(self.update_monitor_table)
+        self.monitor.monitor_error.connect(self.monitor_error)
+        self.monitor_rows = {}
+
+        # Latency-driven per-device scrub limits
+        self.limiter = AdaptiveScrubLimiter(self)
+        self.limiter.log.connect(self.output_display_line)
+        self.monitor.sample_ready.connect(self.limiter.update)
+
         self.initUI()
 
+    MONITOR_COLUMNS = ["Device", "Status", "Scrubbed", "Allocated", "Progress",
+                       "Rate", "Limit", "ETA", "Errors", "New Errors"]
+
     def initUI(self):
         main_layout = QVBoxLayout(self)
         
@@ -27,10 +56,42 @@ class BtrfsScrubGUI(QWidget):
         # Device Selection ComboBox
         self.device_combo = QComboBox(self)
         self.device_combo.setStyleSheet(self.get_styles())
-        self.device_combo.addItem("Select a device")
         self.populate_devices()
+        get_inventory().changed.connect(self.populate_devices)
         main_layout.addWidget(self.device_combo)
 
+        # I/O Priority and Adaptive Limit Controls
+        priority_layout = QHBoxLayout()
+        priority_layout.addWidget(QLabel("I/O class:", self))
+        self.ioprio_combo = QComboBox(self)
+        self.ioprio_combo.setStyleSheet(self.get_styles())
+        self.ioprio_combo.addItems(["default", "best-effort", "idle"])
+        self.ioprio_combo.setCurrentText("idle")
+        self.ioprio_combo.setToolTip("Needs an I/O scheduler with priority support (BFQ)")
+        priority_layout.addWidget(self.ioprio_combo)
+        priority_layout.addWidget(QLabel("Level:", self))
+        self.ioprio_level = QSpinBox(self)
+        self.ioprio_level.setRange(0, 7)
+        self.ioprio_level.setValue(7)
+        priority_layout.addWidget(self.ioprio_level)
+        main_layout.addLayout(priority_layout)
+
+        throttle_layout = QHBoxLayout()
+        self.adaptive_checkbox = QCheckBox("Adapt limits to latency, target await:", self)
+        throttle_layout.addWidget(self.adaptive_checkbox)
+        self.target_await = QDoubleSpinBox(self)
+        self.target_await.setRange(1, 10000)
+        self.target_await.setValue(ThrottleSettings().target_await_ms)
+        self.target_await.setSuffix(" ms")
+        throttle_layout.addWidget(self.target_await)
+        throttle_layout.addWidget(QLabel("Finish within:", self))
+        self.deadline_hours = QDoubleSpinBox(self)
+        self.deadline_hours.setRange(0, 10000)
+        self.deadline_hours.setSpecialValueText("no deadline")
+        self.deadline_hours.setSuffix(" h")
+        throttle_layout.addWidget(self.deadline_hours)
+        main_layout.addLayout(throttle_layout)
+
         # Start Scrub Button
         self.start_scrub_button = QPushButton("Start Scrub", self)
         self.start_scrub_button.setStyleSheet(self.get_styles())
@@ -55,10 +116,43 @@ class BtrfsScrubGUI(QWidget):
         self.status_scrub_button.clicked.connect(self.scrub_status_action)
         main_layout.addWidget(self.status_scrub_button)
 
+        # Cancel Command Button
+        self.cancel_button = QPushButton("Cancel Command", self)
+        self.cancel_button.setStyleSheet(self.get_styles())
+        self.cancel_button.clicked.connect(self.runner.cancel)
+        main_layout.addWidget(self.cancel_button)
+
+        # Live Monitor Controls
+        monitor_layout = QHBoxLayout()
+        monitor_layout.addWidget(QLabel("Poll every (s):", self))
+        self.monitor_interval = QSpinBox(self)
+        self.monitor_interval.setRange(1, 300)
+        self.monitor_interval.setValue(5)
+        self.monitor_interval.valueChanged.connect(self.monitor.set_interval)
+        monitor_layout.addWidget(self.monitor_interval)
+        self.monitor_button = QPushButton("Start Monitor", self)
+        self.monitor_button.setStyleSheet(self.get_styles())
+        self.monitor_button.clicked.connect(self.toggle_monitor_action)
+        monitor_layout.addWidget(self.monitor_button)
+        main_layout.addLayout(monitor_layout)
+
+        # Live Monitor Table
+        self.monitor_table = QTableWidget(0, len(self.MONITOR_COLUMNS), self)
+        self.monitor_table.setHorizontalHeaderLabels(self.MONITOR_COLUMNS)
+        self.monitor_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.monitor_table.verticalHeader().setVisible(False)
+        self.monitor_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        main_layout.addWidget(self.monitor_table)
+
+        # Total Throughput Sparkline and Summary
+        self.monitor_sparkline = ScrubSparkline(self)
+        main_layout.addWidget(self.monitor_sparkline)
+        self.monitor_summary = QLabel("", self)
+        main_layout.addWidget(self.monitor_summary)
+
         # Output Display Area
-        self.output_display = QTextEdit(self)
+        self.output_display = BtrfsOutputConsole(self)
         self.output_display.setStyleSheet(self.get_styles())
-        self.output_display.setReadOnly(True)
         main_layout.addWidget(self.output_display)
 
         # Set Layout
@@ -101,7 +195,7 @@ class BtrfsScrubGUI(QWidget):
                 padding: 10px;
             }
 
-            QTextEdit {
+            QTextEdit, QPlainTextEdit {
                 background-color: #444A53;
                 color: white;
                 font-family: Consolas, monospace;
@@ -113,33 +207,40 @@ class BtrfsScrubGUI(QWidget):
         """
 
     def populate_devices(self):
-        """Populate the ComboBox with block devices from lsblk."""
-        try:
-            result = subprocess.run(['lsblk', '--output', 'NAME,MOUNTPOINT'], capture_output=True, text=True)
-            if result.returncode == 0:
-                # Parse the output to get the list of devices with mount points
-                devices = []
-                for line in result.stdout.splitlines()[1:]:  # Skip the header line
-                    parts = line.split()
-                    if len(parts) > 1 and parts[1]:  # Ensure it has a mount point
-                        devices.append(parts[1])  # Add the mount point to the list
-                for device in devices:
-                    self.device_combo.addItem(device)
-            else:
-                self.output_display.setPlainText(f"Error: {result.stderr}")
-        except Exception as e:
-            self.output_display.setPlainText(f"Error fetching devices: {e}")
+        """Populate the ComboBox with mounted btrfs filesystems, keeping the selection."""
+        current = self.device_combo.currentText()
+        self.device_combo.clear()
+        self.device_combo.addItem("Select a device")
+        self.device_combo.addItems(get_inventory().btrfs_mount_points())
+        index = self.device_combo.findText(current)
+        if index > 0:
+            self.device_combo.setCurrentIndex(index)
 
     def start_scrub_action(self):
         device = self.device_combo.currentText()
         if device != "Select a device":
-            self.run_btrfs_command(f"scrub start {device}")
+            ioprio_class = self.ioprio_combo.currentText()
+            command = scrub_start_command(device, None if ioprio_class == "default" else ioprio_class,
+                                          self.ioprio_level.value())
+            busy = self.runner.is_running()
+            self.run_btrfs_command(" ".join(command))
+            if self.adaptive_checkbox.isChecked() and not busy:
+                self.start_limiter(device)
         else:
             self.output_display.setPlainText("Please select a device.")
 
+    def start_limiter(self, device):
+        """Adapt the per-device limits, using the live monitor samples as the control loop."""
+        settings = ThrottleSettings(target_await_ms=self.target_await.value(),
+                                    deadline=self.deadline_hours.value() * 3600)
+        self.limiter.start(device, settings)
+        if not self.monitor.is_active():
+            self.toggle_monitor_action()
+
     def cancel_scrub_action(self):
         device = self.device_combo.currentText()
         if device != "Select a device":
+            self.limiter.stop()
             self.run_btrfs_command(f"scrub cancel {device}")
         else:
             self.output_display.setPlainText("Please select a device.")
@@ -154,29 +255,108 @@ class BtrfsScrubGUI(QWidget):
     def scrub_status_action(self):
         device = self.device_combo.currentText()
         if device != "Select a device":
-            self.run_btrfs_command(f"scrub status {device}")
+            self.run_btrfs_command(f"scrub status {device}", QUERY_TIMEOUT)
         else:
             self.output_display.setPlainText("Please select a device.")
-    def execute_back_command(self):
-        try:
-            result = subprocess.run(["./main-btrfsqt6"], check=True, text=True, capture_output=True)
-            self.output_label.setText(f"Back command executed successfully: {result.stdout}")
-        except subprocess.CalledProcessError as e:
-            self.output_label.setText(f"Error executing back command: {e.stderr}")
-    
-    def run_btrfs_command(self, command):
-        """Run the btrfs command and display the output."""
-        try:
-            result = subprocess.run(['sudo', 'btrfs'] + command.split(), capture_output=True, text=True)
-            if result.returncode == 0:
-                self.output_display.setPlainText(result.stdout)
+
+    def toggle_monitor_action(self):
+        if self.monitor.is_active():
+            # Without samples the limiter would hold its last limits forever
+            self.limiter.stop()
+            self.monitor.stop()
+            self.monitor_button.setText("Start Monitor")
+            return
+
+        device = self.device_combo.currentText()
+        if device == "Select a device":
+            self.output_display.setPlainText("Please select a device.")
+            return
+        self.monitor_table.setRowCount(0)
+        self.monitor_rows = {}
+        self.monitor_sparkline.clear()
+        self.monitor_summary.setText("Waiting for the first sample...")
+        self.monitor.start(device, self.monitor_interval.value())
+        self.monitor_button.setText("Stop Monitor")
+
+    def update_monitor_table(self, progress):
+        """Show a monitor sample, touching only the cells whose text changed."""
+        total_rate = 0.0
+        eta = 0.0
+        running = False
+        for record in progress:
+            row = self.monitor_rows.get(record.devid)
+            if row is None:
+                row = self.monitor_table.rowCount()
+                self.monitor_table.insertRow(row)
+                for column in range(len(self.MONITOR_COLUMNS)):
+                    self.monitor_table.setItem(row, column, QTableWidgetItem(""))
+                self.monitor_rows[record.devid] = row
+
+            percent = f"{record.bytes_scrubbed / record.allocated * 100:.1f}%" if record.allocated else "?"
+            values = [
+                f"{record.path} (id {record.devid})",
+                record.status,
+                format_bytes(record.bytes_scrubbed),
+                format_bytes(record.allocated) if record.allocated else "?",
+                percent,
+                f"{format_bytes(record.rate)}/s",
+                self.limiter.describe(self.limiter.limits.get(record.devid, 0)) if self.limiter.is_active() else "",
+                format_duration(record.eta) if record.eta >= 0 else "?",
+                str(record.errors),
+                f"+{record.error_delta}" if record.error_delta else "",
+            ]
+            for column, text in enumerate(values):
+                item = self.monitor_table.item(row, column)
+                if item.text() != text:
+                    item.setText(text)
+
+            error_item = self.monitor_table.item(row, len(values) - 1)
+            error_item.setForeground(QColor("#D9534F") if record.error_delta else QColor("white"))
+
+            total_rate += record.rate
+            running = running or record.status == "running"
+            if record.eta < 0 or eta < 0:
+                eta = -1.0
             else:
-                self.output_display.setPlainText(f"Error: {result.stderr}")
-        except Exception as e:
-            self.output_display.setPlainText(f"Error executing command: {e}")
+                eta = max(eta, record.eta)
+
+        self.monitor_sparkline.add_sample(total_rate)
+        eta_text = format_duration(eta) if eta >= 0 else "unknown"
+        self.monitor_summary.setText(f"Total: {format_bytes(total_rate)}/s, ETA {eta_text}")
+        if progress and not running:
+            # Scrub finished or was cancelled elsewhere
+            self.limiter.stop()
+
+    def monitor_error(self, message):
+        self.monitor_summary.setText(f"Monitor: {message}")
+
+    def execute_back_command(self):
+        """Return to the main menu."""
+        self.back_requested.emit()
+
+    def run_btrfs_command(self, command, timeout=None):
+        """Start the btrfs command and stream its output into the display."""
+        if self.runner.is_running():
+            self.output_display.append_line("A command is already running. Cancel it first.")
+            return
+        self.output_display.clear()
+        self.runner.run(['sudo', 'btrfs'] + command.split(), timeout)
+
+    def append_output(self, text):
+        self.output_display.append_text(text)
+
+    def output_display_line(self, line):
+        self.output_display.append_line(line)
+
+    def command_finished(self, exit_code, status):
+        self.output_display.finish()
+        message = describe_finish(exit_code, status)
+        if message:
+            self.output_display.append_line(message)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = BtrfsScrubGUI()
+    window.back_requested.connect(window.close)
     window.show()
     sys.exit(app.exec())
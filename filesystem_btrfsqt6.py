@@ -1,15 +1,25 @@
 import sys
-import subprocess
-from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QTextEdit, QHBoxLayout
-from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QHBoxLayout
+from PyQt6.QtCore import Qt, pyqtSignal
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, QUERY_TIMEOUT, describe_finish
+from outputconsole_btrfsqt6 import BtrfsOutputConsole
 
 class DiskOperationsGUI(QWidget):
+    # Emitted when the user asks to return to the main menu
+    back_requested = pyqtSignal()
+
     def __init__(self):
         super().__init__()
 
         self.setWindowTitle("Btrfs Disk Operations")
         self.setGeometry(200, 200, 600, 500)
 
+        # Asynchronous command runner
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.append_output)
+        self.runner.error_received.connect(self.append_output)
+        self.runner.command_finished.connect(self.command_finished)
+
         self.initUI()
 
     def initUI(self):
@@ -62,24 +72,25 @@ class DiskOperationsGUI(QWidget):
         self.mkswap_button.clicked.connect(lambda: self.run_disk_operation("mkswapfile"))
         button_layout.addWidget(self.mkswap_button)
 
+        # Cancel running operation
+        self.cancel_button = QPushButton("Cancel Operation", self)
+        self.cancel_button.clicked.connect(self.runner.cancel)
+        button_layout.addWidget(self.cancel_button)
+
         # Set the layout for buttons
         main_layout.addLayout(button_layout)
 
         # Çıktı Gösterim Alanı
-        self.output_display = QTextEdit(self)
+        self.output_display = BtrfsOutputConsole(self)
         self.output_display.setStyleSheet(self.get_styles())
-        self.output_display.setReadOnly(True)
         main_layout.addWidget(self.output_display)
 
         # Layout Ayarları
         self.setLayout(main_layout)
     def execute_back_command(self):
-        try:
-            result = subprocess.run(["./main-btrfsqt6"], check=True, text=True, capture_output=True)
-            self.output_label.setText(f"Back command executed successfully: {result.stdout}")
-        except subprocess.CalledProcessError as e:
-            self.output_label.setText(f"Error executing back command: {e.stderr}")
- 
+        """Return to the main menu."""
+        self.back_requested.emit()
+
     def get_styles(self):
         return """
             QWidget {
@@ -110,7 +121,7 @@ class DiskOperationsGUI(QWidget):
                 background-color: #2E353F;
             }
 
-            QTextEdit {
+            QTextEdit, QPlainTextEdit {
                 background-color: #444A53;
                 color: white;
                 font-family: Consolas, monospace;
@@ -122,38 +133,53 @@ class DiskOperationsGUI(QWidget):
         """
 
     def run_disk_operation(self, operation):
-        """Run the selected disk operation and display the output."""
-        try:
-            if operation == "df":
-                result = subprocess.run(['sudo', 'btrfs', 'filesystem', 'df', '/'], capture_output=True, text=True)
-            elif operation == "du":
-                result = subprocess.run(['sudo', 'btrfs', 'filesystem', 'du', '/'], capture_output=True, text=True)
-            elif operation == "show":
-                result = subprocess.run(['sudo', 'btrfs', 'filesystem', 'show', '/'], capture_output=True, text=True)
-            elif operation == "sync":
-                result = subprocess.run(['sudo', 'btrfs', 'filesystem', 'sync', '/'], capture_output=True, text=True)
-            elif operation == "defragment":
-                result = subprocess.run(['sudo', 'btrfs', 'filesystem', 'defragment', '/'], capture_output=True, text=True)
-            elif operation == "resize":
-                # Prompt for a new size or use a default value
-                new_size = "10G"  # Example size
-                result = subprocess.run(['sudo', 'btrfs', 'filesystem', 'resize', new_size, '/'], capture_output=True, text=True)
-            elif operation == "mkswapfile":
-                # Prompt for swap file path
-                swap_file = "/mnt/swapfile"  # Example path
-                result = subprocess.run(['sudo', 'btrfs', 'filesystem', 'mkswapfile', swap_file], capture_output=True, text=True)
-
-            # Display output
-            if result.returncode == 0:
-                self.output_display.setPlainText(result.stdout)
-            else:
-                self.output_display.setPlainText(f"Error: {result.stderr}")
-
-        except Exception as e:
-            self.output_display.setPlainText(f"Error executing command: {e}")
+        """Start the selected disk operation and stream its output."""
+        if self.runner.is_running():
+            self.output_display.append_line("An operation is already running. Cancel it first.")
+            return
+
+        timeout = None
+        if operation == "df":
+            command = ['sudo', 'btrfs', 'filesystem', 'df', '/']
+            timeout = QUERY_TIMEOUT
+        elif operation == "du":
+            command = ['sudo', 'btrfs', 'filesystem', 'du', '/']
+        elif operation == "show":
+            command = ['sudo', 'btrfs', 'filesystem', 'show', '/']
+            timeout = QUERY_TIMEOUT
+        elif operation == "sync":
+            command = ['sudo', 'btrfs', 'filesystem', 'sync', '/']
+        elif operation == "defragment":
+            command = ['sudo', 'btrfs', 'filesystem', 'defragment', '/']
+        elif operation == "resize":
+            # Prompt for a new size or use a default value
+            new_size = "10G"  # Example size
+            command = ['sudo', 'btrfs', 'filesystem', 'resize', new_size, '/']
+        elif operation == "mkswapfile":
+            # Prompt for swap file path
+            swap_file = "/mnt/swapfile"  # Example path
+            command = ['sudo', 'btrfs', 'filesystem', 'mkswapfile', swap_file]
+        else:
+            self.output_display.setPlainText("Invalid Operation")
+            return
+
+        self.output_display.clear()
+        self.runner.run(command, timeout, cache=True)
+
+    def append_output(self, text):
+        self.output_display.append_text(text)
+
+    def command_finished(self, exit_code, status):
+        self.output_display.finish()
+        if self.runner.from_cache:
+            self.output_display.append_line(f"(cached result from {self.runner.cache_age():.0f}s ago)")
+        message = describe_finish(exit_code, status)
+        if message:
+            self.output_display.append_line(message)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = DiskOperationsGUI()
+    window.back_requested.connect(window.close)
     window.show()
     sys.exit(app.exec())
@@ -0,0 +1,164 @@
+import time
+from dataclasses import dataclass
+
+PSI_IO = "/proc/pressure/io"
+DISKSTATS = "/proc/diskstats"
+
+
+@dataclass(slots=True)
+class PressureLine:
+    avg10: float = 0.0
+    avg60: float = 0.0
+    avg300: float = 0.0
+    total: int = 0
+
+
+def parse_psi(text):
+    """Parse a PSI file into {"some": PressureLine, "full": PressureLine}.
+
+    Lines look like "some avg10=1.23 avg60=0.50 avg300=0.10 total=123456",
+    where total is the cumulative stall time in microseconds.
+    """
+    lines = {}
+    for line in text.splitlines():
+        kind, _, rest = line.partition(" ")
+        if kind not in ("some", "full"):
+            continue
+        record = PressureLine()
+        for item in rest.split():
+            key, _, value = item.partition("=")
+            try:
+                setattr(record, key, int(value) if key == "total" else float(value))
+            except (AttributeError, ValueError):
+                continue
+        lines[kind] = record
+    return lines
+
+
+def read_psi(path=PSI_IO):
+    """Read a PSI file; returns {} when the kernel has no PSI support."""
+    try:
+        with open(path) as psi_file:
+            return parse_psi(psi_file.read())
+    except OSError:
+        return {}
+
+
+@dataclass(slots=True)
+class DiskStats:
+    reads: int
+    read_ms: int
+    writes: int
+    write_ms: int
+    in_flight: int
+    io_ms: int
+    discards: int = 0
+    discard_ms: int = 0
+    flushes: int = 0
+    flush_ms: int = 0
+
+    @property
+    def ios(self):
+        return self.reads + self.writes + self.discards + self.flushes
+
+    @property
+    def ticks(self):
+        return self.read_ms + self.write_ms + self.discard_ms + self.flush_ms
+
+
+def parse_diskstats(text, names=None):
+    """Parse /proc/diskstats into {device name: DiskStats}.
+
+    Only the devices in names are kept when names is given.
+    """
+    stats = {}
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) < 14 or (names is not None and fields[2] not in names):
+            continue
+        values = [int(value) for value in fields[3:]]
+        extra = values[11:17] + [0] * (6 - len(values[11:17]))
+        stats[fields[2]] = DiskStats(
+            reads=values[0], read_ms=values[3], writes=values[4], write_ms=values[7],
+            in_flight=values[8], io_ms=values[9],
+            discards=extra[0], discard_ms=extra[3], flushes=extra[4], flush_ms=extra[5],
+        )
+    return stats
+
+
+def read_diskstats(names=None, path=DISKSTATS):
+    try:
+        with open(path) as diskstats_file:
+            return parse_diskstats(diskstats_file.read(), names)
+    except OSError:
+        return {}
+
+
+@dataclass(slots=True)
+class DeviceLatency:
+    name: str
+    await_ms: float
+    utilization: float
+    iops: float
+
+
+class DiskLatencyTracker:
+    """Turn successive diskstats samples into per-device await and utilization.
+
+    await is the average time an I/O completed during the interval spent
+    queued and in service, like the await column of iostat.
+    """
+
+    def __init__(self):
+        self.previous = {}
+        self.last_time = None
+
+    def update(self, stats, now=None):
+        now = time.monotonic() if now is None else now
+        latencies = []
+        if self.last_time is not None and now > self.last_time:
+            elapsed = now - self.last_time
+            for name, sample in stats.items():
+                last = self.previous.get(name)
+                if last is None:
+                    continue
+                ios = sample.ios - last.ios
+                ticks = sample.ticks - last.ticks
+                busy = sample.io_ms - last.io_ms
+                latencies.append(DeviceLatency(
+                    name,
+                    ticks / ios if ios > 0 else 0.0,
+                    min(busy / (elapsed * 1000), 1.0) if busy > 0 else 0.0,
+                    ios / elapsed if ios > 0 else 0.0,
+                ))
+        self.previous = stats
+        self.last_time = now
+        return latencies
+
+
+class PressureTracker:
+    """Stall percentage over the last sampling interval from a PSI total counter.
+
+    The kernel's avg10 trails a sudden change by several seconds; the delta
+    of the cumulative total reacts within one interval. The first sample
+    falls back to avg10.
+    """
+
+    def __init__(self, kind="some"):
+        self.kind = kind
+        self.last_total = None
+        self.last_time = None
+
+    def update(self, psi, now=None):
+        """Return the stall percentage, or None when PSI is unavailable."""
+        now = time.monotonic() if now is None else now
+        record = psi.get(self.kind)
+        if record is None:
+            return None
+        if self.last_total is not None and now > self.last_time and record.total >= self.last_total:
+            percent = (record.total - self.last_total) / ((now - self.last_time) * 1e6) * 100
+        else:
+            percent = record.avg10
+        self.last_total = record.total
+        self.last_time = now
+        return min(percent, 100.0)
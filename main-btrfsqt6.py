@@ -1,13 +1,18 @@
 import sys
-import subprocess
+import time
+import importlib
 from PyQt6.QtCore import Qt
-from PyQt6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QPushButton, QWidget
-import os
+from PyQt6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QPushButton, QWidget, QStackedWidget
 
 class MainBtrfsQt6(QMainWindow):
     def __init__(self):
         super().__init__()
 
+        # Panels built so far, keyed by module name
+        self.panels = {}
+        # Cold-start and warm-switch timings in milliseconds, keyed by label
+        self.panel_timings = {}
+
         # Apply custom styles
         self.apply_styles()
 
@@ -18,26 +23,30 @@ class MainBtrfsQt6(QMainWindow):
         # Create a layout to hold the buttons
         layout = QVBoxLayout()
 
-        # List of Python scripts and their labels
-        executables = [
-            ("Device Manager", "devicemanager_btrfsqt6.py"),
-            ("Disk Balance", "diskbalance_btrfsqt6.py"),
-            ("Disk Quota", "diskquota_btrfsqt6.py"),
-            ("Disk Recovery", "diskrecovery_btrfsqt6.py"),
-            ("Disk Scrub", "diskscrub_btrfsqt6.py"),
-            ("Filesystem Property", "filesystem_btrfsqt6.py"),
-            ("Rescue", "rescue_btrfsqt6.py"),
-            ("Subvolume", "subvolume_btrfsqt6.py")
+        # Panel modules, their labels and the panel class each one provides.
+        # Modules are imported on first use only.
+        panels = [
+            ("Device Manager", "devicemanager_btrfsqt6", "BtrfsGUI"),
+            ("Disk Balance", "diskbalance_btrfsqt6", "BtrfsBalanceDebugger"),
+            ("Disk Quota", "diskquota_btrfsqt6", "BtrfsQuotaGUI"),
+            ("Disk Recovery", "diskrecovery_btrfsqt6", "BtrfsRestoreUI"),
+            ("Disk Scrub", "diskscrub_btrfsqt6", "BtrfsScrubGUI"),
+            ("Filesystem Property", "filesystem_btrfsqt6", "DiskOperationsGUI"),
+            ("Rescue", "rescue_btrfsqt6", "BtrfsRescueGUI"),
+            ("Subvolume", "subvolume_btrfsqt6", "BtrfsSubvolumeGUI")
         ]
 
-        for label, script_name in executables:
-            button = self.create_popup_button(label, script_name)
+        for label, module_name, class_name in panels:
+            button = self.create_popup_button(label, module_name, class_name)
             layout.addWidget(button)
 
-        # Create a central widget and set the layout
-        central_widget = QWidget(self)
-        central_widget.setLayout(layout)
-        self.setCentralWidget(central_widget)
+        # The menu is the first page of the stack; panels are added after it
+        self.menu_widget = QWidget(self)
+        self.menu_widget.setLayout(layout)
+
+        self.stack = QStackedWidget(self)
+        self.stack.addWidget(self.menu_widget)
+        self.setCentralWidget(self.stack)
 
     def apply_styles(self):
         """Apply the CSS styles to the window."""
@@ -72,7 +81,7 @@ class MainBtrfsQt6(QMainWindow):
                 background-color: #2E353F;
             }
 
-            QTextEdit {
+            QTextEdit, QPlainTextEdit {
                 background-color: #444A53;
                 color: white;
                 font-family: Consolas, monospace;
@@ -83,29 +92,57 @@ class MainBtrfsQt6(QMainWindow):
                 margin-top: 10px;
             }
 
-            QTextEdit:focus {
+            QTextEdit:focus, QPlainTextEdit:focus {
                 border-color: #4A90E2;
             }
         """)
 
-    def create_popup_button(self, label, script_name):
-        """Create a styled button that runs a Python script."""
+    def create_popup_button(self, label, module_name, class_name):
+        """Create a styled button that opens a panel."""
         button = QPushButton(label, self)
-        button.clicked.connect(lambda: self.run_script(script_name))
+        button.clicked.connect(lambda: self.show_panel(label, module_name, class_name))
         button.setCursor(Qt.CursorShape.PointingHandCursor)
         return button
 
-    def run_script(self, script_name):
-        """Run the Python script when menu item is clicked."""
-        try:
-            script_path = os.path.join(os.getcwd(), script_name)
-
-            if os.path.exists(script_path) and os.access(script_path, os.R_OK):
-                subprocess.run([sys.executable, script_path], check=True)
-            else:
-                print(f"Script '{script_name}' not found or not readable.")
-        except Exception as e:
-            print(f"Error running script: {e}")
+    def show_panel(self, label, module_name, class_name):
+        """Switch to a panel, importing and building it on first use."""
+        start = time.perf_counter()
+        panel = self.panels.get(module_name)
+
+        if panel is None:
+            try:
+                module = importlib.import_module(module_name)
+                imported = time.perf_counter()
+                panel = getattr(module, class_name)()
+            except Exception as e:
+                self.statusBar().showMessage(f"Error loading {label}: {e}")
+                return
+            panel.back_requested.connect(self.show_menu)
+            self.stack.addWidget(panel)
+            self.panels[module_name] = panel
+            self.stack.setCurrentWidget(panel)
+
+            elapsed = (time.perf_counter() - start) * 1000
+            import_time = (imported - start) * 1000
+            self.panel_timings[label] = {"cold": elapsed, "warm": []}
+            self.statusBar().showMessage(
+                f"{label}: cold start {elapsed:.1f} ms "
+                f"(import {import_time:.1f} ms, build {elapsed - import_time:.1f} ms)")
+        else:
+            self.stack.setCurrentWidget(panel)
+
+            elapsed = (time.perf_counter() - start) * 1000
+            timings = self.panel_timings[label]
+            timings["warm"].append(elapsed)
+            self.statusBar().showMessage(
+                f"{label}: warm switch {elapsed:.2f} ms (cold start was {timings['cold']:.1f} ms)")
+
+        self.setWindowTitle(panel.windowTitle())
+
+    def show_menu(self):
+        """Return to the menu page without discarding the built panels."""
+        self.stack.setCurrentWidget(self.menu_widget)
+        self.setWindowTitle("Executable Menu Example")
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
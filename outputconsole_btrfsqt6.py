@@ -0,0 +1,91 @@
+from collections import deque
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QPlainTextEdit
+
+
+class BtrfsOutputConsole(QPlainTextEdit):
+    """Read-only output view whose memory use does not grow with the output.
+
+    Streamed text is split into lines and queued in a ring buffer holding at
+    most max_lines lines. A timer flushes the queue into the view at most
+    once per update interval, and the document itself is capped to the same
+    number of lines, so the oldest lines are discarded first.
+    """
+
+    DEFAULT_MAX_LINES = 100000
+    DEFAULT_UPDATE_INTERVAL_MS = 100
+    # An unterminated line longer than this is broken up instead of growing forever
+    MAX_PARTIAL_LINE = 65536
+
+    def __init__(self, parent=None, max_lines=DEFAULT_MAX_LINES,
+                 update_interval_ms=DEFAULT_UPDATE_INTERVAL_MS):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setUndoRedoEnabled(False)
+
+        self.pending = deque()
+        self.partial = ""
+        self.total_lines = 0
+        self.set_max_lines(max_lines)
+
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(update_interval_ms)
+        self.flush_timer.timeout.connect(self.flush)
+
+    def set_max_lines(self, max_lines):
+        self.max_lines = max_lines
+        self.pending = deque(self.pending, maxlen=max_lines)
+        self.setMaximumBlockCount(max_lines)
+
+    def set_update_interval(self, update_interval_ms):
+        self.flush_timer.setInterval(update_interval_ms)
+
+    def append_text(self, text):
+        """Queue a chunk of streamed output; it may end in the middle of a line."""
+        if not text:
+            return
+        lines = (self.partial + text).split("\n")
+        self.partial = lines.pop()
+        if len(self.partial) > self.MAX_PARTIAL_LINE:
+            lines.append(self.partial)
+            self.partial = ""
+        self.total_lines += len(lines)
+        self.pending.extend(lines)
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def append_line(self, line):
+        """Append a complete message line, after any output still queued."""
+        self.finish()
+        self.pending.append(line)
+        self.total_lines += 1
+        self.flush()
+
+    def finish(self):
+        """Treat a trailing unterminated line as complete, e.g. when a command exits."""
+        if self.partial:
+            self.pending.append(self.partial)
+            self.partial = ""
+            self.total_lines += 1
+        self.flush()
+
+    def flush(self):
+        self.flush_timer.stop()
+        if not self.pending:
+            return
+        block = "\n".join(self.pending)
+        self.pending.clear()
+        self.appendPlainText(block)
+
+    def setPlainText(self, text):
+        self.clear()
+        self.append_text(text)
+        self.finish()
+
+    def clear(self):
+        self.flush_timer.stop()
+        self.pending.clear()
+        self.partial = ""
+        self.total_lines = 0
+        super().clear()
@@ -1,14 +1,25 @@
 import sys
-import subprocess
-from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QTextEdit, QLineEdit
+from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QLineEdit
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, QUERY_TIMEOUT, describe_finish
+from outputconsole_btrfsqt6 import BtrfsOutputConsole
 
 class BtrfsPropertyGUI(QWidget):
+    # Emitted when the user asks to return to the main menu
+    back_requested = pyqtSignal()
+
     def __init__(self):
         super().__init__()
 
         self.setWindowTitle("Btrfs Property Operations")
         self.setGeometry(200, 200, 600, 500)
 
+        # Asynchronous command runner
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.append_output)
+        self.runner.error_received.connect(self.append_output)
+        self.runner.command_finished.connect(self.command_finished)
+
         self.initUI()
 
     def initUI(self):
@@ -57,8 +68,7 @@ class BtrfsPropertyGUI(QWidget):
         main_layout.addWidget(self.property_value_input)
 
         # Çıktı Alanı
-        self.output_display = QTextEdit(self)
-        self.output_display.setReadOnly(True)
+        self.output_display = BtrfsOutputConsole(self)
         main_layout.addWidget(self.output_display)
 
         self.setLayout(main_layout)
@@ -113,7 +123,7 @@ class BtrfsPropertyGUI(QWidget):
                 border-color: #4A90E2;
             }
 
-            QTextEdit {
+            QTextEdit, QPlainTextEdit {
                 background-color: #444A53;
                 color: white;
                 font-family: Consolas, monospace;
@@ -124,16 +134,13 @@ class BtrfsPropertyGUI(QWidget):
                 margin-top: 10px;
             }
 
-            QTextEdit:focus {
+            QTextEdit:focus, QPlainTextEdit:focus {
                 border-color: #4A90E2;
             }
         """)
     def execute_back_command(self):
-        try:
-            result = subprocess.run(["./main-btrfsqt6"], check=True, text=True, capture_output=True)
-            self.output_label.setText(f"Back command executed successfully: {result.stdout}")
-        except subprocess.CalledProcessError as e:
-            self.output_label.setText(f"Error executing back command: {e.stderr}")
+        """Return to the main menu."""
+        self.back_requested.emit()
 
     def run_property_operation(self, operation):
         """Btrfs property komutlarını çalıştır ve sonucu göster."""
@@ -141,29 +148,38 @@ class BtrfsPropertyGUI(QWidget):
         property_name = self.property_name_input.text().strip()
         property_value = self.property_value_input.text().strip()
 
-        try:
-            if operation == "get":
-                result = subprocess.run(['sudo', 'btrfs', 'property', 'get', object_path, property_name], capture_output=True, text=True)
-            elif operation == "set" and property_value:
-                result = subprocess.run(['sudo', 'btrfs', 'property', 'set', object_path, property_name, property_value], capture_output=True, text=True)
-            elif operation == "list":
-                result = subprocess.run(['sudo', 'btrfs', 'property', 'list', object_path], capture_output=True, text=True)
-            else:
-                self.output_display.setPlainText("Please provide the necessary input.")
-                return
+        if self.runner.is_running():
+            self.output_display.append_line("A command is already running.")
+            return
+
+        if operation == "get":
+            command = ['sudo', 'btrfs', 'property', 'get', object_path, property_name]
+        elif operation == "set" and property_value:
+            command = ['sudo', 'btrfs', 'property', 'set', object_path, property_name, property_value]
+        elif operation == "list":
+            command = ['sudo', 'btrfs', 'property', 'list', object_path]
+        else:
+            self.output_display.setPlainText("Please provide the necessary input.")
+            return
+
+        self.output_display.clear()
+        self.runner.run(command, QUERY_TIMEOUT, cache=True)
 
-            # Çıktıyı göster
-            if result.returncode == 0:
-                self.output_display.setPlainText(result.stdout)
-            else:
-                self.output_display.setPlainText(f"Error: {result.stderr}")
+    def append_output(self, text):
+        self.output_display.append_text(text)
 
-        except Exception as e:
-            self.output_display.setPlainText(f"Error executing command: {e}")
+    def command_finished(self, exit_code, status):
+        self.output_display.finish()
+        if self.runner.from_cache:
+            self.output_display.append_line(f"(cached result from {self.runner.cache_age():.0f}s ago)")
+        message = describe_finish(exit_code, status)
+        if message:
+            self.output_display.append_line(message)
 
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = BtrfsPropertyGUI()
+    window.back_requested.connect(window.close)
     window.show()
     sys.exit(app.exec())
@@ -0,0 +1,247 @@
+import re
+import csv
+from collections import deque
+from dataclasses import dataclass
+from PyQt6.QtCore import QObject, pyqtSignal
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, QUERY_TIMEOUT, describe_finish
+
+QGROUPID_RE = re.compile(r"^(\d+)/(\d+)$")
+SIZE_RE = re.compile(r"^(\d+(?:\.\d+)?)\s*([kmgtpe]?)(?:i?b)?$", re.IGNORECASE)
+SIZE_UNITS = "kmgtpe"
+
+# CSV/table columns: qgroup (0/257 or a subvolume id), parent qgroup, referenced limit, exclusive limit
+QGROUP_BATCH_COLUMNS = ("qgroup", "parent", "max_rfer", "max_excl")
+
+
+def parse_size(text):
+    """Parse a qgroup limit such as 10G, 512MiB or 1048576; "none" or "" means no limit (0).
+
+    Returns None when the limit column is left empty, which leaves the limit as it is.
+    """
+    text = text.strip()
+    if not text:
+        return None
+    if text.lower() == "none":
+        return 0
+    match = SIZE_RE.match(text)
+    if match is None:
+        raise ValueError(f"invalid size {text!r}")
+    value = float(match.group(1))
+    unit = match.group(2).lower()
+    if unit:
+        value *= 1024 ** (SIZE_UNITS.index(unit) + 1)
+    return int(value)
+
+
+def parse_qgroupid(text):
+    """Normalize "0/257" or a bare subvolume id "257" to (level, id)."""
+    text = text.strip()
+    if text.isdigit():
+        return 0, int(text)
+    match = QGROUPID_RE.match(text)
+    if match is None:
+        raise ValueError(f"invalid qgroup {text!r}")
+    return int(match.group(1)), int(match.group(2))
+
+
+@dataclass(slots=True)
+class QgroupBatchRow:
+    line: int
+    qgroupid: str
+    parent: str = ""
+    # None leaves the limit unchanged, 0 removes it
+    max_rfer: object = None
+    max_excl: object = None
+
+
+def parse_batch_rows(rows):
+    """Validate rows of QGROUP_BATCH_COLUMNS values; raises ValueError naming the first bad line."""
+    parsed = []
+    seen = set()
+    for line, values in enumerate(rows, 1):
+        values = [value.strip() for value in values] + [""] * (len(QGROUP_BATCH_COLUMNS) - len(values))
+        if not any(values) or values[0].startswith("#") or values[0].lower() == "qgroup":
+            continue
+        try:
+            level, subvolume = parse_qgroupid(values[0])
+            row = QgroupBatchRow(line, f"{level}/{subvolume}")
+            if values[1]:
+                parent_level, parent_id = parse_qgroupid(values[1])
+                if parent_level <= level:
+                    raise ValueError(f"parent {values[1]} must be on a higher level than {row.qgroupid}")
+                row.parent = f"{parent_level}/{parent_id}"
+            row.max_rfer = parse_size(values[2])
+            row.max_excl = parse_size(values[3])
+        except ValueError as error:
+            raise ValueError(f"line {line}: {error}") from None
+        key = (row.qgroupid, row.parent)
+        if key in seen:
+            raise ValueError(f"line {line}: {row.qgroupid} is listed twice"
+                             + (f" for {row.parent}" if row.parent else ""))
+        seen.add(key)
+        if not row.parent and row.max_rfer is None and row.max_excl is None:
+            raise ValueError(f"line {line}: nothing to do for {row.qgroupid}")
+        parsed.append(row)
+    return parsed
+
+
+def parse_batch_csv(text):
+    return parse_batch_rows(csv.reader(text.splitlines()))
+
+
+@dataclass(slots=True)
+class QgroupOperation:
+    kind: str
+    # Arguments after `btrfs qgroup`, without the filesystem path
+    arguments: list
+    # Arguments that undo the operation, or None
+    undo: object
+    description: str
+
+
+def limit_argument(value):
+    return "none" if not value else str(value)
+
+
+def plan_qgroup_batch(rows, table):
+    """Turn validated rows into qgroup operations checked against a QgroupTable.
+
+    Missing parents are created first, then assignments (with --no-rescan)
+    and limits follow. Assignments and limits that are already in place
+    are skipped. Each operation carries its undo for rollback.
+    """
+    errors = []
+    creates = {}
+    assigns = []
+    limits = []
+    for row in rows:
+        record = table.by_id.get(row.qgroupid)
+        if record is None and row.qgroupid.startswith("0/"):
+            errors.append(f"line {row.line}: no subvolume qgroup {row.qgroupid}")
+            continue
+        if record is None and row.qgroupid not in creates:
+            creates[row.qgroupid] = QgroupOperation(
+                "create", ["create", row.qgroupid], ["destroy", row.qgroupid], f"create {row.qgroupid}")
+        if row.parent:
+            if row.parent not in table.by_id and row.parent not in creates:
+                creates[row.parent] = QgroupOperation(
+                    "create", ["create", row.parent], ["destroy", row.parent], f"create {row.parent}")
+            if record is None or row.parent not in record.parents:
+                assigns.append(QgroupOperation(
+                    "assign", ["assign", "--no-rescan", row.qgroupid, row.parent],
+                    ["remove", "--no-rescan", row.qgroupid, row.parent],
+                    f"assign {row.qgroupid} to {row.parent}"))
+        for option, value, current in (("", row.max_rfer, record.max_rfer if record else 0),
+                                       ("-e", row.max_excl, record.max_excl if record else 0)):
+            if value is None or value == current:
+                continue
+            options = [option] if option else []
+            kind = "exclusive" if option else "referenced"
+            limits.append(QgroupOperation(
+                "limit", ["limit"] + options + [limit_argument(value), row.qgroupid],
+                ["limit"] + options + [limit_argument(current), row.qgroupid],
+                f"limit {kind} of {row.qgroupid} to {limit_argument(value)}"))
+    if errors:
+        raise ValueError("\n".join(errors))
+    return list(creates.values()) + assigns + limits
+
+
+class QgroupBatchJob(QObject):
+    """Run planned qgroup operations one by one and roll back on the first failure.
+
+    Assignments use --no-rescan, so the accounting is only made consistent
+    by the single rescan the caller starts when finished() reports
+    needs_rescan. That is also the case after a rollback that touched
+    assignments.
+    """
+
+    log = pyqtSignal(str)
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(bool, bool)
+
+    def __init__(self, parent=None, btrfs=("sudo", "btrfs")):
+        super().__init__(parent)
+        self.btrfs = list(btrfs)
+        self.path = ""
+        self.queue = deque()
+        self.done = []
+        self.total = 0
+        self.current = None
+        self.rolling_back = False
+        self.failed = False
+        self.errors = ""
+
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.error_received.connect(self.error_received)
+        self.runner.command_finished.connect(self.command_finished)
+
+    def is_active(self):
+        return self.current is not None
+
+    def start(self, path, operations):
+        if self.is_active() or not operations:
+            return False
+        self.path = path
+        self.queue = deque(operations)
+        self.done = []
+        self.total = len(operations)
+        self.rolling_back = False
+        self.failed = False
+        self.log.emit(f"Running {self.total} qgroup operations on {path}.")
+        self.run_next()
+        return True
+
+    def cancel(self):
+        """Stop after the current operation and undo what was done."""
+        if self.is_active() and not self.rolling_back:
+            self.queue.clear()
+            self.failed = True
+            self.log.emit("Cancelled; rolling back.")
+
+    def run_next(self):
+        if not self.queue:
+            if self.failed and not self.rolling_back:
+                self.rollback()
+                return
+            self.finish()
+            return
+        self.current = self.queue.popleft()
+        self.errors = ""
+        arguments = self.current.undo if self.rolling_back else self.current.arguments
+        self.runner.run(self.btrfs + ["qgroup"] + arguments + [self.path], QUERY_TIMEOUT)
+
+    def rollback(self):
+        self.rolling_back = True
+        self.queue = deque(reversed([operation for operation in self.done if operation.undo]))
+        self.log.emit(f"Rolling back {len(self.queue)} operations.")
+        self.run_next()
+
+    def error_received(self, text):
+        self.errors += text
+
+    def command_finished(self, exit_code, status):
+        operation = self.current
+        message = self.errors.strip() or describe_finish(exit_code, status)
+        if self.rolling_back:
+            if exit_code != 0:
+                self.log.emit(f"Rollback of \"{operation.description}\" failed: {message}")
+            else:
+                self.log.emit(f"Rolled back: {operation.description}")
+        elif exit_code != 0:
+            self.log.emit(f"Failed: {operation.description}: {message}")
+            self.failed = True
+            self.queue.clear()
+        else:
+            self.done.append(operation)
+            self.progress.emit(len(self.done), self.total)
+        self.run_next()
+
+    def finish(self):
+        # Assignments changed qgroup relations without rescanning, even if rolled back since
+        needs_rescan = any(operation.kind == "assign" for operation in self.done)
+        ok = not self.failed
+        self.current = None
+        self.log.emit(f"Qgroup batch {'finished' if ok else 'rolled back'}: "
+                      f"{len(self.done)} of {self.total} operations applied"
+                      + ("" if ok else " and undone") + ".")
+        self.finished.emit(ok, needs_rescan)
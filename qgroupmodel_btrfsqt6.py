@@ -0,0 +1,318 @@
+from PyQt6.QtCore import Qt, QObject, QTimer, QAbstractTableModel, QModelIndex, pyqtSignal
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, QUERY_TIMEOUT, describe_finish
+from btrfsparsers_btrfsqt6 import QgroupShowParser, format_bytes
+
+
+class QgroupTable:
+    """qgroup show results indexed for constant-time lookups.
+
+    Level 0 qgroups are keyed by subvolume id as well as by qgroupid. For
+    every higher-level qgroup the level 0 qgroups below it are rolled up
+    into a member count and the sum of their exclusive bytes.
+    """
+
+    def __init__(self, records=()):
+        self.by_id = {record.qgroupid: record for record in records}
+        self.by_subvolume = {record.id: record for record in records if record.level == 0}
+        self.members = {}
+        self.rollups = {}
+        for record in self.by_id.values():
+            if record.level > 0:
+                self.level0_members(record.qgroupid)
+
+    def level0_members(self, qgroupid, visiting=()):
+        """Level 0 qgroupids below qgroupid, memoized; a member can sit under several parents."""
+        members = self.members.get(qgroupid)
+        if members is not None:
+            return members
+        record = self.by_id.get(qgroupid)
+        if record is None or qgroupid in visiting:
+            return frozenset()
+        if record.level == 0:
+            return frozenset((qgroupid,))
+        found = set()
+        for child in record.children:
+            child_record = self.by_id.get(child)
+            if child_record is None:
+                continue
+            if child_record.level == 0:
+                found.add(child)
+            else:
+                found |= self.level0_members(child, visiting + (qgroupid,))
+        members = self.members[qgroupid] = frozenset(found)
+        return members
+
+    def rollup(self, record):
+        """(member count, sum of member exclusive bytes) of a qgroup."""
+        if record.level == 0:
+            return 1, record.excl
+        rollup = self.rollups.get(record.qgroupid)
+        if rollup is None:
+            members = self.members.get(record.qgroupid, ())
+            rollup = self.rollups[record.qgroupid] = (
+                len(members), sum(self.by_id[member].excl for member in members))
+        return rollup
+
+    def freed_by_deleting(self, subvolume_id):
+        """Bytes deleting this subvolume gives back: its exclusive bytes. None if unknown.
+
+        Extents shared with any other subvolume stay allocated, so only
+        the exclusive count is freed.
+        """
+        record = self.by_subvolume.get(subvolume_id)
+        return record.excl if record is not None else None
+
+    def usage_of_limit(self, record):
+        """Highest used fraction of the referenced or exclusive limit, or -1 without limits."""
+        used = -1.0
+        if record.max_rfer:
+            used = max(used, record.rfer / record.max_rfer)
+        if record.max_excl:
+            used = max(used, record.excl / record.max_excl)
+        return used
+
+
+class QgroupTableModel(QAbstractTableModel):
+    """Sortable qgroup table that applies refreshes as row-level changes.
+
+    update() compares the new qgroup show results with the rows it has and
+    only reports the rows that changed, appeared or went away, so views
+    keep their scroll position and selection and stay responsive with tens
+    of thousands of qgroups.
+    """
+
+    COLUMNS = ["Qgroup", "Path", "Referenced", "Exclusive", "Max Rfer", "Max Excl",
+               "Limit Used", "Members", "Members Excl", "Parents"]
+    SORT_KEYS = [
+        lambda table, record: (record.level, record.id),
+        lambda table, record: record.path,
+        lambda table, record: record.rfer,
+        lambda table, record: record.excl,
+        lambda table, record: record.max_rfer,
+        lambda table, record: record.max_excl,
+        lambda table, record: table.usage_of_limit(record),
+        lambda table, record: table.rollup(record)[0],
+        lambda table, record: table.rollup(record)[1],
+        lambda table, record: record.parents,
+    ]
+    # Above this many removals a reset is cheaper than removing rows one by one
+    RESET_THRESHOLD = 1000
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.table = QgroupTable()
+        self.rows = []
+        self.row_of = {}
+        self.sort_column = 0
+        self.sort_order = Qt.SortOrder.AscendingOrder
+
+    def update(self, records):
+        """Apply a fresh qgroup list; returns (changed, added, removed) counts."""
+        old_table = self.table
+        table = QgroupTable(records)
+        removed = [qgroupid for qgroupid in old_table.by_id if qgroupid not in table.by_id]
+        added = [record for record in table.by_id.values() if record.qgroupid not in old_table.by_id]
+
+        if len(removed) > self.RESET_THRESHOLD:
+            self.beginResetModel()
+            self.table = table
+            self.rows = list(table.by_id.values())
+            self.sort_rows()
+            self.endResetModel()
+            return len(self.rows) - len(added), len(added), len(removed)
+
+        for row in sorted((self.row_of[qgroupid] for qgroupid in removed), reverse=True):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self.rows[row]
+            self.endRemoveRows()
+        if removed:
+            self.index_rows()
+
+        # Records are replaced in place; rollups depend on the whole table, so it goes first
+        self.table = table
+        key = self.SORT_KEYS[self.sort_column]
+        changed = []
+        reorder = bool(added)
+        for row, record in enumerate(self.rows):
+            new = table.by_id[record.qgroupid]
+            if new != record or (record.level > 0 and
+                                 old_table.rollup(record) != table.rollup(new)):
+                if not reorder:
+                    reorder = key(old_table, record) != key(table, new)
+                self.rows[row] = new
+                changed.append(row)
+        for first, last in self.row_runs(changed):
+            self.dataChanged.emit(self.index(first, 0), self.index(last, len(self.COLUMNS) - 1))
+
+        if added:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(added) - 1)
+            self.rows.extend(added)
+            self.index_rows()
+            self.endInsertRows()
+
+        if reorder:
+            # A sort key changed: move rows with a layout change, no reset
+            self.layoutAboutToBeChanged.emit()
+            persistent = self.persistentIndexList()
+            before = [self.rows[index.row()].qgroupid for index in persistent]
+            self.sort_rows()
+            self.changePersistentIndexList(
+                persistent, [self.index(self.row_of[qgroupid], index.column())
+                             for qgroupid, index in zip(before, persistent)])
+            self.layoutChanged.emit()
+        return len(changed), len(added), len(removed)
+
+    @staticmethod
+    def row_runs(rows):
+        """Contiguous (first, last) runs of sorted row numbers."""
+        runs = []
+        for row in rows:
+            if runs and runs[-1][1] == row - 1:
+                runs[-1][1] = row
+            else:
+                runs.append([row, row])
+        return runs
+
+    def index_rows(self):
+        self.row_of = {record.qgroupid: row for row, record in enumerate(self.rows)}
+
+    def sort_rows(self):
+        key = self.SORT_KEYS[self.sort_column]
+        self.rows.sort(key=lambda record: key(self.table, record),
+                       reverse=self.sort_order == Qt.SortOrder.DescendingOrder)
+        self.index_rows()
+
+    def record(self, index):
+        return self.rows[index.row()] if index.isValid() else None
+
+    # QAbstractTableModel
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.COLUMNS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.TextAlignmentRole and 2 <= index.column() <= 8:
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        record = self.rows[index.row()]
+        column = index.column()
+        if column == 0:
+            return record.qgroupid
+        if column == 1:
+            return record.path
+        if column == 2:
+            return format_bytes(record.rfer)
+        if column == 3:
+            return format_bytes(record.excl)
+        if column == 4:
+            return format_bytes(record.max_rfer) if record.max_rfer else "none"
+        if column == 5:
+            return format_bytes(record.max_excl) if record.max_excl else "none"
+        if column == 6:
+            used = self.table.usage_of_limit(record)
+            return f"{used * 100:.1f}%" if used >= 0 else ""
+        if column == 7:
+            return str(self.table.rollup(record)[0]) if record.level > 0 else ""
+        if column == 8:
+            return format_bytes(self.table.rollup(record)[1]) if record.level > 0 else ""
+        return ",".join(record.parents)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        self.sort_column = column
+        self.sort_order = order
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        before = [self.rows[index.row()].qgroupid for index in persistent]
+        self.sort_rows()
+        self.changePersistentIndexList(
+            persistent, [self.index(self.row_of[qgroupid], index.column())
+                         for qgroupid, index in zip(before, persistent)])
+        self.layoutChanged.emit()
+
+
+class QgroupRefresher(QObject):
+    """Run `btrfs qgroup show --raw -pcre` now and then and feed a QgroupTableModel."""
+
+    refreshed = pyqtSignal(int, int, int)
+    refresh_error = pyqtSignal(str)
+
+    def __init__(self, model, parent=None, btrfs=("sudo", "btrfs")):
+        super().__init__(parent)
+        self.model = model
+        self.btrfs = list(btrfs)
+        self.path = ""
+        self.filter_path = ""
+        self.parser = None
+        self.errors = ""
+
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.output_received)
+        self.runner.error_received.connect(self.error_received)
+        self.runner.command_finished.connect(self.command_finished)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def set_target(self, path, filter_path=""):
+        """Filesystem to show; with filter_path only the qgroups affecting it (-F)."""
+        if (path, filter_path) != (self.path, self.filter_path):
+            self.model.update([])
+            # The running refresh reports on the old target
+            self.runner.cancel()
+        self.path = path
+        self.filter_path = filter_path
+
+    def command(self):
+        command = self.btrfs + ["qgroup", "show", "--raw", "-pcre"]
+        if self.filter_path:
+            command += ["-F", self.filter_path]
+        else:
+            command += [self.path]
+        return command
+
+    def refresh(self, cache=False):
+        if not self.path or self.runner.is_running():
+            return
+        self.parser = QgroupShowParser()
+        self.errors = ""
+        self.runner.run(self.command(), QUERY_TIMEOUT, cache=cache)
+
+    def set_auto_refresh(self, interval):
+        """Refresh every interval seconds; 0 turns automatic refresh off."""
+        if interval > 0:
+            self.refresh_timer.start(int(interval * 1000))
+        else:
+            self.refresh_timer.stop()
+
+    def stop(self):
+        self.refresh_timer.stop()
+        self.runner.cancel()
+
+    def output_received(self, text):
+        self.parser.feed_text(text)
+
+    def error_received(self, text):
+        self.errors += text
+
+    def command_finished(self, exit_code, status):
+        records = self.parser.finish()
+        if self.runner.argv != self.command():
+            # The target changed while this ran; show the new one instead
+            self.refresh()
+            return
+        if exit_code != 0:
+            if status != "cancelled":
+                self.refresh_error.emit(self.errors.strip() or describe_finish(exit_code, status))
+            return
+        self.refreshed.emit(*self.model.update(records))
@@ -0,0 +1,67 @@
+import os
+from PyQt6.QtCore import QObject, pyqtSignal
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, QUERY_TIMEOUT
+from blockinventory_btrfsqt6 import SYS_BTRFS, read_file
+
+# Accounting modes offered by `btrfs quota enable`
+QUOTA_MODES = {
+    "full": "Full qgroup accounting",
+    "simple": "Simple quotas (squota)",
+}
+
+
+def kernel_supports_simple_quota(sys_btrfs=SYS_BTRFS):
+    """Linux 6.7+ lists simple_quota among the supported btrfs features."""
+    return os.path.exists(os.path.join(sys_btrfs, "features", "simple_quota"))
+
+
+def quota_mode(uuid, sys_btrfs=SYS_BTRFS):
+    """Accounting mode of a mounted filesystem as sysfs reports it, e.g. "qgroup" or "squota".
+
+    Returns "" when quotas are off or the kernel does not report a mode.
+    """
+    return read_file(os.path.join(sys_btrfs, uuid, "qgroups", "mode"))
+
+
+def quota_enable_command(path, mode="full"):
+    """Arguments after btrfs for enabling quotas in the given mode."""
+    return ["quota", "enable"] + (["--simple"] if mode == "simple" else []) + [path]
+
+
+class QuotaCapabilityProbe(QObject):
+    """Find out whether btrfs-progs and the kernel can enable simple quotas.
+
+    btrfs-progs 6.7+ documents --simple in `quota enable --help`; the help
+    text is read instead of the version so backports are recognized too.
+    detected(progs, kernel) is emitted once the help has been read.
+    """
+
+    detected = pyqtSignal(bool, bool)
+
+    def __init__(self, parent=None, btrfs=("btrfs",), sys_btrfs=SYS_BTRFS):
+        super().__init__(parent)
+        self.btrfs = list(btrfs)
+        self.sys_btrfs = sys_btrfs
+        self.help_text = ""
+        self.progs = None
+        self.kernel = None
+
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.output_received)
+        self.runner.error_received.connect(self.output_received)
+        self.runner.command_finished.connect(self.command_finished)
+
+    def probe(self):
+        if self.runner.is_running():
+            return
+        self.help_text = ""
+        self.runner.run(self.btrfs + ["quota", "enable", "--help"], QUERY_TIMEOUT)
+
+    def output_received(self, text):
+        self.help_text += text
+
+    def command_finished(self, exit_code, status):
+        # Older progs exit non-zero for --help but still print the usage
+        self.progs = "--simple" in self.help_text
+        self.kernel = kernel_supports_simple_quota(self.sys_btrfs)
+        self.detected.emit(self.progs, self.kernel)
@@ -0,0 +1,230 @@
+import os
+import time
+from dataclasses import dataclass
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, QUERY_TIMEOUT, describe_finish
+from btrfsparsers_btrfsqt6 import QuotaRescanStatusParser, ChunkRangeParser
+from blockinventory_btrfsqt6 import get_inventory
+from resultcache_btrfsqt6 import filesystem_uuid
+
+# Filesystem (UUID, or path when unknown) -> the QuotaRescanMonitor tracking its rescan
+active_rescans = {}
+
+
+def rescan_key(path):
+    return filesystem_uuid([path]) or os.path.normpath(path)
+
+
+@dataclass(slots=True)
+class RescanProgress:
+    running: bool
+    current_key: int
+    # Share of the logical address range already rescanned, -1 when the range is unknown
+    percent: float
+    bytes_per_second: float
+    eta: float
+
+
+class RescanProgressTracker:
+    """Turn the extent tree key a rescan has reached into a percentage and ETA.
+
+    The rescan walks the extent tree in key order and the keys are logical
+    byte addresses, so its position within the range covered by the chunks
+    is the progress. The range can be set later, once it is known.
+    """
+
+    # Weight of the newest sample in the smoothed rate
+    SMOOTHING = 0.3
+
+    def __init__(self, start=0, end=0):
+        self.start = start
+        self.end = end
+        self.last_time = None
+        self.last_key = None
+        self.rate = 0.0
+
+    def set_range(self, start, end):
+        self.start = start
+        self.end = end
+
+    def update(self, status, now=None):
+        now = time.monotonic() if now is None else now
+        if not status.running:
+            return RescanProgress(False, self.last_key or 0, 100.0, self.rate, 0.0)
+
+        key = status.current_key
+        if self.last_key is not None and now > self.last_time and key >= self.last_key:
+            sample = (key - self.last_key) / (now - self.last_time)
+            self.rate = sample if self.rate == 0 else \
+                self.SMOOTHING * sample + (1 - self.SMOOTHING) * self.rate
+        self.last_time = now
+        self.last_key = key
+
+        percent = -1.0
+        eta = -1.0
+        if self.end > self.start:
+            position = min(max(key - self.start, 0), self.end - self.start)
+            percent = position * 100 / (self.end - self.start)
+            if self.rate > 0:
+                eta = (self.end - self.start - position) / self.rate
+        return RescanProgress(True, key, percent, self.rate, eta)
+
+
+class QuotaRescanMonitor(QObject):
+    """Start `btrfs quota rescan` without waiting for it and follow it with `quota rescan -s`.
+
+    Only one monitor follows a filesystem at a time, and a rescan that is
+    already running in the kernel is followed rather than started again.
+    btrfs offers no way to cancel a rescan, so stop() only stops following.
+    """
+
+    progress = pyqtSignal(object)
+    log = pyqtSignal(str)
+    rescan_finished = pyqtSignal(str, bool)
+
+    POLL_INTERVAL = 2
+
+    def __init__(self, parent=None, btrfs=("sudo", "btrfs"), interval=POLL_INTERVAL):
+        super().__init__(parent)
+        self.btrfs = list(btrfs)
+        self.path = ""
+        self.key = ""
+        self.state = "idle"
+        # Set when the rescan followed was started before start() was called
+        self.joined = False
+        self.tracker = None
+        self.parser = None
+        self.errors = ""
+        self.range_parser = None
+
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.output_received)
+        self.runner.error_received.connect(self.error_received)
+        self.runner.command_finished.connect(self.command_finished)
+
+        # The chunk tree dump that gives the key range runs next to the polling
+        self.range_runner = BtrfsCommandRunner(self)
+        self.range_runner.output_received.connect(self.range_output_received)
+        self.range_runner.command_finished.connect(self.range_finished)
+
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(int(interval * 1000))
+        self.poll_timer.timeout.connect(self.poll)
+
+    def is_active(self):
+        return self.state != "idle"
+
+    def start(self, path):
+        """Start (or join) a rescan of path's filesystem; False if another monitor follows it."""
+        key = rescan_key(path)
+        owner = active_rescans.get(key)
+        if owner is not None and owner is not self:
+            self.log.emit(f"A quota rescan of {path} is already being followed.")
+            return False
+        if self.is_active():
+            if key == self.key:
+                self.log.emit(f"A quota rescan of {path} is already running.")
+                return False
+            self.stop()
+        active_rescans[key] = self
+        self.path = path
+        self.key = key
+        self.tracker = RescanProgressTracker()
+        self.joined = False
+        # Look before starting: the kernel rejects a second rescan anyway, and one
+        # started elsewhere is worth following
+        self.state = "checking"
+        self.run_status()
+        self.read_range()
+        return True
+
+    def stop(self):
+        self.poll_timer.stop()
+        self.runner.cancel()
+        self.range_runner.cancel()
+        self.release()
+
+    def release(self):
+        self.state = "idle"
+        if active_rescans.get(self.key) is self:
+            del active_rescans[self.key]
+
+    def read_range(self):
+        devices = get_inventory().member_devices(self.path)
+        if not devices:
+            return
+        self.range_parser = ChunkRangeParser()
+        self.range_runner.run(self.btrfs + ["inspect-internal", "dump-tree", "-t", "chunk", devices[0].path],
+                              QUERY_TIMEOUT)
+
+    def range_output_received(self, text):
+        self.range_parser.feed_text(text)
+
+    def range_finished(self, exit_code, status):
+        start, end = self.range_parser.finish()
+        if exit_code == 0 and end > start and self.tracker is not None:
+            self.tracker.set_range(start, end)
+
+    def run_status(self):
+        self.parser = QuotaRescanStatusParser()
+        self.errors = ""
+        self.runner.run(self.btrfs + ["quota", "rescan", "-s", self.path], QUERY_TIMEOUT)
+
+    def poll(self):
+        if self.state == "polling" and not self.runner.is_running():
+            self.run_status()
+
+    def output_received(self, text):
+        if self.parser is not None:
+            self.parser.feed_text(text)
+
+    def error_received(self, text):
+        self.errors += text
+
+    def command_finished(self, exit_code, status):
+        if self.state == "idle":
+            return
+        message = self.errors.strip() or describe_finish(exit_code, status)
+        if self.state == "starting":
+            # Lost a race with a rescan started elsewhere: follow that one
+            if exit_code != 0 and "in progress" not in message:
+                self.fail(f"Quota rescan of {self.path} failed to start: {message}")
+                return
+            self.joined = exit_code != 0
+            self.log.emit(f"Quota rescan of {self.path} started.")
+            self.follow()
+            return
+
+        rescan = self.parser.finish()
+        self.parser = None
+        if exit_code != 0:
+            self.fail(f"Cannot read the quota rescan status of {self.path}: {message}")
+            return
+        if self.state == "checking":
+            if rescan.running:
+                self.log.emit(f"A quota rescan of {self.path} is already running; following it.")
+                self.joined = True
+                self.follow()
+            else:
+                self.state = "starting"
+                self.errors = ""
+                self.runner.run(self.btrfs + ["quota", "rescan", self.path], QUERY_TIMEOUT)
+            return
+
+        self.progress.emit(self.tracker.update(rescan))
+        if not rescan.running:
+            path = self.path
+            self.stop()
+            self.log.emit(f"Quota rescan of {path} finished.")
+            self.rescan_finished.emit(path, True)
+
+    def follow(self):
+        self.state = "polling"
+        self.poll_timer.start()
+        self.poll()
+
+    def fail(self, message):
+        path = self.path
+        self.stop()
+        self.log.emit(message)
+        self.rescan_finished.emit(path, False)
@@ -1,14 +1,26 @@
 import sys
-import subprocess
-from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QTextEdit, QComboBox
+from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QComboBox
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, describe_finish
+from outputconsole_btrfsqt6 import BtrfsOutputConsole
+from blockinventory_btrfsqt6 import get_inventory
 
 class BtrfsRescueGUI(QWidget):
+    # Emitted when the user asks to return to the main menu
+    back_requested = pyqtSignal()
+
     def __init__(self):
         super().__init__()
 
         self.setWindowTitle("Btrfs Rescue Operations")
         self.setGeometry(200, 200, 600, 500)
 
+        # Asynchronous command runner
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.append_output)
+        self.runner.error_received.connect(self.append_output)
+        self.runner.command_finished.connect(self.command_finished)
+
         self.initUI()
 
     def initUI(self):
@@ -26,7 +38,9 @@ class BtrfsRescueGUI(QWidget):
 
         
         self.device_combo = QComboBox(self)
+        self.device_combo.setEditable(True)
         self.device_combo.addItems(self.get_devices())
+        get_inventory().changed.connect(self.refresh_devices)
         main_layout.addWidget(self.device_combo)
 
         
@@ -67,9 +81,12 @@ class BtrfsRescueGUI(QWidget):
         self.clear_uuid_tree_button.clicked.connect(lambda: self.run_rescue_operation("clear-uuid-tree"))
         main_layout.addWidget(self.clear_uuid_tree_button)
 
+        self.cancel_button = QPushButton("Cancel Operation", self)
+        self.cancel_button.clicked.connect(self.runner.cancel)
+        main_layout.addWidget(self.cancel_button)
+
         # Çıktı Alanı
-        self.output_display = QTextEdit(self)
-        self.output_display.setReadOnly(True)
+        self.output_display = BtrfsOutputConsole(self)
         main_layout.addWidget(self.output_display)
 
         self.setLayout(main_layout)
@@ -77,12 +94,8 @@ class BtrfsRescueGUI(QWidget):
         # CSS stillerini uygula
         self.apply_styles()
     def execute_back_command(self):
-        try:
-            # Running the main-btrfsqt6.elf64 executable
-            result = subprocess.run(["./main-btrfsqt6.elf64"], check=True, text=True, capture_output=True)
-            self.output_label.setText(f"Back command executed successfully: {result.stdout}")
-        except subprocess.CalledProcessError as e:
-            self.output_label.setText(f"Error executing back command: {e.stderr}")
+        """Return to the main menu."""
+        self.back_requested.emit()
 
     def apply_styles(self):
         """CSS stillerini uygulama."""
@@ -117,7 +130,7 @@ class BtrfsRescueGUI(QWidget):
                 background-color: #2E353F;
             }
 
-            QTextEdit {
+            QTextEdit, QPlainTextEdit {
                 background-color: #444A53;
                 color: white;
                 font-family: Consolas, monospace;
@@ -128,22 +141,20 @@ class BtrfsRescueGUI(QWidget):
                 margin-top: 10px;
             }
 
-            QTextEdit:focus {
+            QTextEdit:focus, QPlainTextEdit:focus {
                 border-color: #4A90E2;
             }
         """)
 
     def get_devices(self):
-        """`lsblk` komutunu çalıştırarak mevcut cihazları al."""
-        try:
-            result = subprocess.run(['lsblk', '-d', '-o', 'NAME'], capture_output=True, text=True)
-            devices = result.stdout.splitlines()
-            # İlk satır başlık olduğu için onu atlıyoruz
-            devices = devices[1:]
-            return [f"/dev/{device.strip()}" for device in devices]
-        except Exception as e:
-            self.output_display.setPlainText(f"Error retrieving devices: {e}")
-            return []
+        """Btrfs aygıtlarını paylaşılan envanterden al."""
+        return [device.path for device in get_inventory().btrfs_devices()]
+
+    def refresh_devices(self):
+        current = self.device_combo.currentText()
+        self.device_combo.clear()
+        self.device_combo.addItems(self.get_devices())
+        self.device_combo.setCurrentText(current)
 
     def run_rescue_operation(self, operation):
         """Btrfs rescue komutlarını çalıştır ve sonucu göster."""
@@ -152,39 +163,35 @@ class BtrfsRescueGUI(QWidget):
             self.output_display.setPlainText("Please select a device.")
             return
 
-        try:
-            if operation == "chunk-recover":
-                result = subprocess.run(['sudo', 'btrfs', 'rescue', 'chunk-recover', device], capture_output=True, text=True)
-            elif operation == "super-recover":
-                result = subprocess.run(['sudo', 'btrfs', 'rescue', 'super-recover', device], capture_output=True, text=True)
-            elif operation == "zero-log":
-                result = subprocess.run(['sudo', 'btrfs', 'rescue', 'zero-log', device], capture_output=True, text=True)
-            elif operation == "fix-device-size":
-                result = subprocess.run(['sudo', 'btrfs', 'rescue', 'fix-device-size', device], capture_output=True, text=True)
-            elif operation == "create-control-device":
-                result = subprocess.run(['sudo', 'btrfs', 'rescue', 'create-control-device'], capture_output=True, text=True)
-            elif operation == "clear-ino-cache":
-                result = subprocess.run(['sudo', 'btrfs', 'rescue', 'clear-ino-cache', device], capture_output=True, text=True)
-            elif operation == "clear-space-cache":
-                result = subprocess.run(['sudo', 'btrfs', 'rescue', 'clear-space-cache', device], capture_output=True, text=True)
-            elif operation == "clear-uuid-tree":
-                result = subprocess.run(['sudo', 'btrfs', 'rescue', 'clear-uuid-tree'], capture_output=True, text=True)
-            else:
-                self.output_display.setPlainText("Invalid Operation")
-                return
-
-            # Çıktıyı göster
-            if result.returncode == 0:
-                self.output_display.setPlainText(result.stdout)
-            else:
-                self.output_display.setPlainText(f"Error: {result.stderr}")
-
-        except Exception as e:
-            self.output_display.setPlainText(f"Error executing command: {e}")
+        if self.runner.is_running():
+            self.output_display.append_line("An operation is already running. Cancel it first.")
+            return
+
+        if operation in ("create-control-device", "clear-uuid-tree"):
+            command = ['sudo', 'btrfs', 'rescue', operation]
+        elif operation in ("chunk-recover", "super-recover", "zero-log", "fix-device-size",
+                           "clear-ino-cache", "clear-space-cache"):
+            command = ['sudo', 'btrfs', 'rescue', operation, device]
+        else:
+            self.output_display.setPlainText("Invalid Operation")
+            return
+
+        self.output_display.clear()
+        self.runner.run(command)
+
+    def append_output(self, text):
+        self.output_display.append_text(text)
+
+    def command_finished(self, exit_code, status):
+        self.output_display.finish()
+        message = describe_finish(exit_code, status)
+        if message:
+            self.output_display.append_line(message)
 
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = BtrfsRescueGUI()
+    window.back_requested.connect(window.close)
     window.show()
     sys.exit(app.exec())
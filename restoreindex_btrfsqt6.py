@@ -0,0 +1,527 @@
+import os
+import time
+import sqlite3
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from PyQt6.QtCore import Qt, QObject, QTimer, QAbstractItemModel, QModelIndex, pyqtSignal
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, describe_finish
+from btrfsparsers_btrfsqt6 import RestoreLogParser, RootCandidate
+from blockinventory_btrfsqt6 import get_inventory
+from restorejob_btrfsqt6 import relative_path, compile_selection_regex
+
+INDEX_FILE = "restore-index.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS indexes (
+    id INTEGER PRIMARY KEY,
+    identity TEXT NOT NULL,
+    root TEXT NOT NULL,
+    device TEXT NOT NULL,
+    created REAL NOT NULL,
+    files INTEGER NOT NULL DEFAULT 0,
+    directories INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (identity, root)
+);
+CREATE TABLE IF NOT EXISTS entries (
+    index_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    parent INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    directory INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (index_id, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_by_parent ON entries (index_id, parent, name);
+CREATE TABLE IF NOT EXISTS root_candidates (
+    identity TEXT NOT NULL,
+    bytenr INTEGER NOT NULL,
+    generation INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    current INTEGER NOT NULL DEFAULT 0,
+    files INTEGER NOT NULL DEFAULT -1,
+    capped INTEGER NOT NULL DEFAULT 0,
+    error TEXT NOT NULL DEFAULT '',
+    probed REAL NOT NULL,
+    PRIMARY KEY (identity, bytenr)
+) WITHOUT ROWID;
+"""
+
+
+def cache_directory():
+    """$XDG_CACHE_HOME/btrfs-progs-gui, ~/.cache/btrfs-progs-gui by default."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "btrfs-progs-gui")
+
+
+def device_identity(device):
+    """Filesystem UUID of a device from the inventory, so indexes survive renamed device nodes."""
+    real = os.path.realpath(device)
+    for block_device in get_inventory().block_devices():
+        if block_device.uuid and os.path.realpath(block_device.path) == real:
+            return block_device.uuid
+    return real
+
+
+@dataclass(slots=True)
+class RestoreIndexInfo:
+    id: int
+    identity: str
+    # Tree root bytenr passed with -t, "" for the default root
+    root: str
+    device: str
+    created: float
+    files: int
+    directories: int
+
+
+class RestoreIndexStore:
+    """Files listed by `btrfs restore -D -v`, kept in SQLite per device and tree root.
+
+    Entries are stored as (id, parent, name), a prefix tree that shares
+    every directory path, and one index per (device, root) is kept. A
+    dry run cannot tell an empty directory from a file, so only paths
+    with something listed below them are marked as directories. The
+    ranked tree root candidates of the last root search on each device
+    are kept alongside.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            os.makedirs(cache_directory(), exist_ok=True)
+            path = os.path.join(cache_directory(), INDEX_FILE)
+        self.path = path
+        # Transactions are managed explicitly by RestoreIndexWriter
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def lookup(self, identity, root):
+        row = self.connection.execute(
+            "SELECT id, identity, root, device, created, files, directories FROM indexes "
+            "WHERE identity = ? AND root = ?", (identity, root)).fetchone()
+        return RestoreIndexInfo(*row) if row else None
+
+    def indexes(self):
+        rows = self.connection.execute(
+            "SELECT id, identity, root, device, created, files, directories FROM indexes ORDER BY created DESC")
+        return [RestoreIndexInfo(*row) for row in rows]
+
+    def delete(self, index_id):
+        self.connection.execute("BEGIN")
+        self.connection.execute("DELETE FROM entries WHERE index_id = ?", (index_id,))
+        self.connection.execute("DELETE FROM indexes WHERE id = ?", (index_id,))
+        self.connection.execute("COMMIT")
+
+    def children(self, index_id, parent, offset=0, limit=-1):
+        """(id, name, directory) of the entries in a directory, by name; parent 0 is the root."""
+        return self.connection.execute(
+            "SELECT id, name, directory FROM entries WHERE index_id = ? AND parent = ? "
+            "ORDER BY name LIMIT ? OFFSET ?", (index_id, parent, limit, offset)).fetchall()
+
+    def search(self, index_id, text, limit=1000):
+        """(id, name, directory) of the entries whose name contains text (case-insensitive for ASCII)."""
+        pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return self.connection.execute(
+            "SELECT id, name, directory FROM entries WHERE index_id = ? AND name LIKE ? ESCAPE '\\' "
+            "LIMIT ?", (index_id, pattern, limit)).fetchall()
+
+    def path_of(self, index_id, entry_id):
+        rows = self.connection.execute(
+            "WITH RECURSIVE chain(id, parent, name, depth) AS ("
+            " SELECT id, parent, name, 0 FROM entries WHERE index_id = ?1 AND id = ?2"
+            " UNION ALL"
+            " SELECT e.id, e.parent, e.name, chain.depth + 1 FROM entries e"
+            " JOIN chain ON e.index_id = ?1 AND e.id = chain.parent)"
+            " SELECT name FROM chain ORDER BY depth DESC", (index_id, entry_id)).fetchall()
+        return "/" + "/".join(name for name, in rows)
+
+    def top_level_counts(self, index_id):
+        """{name: number of entries at and below it} for the root directory of an index."""
+        rows = self.connection.execute(
+            "WITH RECURSIVE below(id, top) AS ("
+            " SELECT id, id FROM entries WHERE index_id = ?1 AND parent = 0"
+            " UNION ALL"
+            " SELECT e.id, below.top FROM entries e JOIN below ON e.index_id = ?1 AND e.parent = below.id)"
+            " SELECT entries.name, count(*) FROM below JOIN entries ON entries.index_id = ?1 AND entries.id = below.top"
+            " GROUP BY below.top", (index_id,)).fetchall()
+        return dict(rows)
+
+    def root_candidates(self, identity):
+        """(RootCandidate list, time probed) of the last root search on a device, best first."""
+        rows = self.connection.execute(
+            "SELECT bytenr, generation, level, current, files, capped, error, probed FROM root_candidates "
+            "WHERE identity = ? ORDER BY files DESC, generation DESC", (identity,)).fetchall()
+        candidates = [RootCandidate(bytenr, generation, level, bool(current), files, bool(capped), error)
+                      for bytenr, generation, level, current, files, capped, error, _ in rows]
+        return candidates, max((row[-1] for row in rows), default=None)
+
+    def save_root_candidates(self, identity, candidates):
+        """Replace the root candidates kept for a device."""
+        probed = time.time()
+        self.connection.execute("BEGIN")
+        self.connection.execute("DELETE FROM root_candidates WHERE identity = ?", (identity,))
+        self.connection.executemany(
+            "INSERT INTO root_candidates VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(identity, candidate.bytenr, candidate.generation, candidate.level, int(candidate.current),
+              candidate.files, int(candidate.capped), candidate.error, probed) for candidate in candidates])
+        self.connection.execute("COMMIT")
+
+    def writer(self, identity, root, device):
+        return RestoreIndexWriter(self, identity, root, device)
+
+
+class RestoreIndexWriter:
+    """Replace the index of (identity, root) with paths streamed from a dry run.
+
+    Everything happens in one transaction on a connection of its own, so
+    the previous index stays readable while the new one is built and
+    survives an aborted run. restore lists paths depth first, so only
+    the directories on the current path are remembered to find parents.
+    """
+
+    BATCH = 5000
+
+    def __init__(self, store, identity, root, device):
+        self.store = store
+        self.identity = identity
+        self.root = root
+        self.connection = sqlite3.connect(store.path, isolation_level=None)
+        self.connection.execute("BEGIN IMMEDIATE")
+        old = store.lookup(identity, root)
+        if old is not None:
+            self.connection.execute("DELETE FROM entries WHERE index_id = ?", (old.id,))
+            self.connection.execute("DELETE FROM indexes WHERE id = ?", (old.id,))
+        cursor = self.connection.execute(
+            "INSERT INTO indexes (identity, root, device, created) VALUES (?, ?, ?, ?)",
+            (identity, root, device, time.time()))
+        self.index_id = cursor.lastrowid
+        # (name, id) of the directories on the path of the last entry
+        self.stack = []
+        self.next_id = 1
+        self.rows = []
+        self.directories = set()
+        self.count = 0
+
+    def add(self, path):
+        components = [component for component in path.split("/") if component]
+        if not components:
+            return
+        common = 0
+        for (name, _), component in zip(self.stack, components):
+            if name != component:
+                break
+            common += 1
+        if common == len(components):
+            # Listed again
+            return
+        del self.stack[common:]
+        for component in components[common:]:
+            parent = self.stack[-1][1] if self.stack else 0
+            if parent:
+                self.directories.add(parent)
+            self.rows.append((self.index_id, self.next_id, parent, component))
+            self.stack.append((component, self.next_id))
+            self.next_id += 1
+            self.count += 1
+        if len(self.rows) >= self.BATCH:
+            self.flush()
+
+    def flush(self):
+        self.connection.executemany(
+            "INSERT INTO entries (index_id, id, parent, name) VALUES (?, ?, ?, ?)", self.rows)
+        self.rows = []
+
+    def commit(self):
+        self.flush()
+        self.connection.executemany(
+            "UPDATE entries SET directory = 1 WHERE index_id = ? AND id = ?",
+            ((self.index_id, entry_id) for entry_id in self.directories))
+        self.connection.execute(
+            "UPDATE indexes SET files = ?, directories = ? WHERE id = ?",
+            (self.count - len(self.directories), len(self.directories), self.index_id))
+        self.connection.execute("COMMIT")
+        self.connection.close()
+        return self.store.lookup(self.identity, self.root)
+
+    def abort(self):
+        self.rows = []
+        self.connection.execute("ROLLBACK")
+        self.connection.close()
+
+
+class RestoreIndexBuilder(QObject):
+    """Run `btrfs restore -D -o -v` once and stream the listed paths into a RestoreIndexStore."""
+
+    progress = pyqtSignal(int)
+    # The new RestoreIndexInfo, or None, and a message
+    finished = pyqtSignal(object, str)
+
+    PROGRESS_INTERVAL = 1
+
+    def __init__(self, store, parent=None, btrfs=("btrfs",)):
+        super().__init__(parent)
+        self.store = store
+        self.btrfs = list(btrfs)
+        self.target = ""
+        self.parser = None
+        self.writer = None
+        self.errors = ""
+
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.output_received)
+        self.runner.error_received.connect(self.error_received)
+        self.runner.command_finished.connect(self.command_finished)
+
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setInterval(self.PROGRESS_INTERVAL * 1000)
+        self.progress_timer.timeout.connect(self.report)
+
+    def is_active(self):
+        return self.writer is not None
+
+    def start(self, device, target, root=""):
+        """List device (at tree root bytenr root, if given); target only prefixes the printed paths."""
+        if self.is_active():
+            return False
+        self.target = os.path.normpath(target)
+        self.parser = RestoreLogParser()
+        self.errors = ""
+        self.writer = self.store.writer(device_identity(device), root, device)
+        # restore still looks at the target in a dry run and skips files found
+        # there; -o lists them too, and nothing is written with -D
+        command = self.btrfs + ["restore", "-D", "-o", "-v"]
+        if root:
+            command += ["-t", root]
+        self.progress_timer.start()
+        return self.runner.run(command + [device, self.target])
+
+    def cancel(self):
+        self.runner.cancel()
+
+    def output_received(self, text):
+        self.parser.feed_text(text)
+        self.add_entries(self.parser.take())
+
+    def add_entries(self, entries):
+        for entry in entries:
+            if entry.kind == "restored":
+                self.writer.add(relative_path(entry.path, self.target))
+
+    def error_received(self, text):
+        self.errors += text
+
+    def report(self):
+        self.progress.emit(self.writer.count)
+
+    def command_finished(self, exit_code, status):
+        self.progress_timer.stop()
+        self.add_entries(self.parser.finish())
+        writer = self.writer
+        self.writer = None
+        if exit_code != 0:
+            writer.abort()
+            message = describe_finish(exit_code, status)
+            if status == "exited" and self.errors.strip():
+                message = self.errors.strip().splitlines()[-1]
+            self.finished.emit(None, message)
+            return
+        info = writer.commit()
+        self.finished.emit(info, f"Indexed {info.files} files in {info.directories} directories.")
+
+
+class IndexNode:
+    """One indexed path; children are read from the store as views ask for them."""
+
+    __slots__ = ("id", "label", "path", "directory", "parent", "children", "complete", "row")
+
+    def __init__(self, entry_id, label, path, directory, parent=None, row=0):
+        self.id = entry_id
+        self.label = label
+        self.path = path
+        self.directory = directory
+        self.parent = parent
+        self.children = []
+        # All children read from the store
+        self.complete = not directory
+        self.row = row
+
+
+class RestoreIndexModel(QAbstractItemModel):
+    """Checkable tree of a restore index, read from SQLite FETCH_BATCH rows at a time.
+
+    Check states are kept as rules {path: checked} rather than per row, so
+    a checked directory covers children that were never loaded, and a
+    search hit and its place in the tree always agree. selection_regex()
+    turns the rules into a --path-regex for restore.
+    """
+
+    FETCH_BATCH = 1000
+    SEARCH_LIMIT = 1000
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.index_id = None
+        self.root = IndexNode(0, "", "", True)
+        self.searching = False
+        self.rules = {}
+        self.rule_paths = []
+
+    def set_index(self, index_id):
+        self.beginResetModel()
+        self.index_id = index_id
+        self.root = IndexNode(0, "", "", index_id is not None)
+        self.searching = False
+        self.rules = {}
+        self.rule_paths = []
+        self.endResetModel()
+
+    def set_search(self, text):
+        """Show the entries whose name contains text as a flat list; "" restores the tree."""
+        self.beginResetModel()
+        self.root = IndexNode(0, "", "", self.index_id is not None)
+        self.searching = bool(text) and self.index_id is not None
+        if self.searching:
+            self.root.complete = True
+            for row, (entry_id, name, directory) in enumerate(
+                    self.store.search(self.index_id, text, self.SEARCH_LIMIT)):
+                path = self.store.path_of(self.index_id, entry_id)
+                self.root.children.append(IndexNode(entry_id, path, path, bool(directory), self.root, row))
+        self.endResetModel()
+        return len(self.root.children)
+
+    def node(self, index):
+        return index.internalPointer() if index.isValid() else self.root
+
+    # Check rules
+
+    def checked(self, path):
+        """Effective state: the rule of path or of its nearest ancestor with one."""
+        while True:
+            rule = self.rules.get(path)
+            if rule is not None:
+                return rule
+            if not path:
+                return False
+            path = path.rsplit("/", 1)[0]
+
+    def rules_below(self, path):
+        start = bisect_left(self.rule_paths, path + "/")
+        # "0" sorts right after "/"
+        end = bisect_left(self.rule_paths, path + "0", start)
+        return self.rule_paths[start:end]
+
+    def check_state(self, path):
+        checked = self.checked(path)
+        if any(self.rules[below] != checked for below in self.rules_below(path)):
+            return Qt.CheckState.PartiallyChecked
+        return Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked
+
+    def set_checked(self, path, checked):
+        for below in self.rules_below(path):
+            del self.rules[below]
+        self.rules.pop(path, None)
+        self.rule_paths = sorted(self.rules)
+        parent = path.rsplit("/", 1)[0] if path else None
+        if parent is None or self.checked(parent) != checked:
+            self.rules[path] = checked
+            insort(self.rule_paths, path)
+        self.emit_check_changes(self.root)
+
+    def emit_check_changes(self, node):
+        """A rule can change any visible row, through ancestors, descendants or search hits."""
+        if node.children:
+            parent = self.createIndex(node.row, 0, node) if node is not self.root else QModelIndex()
+            self.dataChanged.emit(self.index(0, 0, parent), self.index(len(node.children) - 1, 0, parent),
+                                  [Qt.ItemDataRole.CheckStateRole])
+            for child in node.children:
+                self.emit_check_changes(child)
+
+    def has_selection(self):
+        return any(self.rules.values())
+
+    def selection_rules(self):
+        """The check rules with the root as "/", as compile_selection_regex takes them."""
+        return {path or "/": checked for path, checked in self.rules.items()}
+
+    def selection_regex(self):
+        """--path-regex for the checked paths; ValueError when nothing is checked or it is too long."""
+        return compile_selection_regex(self.selection_rules())
+
+    # QAbstractItemModel
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self.node(parent)
+        if row < 0 or row >= len(node.children) or column != 0:
+            return QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        node = index.internalPointer()
+        if node.parent is None or node.parent is self.root:
+            return QModelIndex()
+        return self.createIndex(node.parent.row, 0, node.parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self.node(parent).children)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self.node(parent)
+        return bool(node.children) or not node.complete
+
+    def canFetchMore(self, parent):
+        return not self.node(parent).complete
+
+    def fetchMore(self, parent):
+        node = self.node(parent)
+        if node.complete or self.index_id is None:
+            return
+        rows = self.store.children(self.index_id, node.id, len(node.children), self.FETCH_BATCH)
+        if len(rows) < self.FETCH_BATCH:
+            node.complete = True
+        if not rows:
+            return
+        first = len(node.children)
+        self.beginInsertRows(parent, first, first + len(rows) - 1)
+        for row, (entry_id, name, directory) in enumerate(rows, first):
+            node.children.append(IndexNode(entry_id, name, node.path + "/" + name, bool(directory), node, row))
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return node.label
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return node.path
+        if role == Qt.ItemDataRole.CheckStateRole:
+            return self.check_state(node.path)
+        return None
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.CheckStateRole:
+            return False
+        state = Qt.CheckState(value) if isinstance(value, int) else value
+        self.set_checked(index.internalPointer().path, state != Qt.CheckState.Unchecked)
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsUserCheckable
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return "Path"
+        return None
@@ -0,0 +1,641 @@
+import os
+import stat
+import time
+import heapq
+import fnmatch
+from dataclasses import dataclass, field
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from commandrunner_btrfsqt6 import BtrfsCommandRunner
+from btrfsparsers_btrfsqt6 import RestoreLogParser
+from blockinventory_btrfsqt6 import get_inventory
+
+# Characters with a meaning in POSIX extended regular expressions
+ERE_SPECIAL = set(".[]()*+?{}|^$\\")
+GLOB_SPECIAL = set("*?[")
+# The kernel refuses a single argument longer than 128 KiB (MAX_ARG_STRLEN)
+PATH_REGEX_LIMIT = 128 * 1024 - 1
+
+
+def ere_escape(text):
+    return "".join("\\" + char if char in ERE_SPECIAL else char for char in text)
+
+
+def ere_bracket_excluding(chars):
+    """A bracket expression matching one character that is neither "/" nor in chars.
+
+    Backslashes are literal inside POSIX brackets; "]" must come first and
+    "^" and "-" last to be taken literally.
+    """
+    chars = set(chars) - {"/"}
+    middle = "".join(sorted(chars - {"]", "^", "-"}))
+    return ("[^" + ("]" if "]" in chars else "") + "/" + middle
+            + ("^" if "^" in chars else "") + ("-" if "-" in chars else "") + "]")
+
+
+def glob_to_ere(component):
+    """Translate one path component glob (*, ?, [...]) into a POSIX ERE."""
+    regex = ""
+    index = 0
+    while index < len(component):
+        char = component[index]
+        index += 1
+        if char == "*":
+            if not regex.endswith("[^/]*"):
+                regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[":
+            end = index
+            if end < len(component) and component[end] in "!^":
+                end += 1
+            if end < len(component) and component[end] == "]":
+                end += 1
+            end = component.find("]", end)
+            if end < 0:
+                regex += "\\["
+                continue
+            body = component[index:end]
+            if body[:1] in ("!", "^"):
+                body = "^" + body[1:]
+            regex += "[" + body + "]"
+            index = end + 1
+        else:
+            regex += ere_escape(char)
+    return regex
+
+
+def has_wildcard(component):
+    return any(char in GLOB_SPECIAL for char in component)
+
+
+def split_pattern(pattern):
+    """Components of a pattern relative to the root being restored."""
+    components = []
+    for component in pattern.strip().split("/"):
+        if component in ("", "."):
+            continue
+        if component == "..":
+            raise ValueError(f"{pattern}: \"..\" is not allowed")
+        components.append(component)
+    if "**" in components[:-1]:
+        raise ValueError(f"{pattern}: \"**\" is only allowed at the end")
+    return components
+
+
+@dataclass
+class PatternNode:
+    children: dict = field(default_factory=dict)
+    # Include tree: everything below is included. Exclude trie: everything below is excluded
+    full: bool = False
+    # Exclude trie below a full include node
+    excluded: object = None
+
+
+def add_include(root, components):
+    node = root
+    for component in components:
+        if node.full:
+            return
+        if component == "**":
+            break
+        node = node.children.setdefault(component, PatternNode())
+    node.full = True
+    node.children.clear()
+
+
+def add_exclusion(node, components):
+    """Record components as excluded below the full include node."""
+    if node.excluded is None:
+        node.excluded = PatternNode()
+    trie = node.excluded
+    for component in components:
+        if trie.full:
+            return
+        trie = trie.children.setdefault(component, PatternNode())
+    trie.full = True
+    trie.children.clear()
+
+
+def add_exclude(root, pattern, components):
+    node = root
+    parent = None
+    for position, component in enumerate(components):
+        if node.full:
+            add_exclusion(node, components[position:])
+            return
+        child = node.children.get(component)
+        if child is None:
+            for glob in node.children:
+                if has_wildcard(glob) and fnmatch.fnmatchcase(component, glob):
+                    raise ValueError(f"exclude {pattern} lies under the wildcard include component "
+                                     f"\"{glob}\"; include that directory by name instead")
+            # Outside every include: nothing to exclude
+            return
+        parent = node
+        node = child
+    if parent is None:
+        raise ValueError(f"exclude {pattern} leaves nothing to restore")
+    del parent.children[components[-1]]
+
+
+def prune(node):
+    """Drop include branches left empty by excludes; False if node itself is empty."""
+    for name in list(node.children):
+        if not prune(node.children[name]):
+            del node.children[name]
+    return node.full or bool(node.children)
+
+
+def complement_regex(names):
+    """ERE for any non-empty path component that is not one of names.
+
+    The names go into a character trie; at each trie node the regex allows
+    stopping (unless that prefix is an excluded name), continuing with a
+    character no name continues with, or descending into the trie.
+    """
+    trie = {}
+    for name in names:
+        node = trie
+        for char in name:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def branch(node, empty_prefix):
+        chars = sorted(char for char in node if char)
+        alternatives = [ere_bracket_excluding(chars) + "[^/]*"]
+        alternatives += [ere_escape(char) + branch(node[char], False) for char in chars]
+        if not empty_prefix and "" not in node:
+            alternatives.insert(0, "")
+        return "(" + "|".join(alternatives) + ")"
+
+    return branch(trie, True)
+
+
+def exclusion_regex(trie):
+    """ERE for what may follow a fully included directory, minus the exclusion trie."""
+    alternatives = [complement_regex(trie.children) + "(|/.*)"]
+    for name, child in sorted(trie.children.items()):
+        if not child.full:
+            alternatives.append(ere_escape(name) + "(|/" + exclusion_regex(child) + ")")
+    return "(" + "|".join(alternatives) + ")"
+
+
+def follow_regex(node):
+    """ERE for the node's own path (empty) and everything restore may visit below it."""
+    if node.full:
+        if node.excluded is None or not node.excluded.children:
+            return "(|/.*)"
+        return "(|/" + exclusion_regex(node.excluded) + ")"
+    alternatives = [(ere_escape(name) if not has_wildcard(name) else glob_to_ere(name)) + follow_regex(child)
+                    for name, child in sorted(node.children.items())]
+    return "(|/(" + "|".join(alternatives) + "))"
+
+
+def compile_path_regex(includes=(), excludes=()):
+    """Turn include/exclude globs into a `btrfs restore --path-regex` expression.
+
+    Patterns are paths from the root being restored, e.g. /home/user or
+    /etc/*.conf; a trailing /** is the same as naming the directory.
+    restore matches the expression against every directory on the way
+    down and skips a directory that does not match, so each include also
+    lets its parent directories through. Excludes must be literal paths;
+    one below a wildcard include component cannot be expressed and raises
+    ValueError, as does an invalid pattern.
+
+    Returns "" when everything is restored.
+    """
+    includes = [pattern for pattern in includes if pattern.strip()]
+    excludes = [pattern for pattern in excludes if pattern.strip()]
+    root = PatternNode()
+    for pattern in includes or ["/"]:
+        add_include(root, split_pattern(pattern))
+    for pattern in excludes:
+        components = split_pattern(pattern)
+        if any(has_wildcard(component) for component in components):
+            raise ValueError(f"exclude {pattern} must be a literal path without wildcards")
+        add_exclude(root, pattern, components)
+    if not prune(root):
+        raise ValueError("the excludes leave nothing to restore")
+    if root.full and root.excluded is None:
+        return ""
+    return checked_regex("^" + follow_regex(root) + "$")
+
+
+def checked_regex(regex):
+    if len(regex) > PATH_REGEX_LIMIT:
+        raise ValueError(f"the path expression is {len(regex)} characters long, more than a command "
+                         f"argument can hold; select whole directories instead")
+    return regex
+
+
+def selection_regex(children, checked):
+    """ERE for what restore may visit below a directory in the given check state.
+
+    children maps names to (rule, grandchildren) for the paths below the
+    directory that carry a check rule of their own or have one below them.
+    """
+    if checked and not children:
+        return "/.*"
+    alternatives = []
+    if checked:
+        alternatives.append(complement_regex(children) + "(|/.*)")
+    for name, (rule, grandchildren) in sorted(children.items()):
+        state = checked if rule is None else rule
+        below = selection_regex(grandchildren, state)
+        # An unchecked directory still has to match when something below it is checked
+        if state or below:
+            alternatives.append(ere_escape(name) + ("(|" + below + ")" if below else ""))
+    return "/(" + "|".join(alternatives) + ")" if alternatives else ""
+
+
+def compile_selection_regex(rules):
+    """Turn check rules {path: checked} from a file tree into a --path-regex expression.
+
+    A path is checked as its nearest ruled ancestor (or itself) says, and
+    unchecked without one; names are taken literally. Returns "" when
+    everything is checked and raises ValueError when nothing is.
+    """
+    tree = {}
+    for path, checked in rules.items():
+        components = [component for component in path.split("/") if component]
+        if not components:
+            continue
+        children = tree
+        for component in components[:-1]:
+            children = children.setdefault(component, [None, {}])[1]
+        children.setdefault(components[-1], [None, {}])[0] = checked
+    root_checked = bool(rules.get("/", rules.get("", False)))
+    if root_checked and not tree:
+        return ""
+    below = selection_regex(tree, root_checked)
+    if not below:
+        raise ValueError("nothing is selected")
+    return checked_regex("^(|" + below + ")$")
+
+
+def rule_state(rules, path):
+    """Check state of path under rules {path: checked}: its own rule or its nearest ancestor's."""
+    while path:
+        rule = rules.get(path)
+        if rule is not None:
+            return rule
+        path = path.rsplit("/", 1)[0]
+    return bool(rules.get("/", rules.get("", False)))
+
+
+def balance_groups(weights, count):
+    """Split {name: weight} into at most count groups of similar total weight.
+
+    Longest processing time first: the heaviest name goes to the lightest
+    group, which is within 4/3 of the best split and needs no search.
+    """
+    groups = [(0, index, []) for index in range(max(count, 1))]
+    for name, weight in sorted(weights.items(), key=lambda item: (-item[1], item[0])):
+        load, index, names = heapq.heappop(groups)
+        names.append(name)
+        heapq.heappush(groups, (load + weight, index, names))
+    return [names for _, _, names in sorted(groups, key=lambda group: group[1]) if names]
+
+
+def plan_shards(top_level, rules, count):
+    """--path-regex expressions for up to count restores that together cover rules.
+
+    top_level maps the names in the root directory to a weight, e.g. the
+    number of indexed entries below them. Names that are neither checked
+    nor have anything checked below them are left out. Whatever rules
+    select outside these names, such as top-level entries an outdated
+    index does not know, goes to the lightest shard, so splitting never
+    narrows what is restored.
+    """
+    known = ["/" + name for name in top_level]
+    weights = {}
+    for name, weight in top_level.items():
+        path = "/" + name
+        if rule_state(rules, path) or any(below.startswith(path + "/") and checked
+                                         for below, checked in rules.items()):
+            weights[name] = max(weight, 1)
+    remainder = {path: checked for path, checked in rules.items()
+                 if not any(path == name or path.startswith(name + "/") for name in known)}
+    groups = balance_groups(weights, count)
+    lightest = None
+    if any(remainder.values()):
+        groups = groups or [[]]
+        lightest = min(range(len(groups)), key=lambda index: sum(weights[name] for name in groups[index]))
+    shards = []
+    for index, names in enumerate(groups):
+        shard = {}
+        if index == lightest:
+            shard.update(remainder)
+            shard.update((path, False) for path in known)
+        for name in names:
+            path = "/" + name
+            shard[path] = rule_state(rules, path)
+            shard.update((below, checked) for below, checked in rules.items() if below.startswith(path + "/"))
+        shards.append(compile_selection_regex(shard))
+    return shards
+
+
+def source_concurrency(device, requested):
+    """How many restores may read device at once.
+
+    Spinning disks get one: parallel readers only add seeks. Solid state
+    devices serve several queued reads at once, and each restore mostly
+    waits for its own synchronous reads, so they get the requested number.
+    """
+    real = os.path.realpath(device)
+    for block_device in get_inventory().block_devices():
+        if os.path.realpath(block_device.path) == real and block_device.rotational:
+            return 1
+    return max(1, requested)
+
+
+def relative_path(path, target):
+    """A path printed by restore relative to its target directory, e.g. "/home/user"."""
+    if path == target or path.startswith(target + "/"):
+        return path[len(target):] or "/"
+    return path
+
+
+@dataclass(slots=True)
+class RestoreProgress:
+    files: int
+    directories: int
+    symlinks: int
+    skipped: int
+    errors: int
+    # Bytes of the restored files as found in the target directory
+    bytes_restored: int
+    bytes_per_second: float
+    files_per_second: float
+    elapsed: float
+    # Path being restored, relative to the target directory
+    current: str
+
+
+class RestoreProgressTracker:
+    """Count what `btrfs restore -v` has written, measured in the target directory.
+
+    restore names a path before writing it, so each path is looked at
+    (lstat) when the next one is announced; by then it is complete. A dry
+    run writes nothing: a path is then counted as a directory when the
+    next path lies below it. With a JournalStream, started and completed
+    paths are checkpointed as they are seen.
+    """
+
+    # Weight of the newest sample in the smoothed rates
+    SMOOTHING = 0.3
+
+    def __init__(self, target, dry_run=False, journal=None, now=None):
+        self.target = os.path.normpath(target)
+        self.dry_run = dry_run
+        self.journal = journal
+        self.files = 0
+        self.directories = 0
+        self.symlinks = 0
+        self.skipped = 0
+        self.errors = 0
+        self.bytes_restored = 0
+        self.pending = None
+        self.current = ""
+        self.started = time.monotonic() if now is None else now
+        self.last_time = self.started
+        self.last_files = 0
+        self.last_bytes = 0
+        self.byte_rate = 0.0
+        self.file_rate = 0.0
+
+    def add(self, entry):
+        if entry.kind == "restored":
+            self.settle(entry.path)
+            self.pending = entry.path
+            self.current = relative_path(entry.path, self.target)
+            if self.journal is not None:
+                self.journal.started(self.current)
+        elif entry.kind == "skipped":
+            self.skipped += 1
+        elif entry.kind == "symlink":
+            self.symlinks += 1
+        elif entry.kind == "error":
+            self.errors += 1
+            if self.journal is not None:
+                self.journal.error()
+
+    def chunk_done(self):
+        if self.journal is not None:
+            self.journal.chunk_done()
+
+    def settle(self, next_path=None, complete=True):
+        path = self.pending
+        self.pending = None
+        if path is None:
+            return
+        if self.dry_run:
+            if next_path is not None and next_path.startswith(path + "/"):
+                self.directories += 1
+            else:
+                self.files += 1
+            return
+        try:
+            info = os.lstat(path)
+        except OSError:
+            # Not written (yet): restore failed on it, or it is still being written
+            self.files += 1
+            return
+        if stat.S_ISDIR(info.st_mode):
+            self.directories += 1
+        else:
+            self.files += 1
+            self.bytes_restored += info.st_size
+            if self.journal is not None and complete and stat.S_ISREG(info.st_mode):
+                self.journal.completed(relative_path(path, self.target), info.st_size, info.st_mtime_ns)
+
+    def finish(self, success=True):
+        """Count the last path; after a failed or stopped run it may be incomplete."""
+        self.settle(complete=success)
+        if self.journal is not None:
+            self.journal.finish(success)
+
+    def smooth(self, average, sample):
+        return sample if average == 0 else self.SMOOTHING * sample + (1 - self.SMOOTHING) * average
+
+    def sample(self, now=None):
+        now = time.monotonic() if now is None else now
+        elapsed = now - self.last_time
+        if elapsed > 0:
+            self.byte_rate = self.smooth(self.byte_rate, (self.bytes_restored - self.last_bytes) / elapsed)
+            self.file_rate = self.smooth(self.file_rate, (self.files - self.last_files) / elapsed)
+            self.last_time = now
+            self.last_bytes = self.bytes_restored
+            self.last_files = self.files
+        return RestoreProgress(self.files, self.directories, self.symlinks, self.skipped, self.errors,
+                               self.bytes_restored, self.byte_rate, self.file_rate,
+                               now - self.started, self.current)
+
+
+class RestoreJob(QObject):
+    """Run `btrfs restore -v` and follow what it restores.
+
+    The raw output is passed on through output() for display; progress()
+    carries a RestoreProgress every PROGRESS_INTERVAL seconds and once
+    more when the restore ends.
+    """
+
+    output = pyqtSignal(str)
+    progress = pyqtSignal(object)
+    finished = pyqtSignal(int, str)
+
+    PROGRESS_INTERVAL = 1
+
+    def __init__(self, parent=None, btrfs=("btrfs",)):
+        super().__init__(parent)
+        self.btrfs = list(btrfs)
+        self.parser = None
+        self.error_parser = None
+        self.tracker = None
+
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.output_received)
+        self.runner.error_received.connect(self.error_received)
+        self.runner.command_finished.connect(self.command_finished)
+
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setInterval(self.PROGRESS_INTERVAL * 1000)
+        self.progress_timer.timeout.connect(self.report)
+
+    def is_active(self):
+        return self.runner.is_running()
+
+    def start(self, device, target, options=(), path_regex="", dry_run=False, journal=None):
+        """Restore device into target; journal is a RestoreJournal to checkpoint into."""
+        if self.is_active():
+            return False
+        command = self.btrfs + ["restore", "-v"] + list(options)
+        if dry_run:
+            command.append("-D")
+        if path_regex:
+            command += ["--path-regex", path_regex]
+        command += [device, target]
+        # stderr gets its own parser so interleaved chunks never merge lines
+        self.parser = RestoreLogParser()
+        self.error_parser = RestoreLogParser()
+        self.tracker = RestoreProgressTracker(target, dry_run, journal.stream() if journal else None)
+        self.progress_timer.start()
+        return self.runner.run(command)
+
+    def cancel(self):
+        self.runner.cancel()
+
+    def output_received(self, text):
+        self.output.emit(text)
+        self.parser.feed_text(text)
+        for entry in self.parser.take():
+            self.tracker.add(entry)
+        self.tracker.chunk_done()
+
+    def error_received(self, text):
+        self.output.emit(text)
+        self.error_parser.feed_text(text)
+        for entry in self.error_parser.take():
+            self.tracker.add(entry)
+
+    def report(self):
+        self.progress.emit(self.tracker.sample())
+
+    def command_finished(self, exit_code, status):
+        self.progress_timer.stop()
+        for entry in self.parser.finish() + self.error_parser.finish():
+            self.tracker.add(entry)
+        self.tracker.finish(exit_code == 0 and status == "exited")
+        self.report()
+        self.finished.emit(exit_code, status)
+
+
+class ParallelRestoreJob(QObject):
+    """Run several RestoreJobs over the same source, one per --path-regex shard.
+
+    Output lines are prefixed with the worker number; progress() carries
+    the sum of the workers' latest RestoreProgress. finished() comes once
+    every worker has ended, with the first failure, if any.
+    """
+
+    output = pyqtSignal(str)
+    progress = pyqtSignal(object)
+    finished = pyqtSignal(int, str)
+
+    PROGRESS_INTERVAL = 1
+
+    def __init__(self, parent=None, btrfs=("btrfs",)):
+        super().__init__(parent)
+        self.btrfs = list(btrfs)
+        self.workers = []
+        self.latest = {}
+        self.partial = {}
+        self.running = 0
+        self.result = (0, "exited")
+
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setInterval(self.PROGRESS_INTERVAL * 1000)
+        self.progress_timer.timeout.connect(self.report)
+
+    def is_active(self):
+        return self.running > 0
+
+    def start(self, device, target, options, shards, journal=None):
+        if self.is_active() or not shards:
+            return False
+        for worker in self.workers:
+            worker.deleteLater()
+        self.workers = []
+        self.latest = {}
+        self.partial = {}
+        self.result = (0, "exited")
+        for number, path_regex in enumerate(shards, 1):
+            worker = RestoreJob(self, self.btrfs)
+            worker.output.connect(lambda text, number=number: self.worker_output(number, text))
+            worker.progress.connect(lambda progress, number=number: self.latest.__setitem__(number, progress))
+            worker.finished.connect(lambda exit_code, status, number=number:
+                                    self.worker_finished(number, exit_code, status))
+            self.workers.append(worker)
+        self.running = len(self.workers)
+        self.progress_timer.start()
+        for worker, path_regex in zip(self.workers, shards):
+            worker.start(device, target, options, path_regex, journal=journal)
+        return True
+
+    def cancel(self):
+        for worker in self.workers:
+            worker.cancel()
+
+    def worker_output(self, number, text):
+        lines = (self.partial.get(number, "") + text).split("\n")
+        self.partial[number] = lines.pop()
+        if lines:
+            self.output.emit("".join(f"[{number}] {line}\n" for line in lines))
+
+    def report(self):
+        samples = list(self.latest.values())
+        if not samples:
+            return
+        current = next((sample.current for sample in reversed(samples) if sample.current), "")
+        self.progress.emit(RestoreProgress(
+            sum(sample.files for sample in samples),
+            sum(sample.directories for sample in samples),
+            sum(sample.symlinks for sample in samples),
+            sum(sample.skipped for sample in samples),
+            sum(sample.errors for sample in samples),
+            sum(sample.bytes_restored for sample in samples),
+            sum(sample.bytes_per_second for sample in samples),
+            sum(sample.files_per_second for sample in samples),
+            max(sample.elapsed for sample in samples),
+            current))
+
+    def worker_finished(self, number, exit_code, status):
+        if self.partial.get(number):
+            self.output.emit(f"[{number}] {self.partial.pop(number)}\n")
+        if self.result == (0, "exited") and (exit_code != 0 or status != "exited"):
+            self.result = (exit_code, status)
+        self.running -= 1
+        if self.running == 0:
+            self.progress_timer.stop()
+            self.report()
+            self.finished.emit(*self.result)
@@ -0,0 +1,223 @@
+import os
+import json
+import stat
+import hashlib
+from restoreindex_btrfsqt6 import cache_directory
+from restorejob_btrfsqt6 import rule_state
+
+JOURNAL_DIRECTORY = "restore-journals"
+
+
+def journal_path(identity, root, target, scope):
+    """Journal file of one restore job: the source, tree root, target directory and scope."""
+    key = json.dumps([identity, root, os.path.normpath(target), scope])
+    name = hashlib.sha1(key.encode("utf-8", "surrogateescape")).hexdigest() + ".jsonl"
+    return os.path.join(cache_directory(), JOURNAL_DIRECTORY, name)
+
+
+def ancestors(path):
+    """"/a/b/c" -> ["/a", "/a/b"]."""
+    parts = path.split("/")[1:-1]
+    return ["/" + "/".join(parts[:count]) for count in range(1, len(parts) + 1)]
+
+
+def outermost(paths):
+    """Drop every path that lies below another one in paths."""
+    kept = []
+    for path in sorted(paths):
+        if not kept or not path.startswith(kept[-1] + "/"):
+            kept.append(path)
+    return kept
+
+
+class RestoreJournal:
+    """Checkpoint journal of a restore job, one JSON array per line.
+
+    ["S", path] is written when restore starts a path, ["F", path, size,
+    mtime_ns] once a file is complete and ["D", path] once everything
+    below a directory is. Paths are relative to the target directory.
+    Lines are written through at once, so an interrupted run loses at
+    most the line being written; a torn last line is ignored on load.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.started = set()
+        self.directories = set()
+        self.output = None
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8", errors="surrogateescape") as journal:
+                for line in journal:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    kind = record[0]
+                    if kind == "S":
+                        self.started.add(record[1])
+                    elif kind == "F":
+                        self.files[record[1]] = (record[2], record[3])
+                    elif kind == "D":
+                        self.directories.add(record[1])
+        except FileNotFoundError:
+            pass
+
+    def is_empty(self):
+        return not (self.files or self.started or self.directories)
+
+    def reset(self):
+        self.close()
+        self.files.clear()
+        self.started.clear()
+        self.directories.clear()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def prepare(self, target):
+        """Get target ready for a resumed run; returns the number of files removed.
+
+        restore skips files that exist, so files it started but did not
+        finish, and completed files whose size or mtime changed since, are
+        removed to be restored again. Directories above them are no longer
+        complete. Files the journal does not know are left alone.
+        """
+        removed = 0
+        suspect = [path for path in self.started if path not in self.files]
+        for path, (size, mtime) in list(self.files.items()):
+            try:
+                info = os.lstat(target + path)
+            except OSError:
+                info = None
+            if info is None or info.st_size != size or info.st_mtime_ns != mtime:
+                del self.files[path]
+                suspect.append(path)
+        for path in suspect:
+            try:
+                mode = os.lstat(target + path).st_mode
+                if stat.S_ISDIR(mode):
+                    # Directories are complete by their "D" record, not by being started
+                    continue
+                if stat.S_ISREG(mode):
+                    os.unlink(target + path)
+                    removed += 1
+            except OSError:
+                pass
+            self.directories.difference_update(ancestors(path))
+        self.started.clear()
+        self.directories = set(outermost(self.directories))
+        self.rewrite()
+        return removed
+
+    def rewrite(self):
+        """Compact the journal to what it knows now, atomically."""
+        self.close()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="utf-8", errors="surrogateescape") as journal:
+            for path, (size, mtime) in self.files.items():
+                journal.write(json.dumps(["F", path, size, mtime]) + "\n")
+            for path in sorted(self.directories):
+                journal.write(json.dumps(["D", path]) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(temporary, self.path)
+
+    def open(self):
+        if self.output is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.output = open(self.path, "a", buffering=1, encoding="utf-8", errors="surrogateescape")
+
+    def close(self):
+        if self.output is not None:
+            self.output.close()
+            self.output = None
+
+    def write(self, record):
+        self.open()
+        self.output.write(json.dumps(record) + "\n")
+
+    def stream(self):
+        return JournalStream(self)
+
+    def completed_directories(self):
+        return outermost(self.directories)
+
+    def resume_rules(self, rules):
+        """Check rules {path: checked} minus the directories already restored completely."""
+        rules = dict(rules)
+        for directory in self.completed_directories():
+            for path in [path for path in rules if path.startswith(directory + "/")]:
+                del rules[path]
+            rules.pop(directory, None)
+            if rule_state(rules, directory):
+                rules[directory] = False
+        return rules
+
+
+class JournalStream:
+    """Journal the output of one restore process.
+
+    restore names files depth first, so a directory is complete once a
+    path outside it is named. stdout reaches us block-buffered while
+    stderr does not, so an error can arrive before the lines of the file
+    it belongs to: after an error, nothing named in the next SUSPECT_CHUNKS
+    chunks of stdout counts as complete, nor do the directories open then.
+    """
+
+    SUSPECT_CHUNKS = 2
+
+    def __init__(self, journal):
+        self.journal = journal
+        # [directory, clean] from the outermost down
+        self.stack = []
+        self.suspect = 0
+
+    def started(self, path):
+        self.journal.write(["S", path])
+        directories = ancestors(path)
+        common = 0
+        for (directory, _), wanted in zip(self.stack, directories):
+            if directory != wanted:
+                break
+            common += 1
+        while len(self.stack) > common:
+            self.close_directory(self.stack.pop())
+        self.stack.extend([directory, True] for directory in directories[common:])
+        if self.suspect:
+            self.taint()
+
+    def completed(self, path, size, mtime):
+        if not self.suspect:
+            self.journal.files[path] = (size, mtime)
+            self.journal.write(["F", path, size, mtime])
+
+    def error(self):
+        self.suspect = self.SUSPECT_CHUNKS
+        self.taint()
+
+    def taint(self):
+        for entry in self.stack:
+            entry[1] = False
+
+    def chunk_done(self):
+        if self.suspect:
+            self.suspect -= 1
+
+    def close_directory(self, entry):
+        directory, clean = entry
+        if clean:
+            self.journal.directories.add(directory)
+            self.journal.write(["D", directory])
+
+    def finish(self, success):
+        """Close the directories still open; they are only complete if restore got through them."""
+        while self.stack:
+            entry = self.stack.pop()
+            if success:
+                self.close_directory(entry)
@@ -0,0 +1,207 @@
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from blockinventory_btrfsqt6 import get_inventory
+
+# Seconds a successful read-only query stays fresh, by command family
+CACHE_TTL = {
+    ("subvolume", "list"): 60,
+    ("subvolume", "show"): 60,
+    ("subvolume", "get-default"): 60,
+    ("filesystem", "show"): 30,
+    ("filesystem", "df"): 10,
+    ("filesystem", "usage"): 10,
+    ("filesystem", "du"): 60,
+    ("device", "usage"): 15,
+    ("property", "list"): 300,
+    ("property", "get"): 60,
+    ("qgroup", "show"): 10,
+}
+
+# Mutating commands and the query families they make stale on their filesystem
+SPACE = (("filesystem", "df"), ("filesystem", "usage"), ("filesystem", "show"),
+         ("filesystem", "du"), ("device", "usage"), ("qgroup", "show"))
+SUBVOLUMES = (("subvolume", "list"), ("subvolume", "show"), ("subvolume", "get-default"))
+INVALIDATES = {
+    ("subvolume", "create"): SUBVOLUMES + SPACE,
+    ("subvolume", "delete"): SUBVOLUMES + SPACE,
+    ("subvolume", "snapshot"): SUBVOLUMES + SPACE,
+    ("subvolume", "set-default"): SUBVOLUMES,
+    ("device", "add"): None,
+    ("device", "remove"): None,
+    ("device", "delete"): None,
+    ("replace", "start"): None,
+    ("property", "set"): (("property", "get"), ("property", "list"), ("filesystem", "show"),
+                          ("subvolume", "list"), ("subvolume", "show")),
+    ("quota", "enable"): (("qgroup", "show"),),
+    ("quota", "disable"): (("qgroup", "show"),),
+    ("quota", "rescan"): (("qgroup", "show"),),
+    ("qgroup", "create"): (("qgroup", "show"),),
+    ("qgroup", "destroy"): (("qgroup", "show"),),
+    ("qgroup", "assign"): (("qgroup", "show"),),
+    ("qgroup", "remove"): (("qgroup", "show"),),
+    ("qgroup", "limit"): (("qgroup", "show"),),
+    ("balance", "start"): SPACE,
+    ("balance", "resume"): SPACE,
+    ("filesystem", "resize"): SPACE,
+    ("filesystem", "defragment"): SPACE,
+    ("filesystem", "label"): (("filesystem", "show"),),
+    ("filesystem", "mkswapfile"): SUBVOLUMES + SPACE,
+}
+
+
+def btrfs_arguments(argv):
+    """The arguments after the btrfs executable, or None for other commands."""
+    for index, arg in enumerate(argv):
+        if os.path.basename(arg) == "btrfs":
+            return argv[index + 1:]
+    return None
+
+
+def normalize_arguments(arguments):
+    """Make equivalent spellings of a command compare equal: /mnt/ == /mnt, /a/../b == /b."""
+    return tuple(os.path.normpath(arg) if arg.startswith("/") else arg for arg in arguments)
+
+
+def command_family(arguments):
+    return tuple(arguments[:2])
+
+
+def filesystem_uuid(arguments):
+    """UUID of the filesystem the first path argument lives on, or "" if unknown."""
+    inventory = get_inventory()
+    # Device commands name the devices first and the mount point last
+    if arguments and arguments[0] in ("device", "replace"):
+        arguments = arguments[-1:]
+    for arg in arguments:
+        if not arg.startswith("/"):
+            continue
+        if arg.startswith("/dev/"):
+            # A device node, not a path on whatever is mounted at /
+            for device in inventory.block_devices():
+                if device.path == arg and device.uuid:
+                    return device.uuid
+            continue
+        best = None
+        for mount in inventory.btrfs_mounts():
+            # The deepest mount point containing the path wins
+            prefix = "/" if mount.mount_point == "/" else mount.mount_point + "/"
+            if arg == mount.mount_point or arg.startswith(prefix):
+                if best is None or len(mount.mount_point) > len(best.mount_point):
+                    best = mount
+        if best is not None:
+            return best.uuid
+    return ""
+
+
+@dataclass(slots=True)
+class CachedResult:
+    uuid: str
+    family: tuple
+    stored: float
+    expires: float
+    chunks: list
+    size: int
+
+
+class ResultCache:
+    """LRU cache of successful read-only btrfs query output.
+
+    Entries are keyed by filesystem UUID and normalized arguments and expire
+    after the TTL of their command family. A mutating command drops the
+    entries it affects on the same filesystem, or on every filesystem when
+    its target cannot be resolved.
+    """
+
+    MAX_ENTRIES = 128
+    MAX_BYTES = 64 * 1024 * 1024
+    # Output larger than this is not worth keeping in memory
+    MAX_ENTRY_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, argv):
+        """Cache key for argv, or None when the command is not cacheable."""
+        arguments = btrfs_arguments(argv)
+        if arguments is None or command_family(arguments) not in CACHE_TTL:
+            return None
+        arguments = normalize_arguments(arguments)
+        return filesystem_uuid(arguments), arguments
+
+    def lookup(self, argv, now=None):
+        """Return the cached entry for argv, or None."""
+        key = self.key(argv)
+        if key is None:
+            return None
+        now = time.monotonic() if now is None else now
+        entry = self.entries.get(key)
+        if entry is None or entry.expires <= now:
+            if entry is not None:
+                self.discard(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def store(self, argv, chunks, now=None):
+        """Remember the (stream, text) chunks of a successful run of argv."""
+        key = self.key(argv)
+        if key is None:
+            return
+        size = sum(len(text) for _, text in chunks)
+        if size > self.MAX_ENTRY_BYTES:
+            return
+        now = time.monotonic() if now is None else now
+        self.discard(key)
+        family = command_family(key[1])
+        self.entries[key] = CachedResult(key[0], family, now, now + CACHE_TTL[family], list(chunks), size)
+        self.total_bytes += size
+        while self.entries and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            self.discard(next(iter(self.entries)))
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+
+    def invalidate_for(self, argv):
+        """Drop the entries a mutating command makes stale; other commands are ignored."""
+        arguments = btrfs_arguments(argv)
+        if arguments is None:
+            return
+        family = command_family(arguments)
+        if family not in INVALIDATES:
+            return
+        affected = INVALIDATES[family]
+        uuid = filesystem_uuid(normalize_arguments(arguments))
+        for key in list(self.entries):
+            entry = self.entries[key]
+            if uuid and entry.uuid and entry.uuid != uuid:
+                continue
+            if affected is None or entry.family in affected:
+                self.discard(key)
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+
+
+shared_cache = None
+
+
+def get_result_cache():
+    """Return the cache shared by every runner in the process."""
+    global shared_cache
+    if shared_cache is None:
+        shared_cache = ResultCache()
+        # Mounts and devices changed: UUID resolution and results may be stale
+        get_inventory().changed.connect(shared_cache.clear)
+    return shared_cache
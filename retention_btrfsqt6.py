@@ -0,0 +1,177 @@
+import re
+from datetime import date
+from dataclasses import dataclass, field, asdict, fields
+from PyQt6.QtCore import QSettings
+
+# A date with an optional time, as in snap-2026-10-18_10:15, @GMT-2026.10.18-10.15.00,
+# 20261018-101500 or the otime column "2026-10-18 10:15:00"
+TIMESTAMP_RE = re.compile(
+    r"(?<!\d)(\d{4})[-._]?(\d{2})[-._]?(\d{2})"
+    r"(?:[T_ .-]?(\d{2})[:.-]?(\d{2})(?:[:.-]?(\d{2}))?)?(?!\d)")
+
+TIME_SOURCES = ("auto", "name", "otime")
+
+
+@dataclass(slots=True)
+class RetentionPolicy:
+    # Newest snapshots kept unconditionally
+    keep_last: int = 1
+    # Newest snapshot of each of the last N hours, days, ISO weeks, months, years
+    keep_hourly: int = 24
+    keep_daily: int = 7
+    keep_weekly: int = 4
+    keep_monthly: int = 12
+    keep_yearly: int = 0
+    # Where the snapshot time comes from: "name", "otime" or "auto" (name, then otime)
+    time_source: str = "auto"
+    # Only snapshots whose path contains this text are managed; "" manages all
+    name_filter: str = ""
+    # Deletion pacing: subvolumes per `delete --commit-after` call and seconds between calls
+    batch_size: int = 20
+    pacing: float = 5.0
+
+
+def settings_key(mount_point, subvolume):
+    """QSettings group for one subvolume; "/" separates groups, so it is escaped."""
+    name = f"{mount_point.rstrip('/')}/{subvolume.strip('/')}".strip("/")
+    return "retention/" + (name.replace("/", "%2F") or "%2F")
+
+
+def load_retention_policy(mount_point, subvolume, settings=None):
+    """Read the policy stored for a subvolume, falling back to the defaults."""
+    settings = settings or QSettings("btrfs-progs-gui", "btrfs-progs-gui")
+    policy = RetentionPolicy()
+    settings.beginGroup(settings_key(mount_point, subvolume))
+    for item in fields(RetentionPolicy):
+        default = getattr(policy, item.name)
+        stored = settings.value(item.name, default)
+        try:
+            setattr(policy, item.name, type(default)(stored))
+        except (TypeError, ValueError):
+            pass
+    settings.endGroup()
+    return policy
+
+
+def save_retention_policy(mount_point, subvolume, policy, settings=None):
+    settings = settings or QSettings("btrfs-progs-gui", "btrfs-progs-gui")
+    settings.beginGroup(settings_key(mount_point, subvolume))
+    for name, value in asdict(policy).items():
+        settings.setValue(name, value)
+    settings.endGroup()
+
+
+def parse_timestamp(text):
+    """The first timestamp in text as "YYYYMMDDHHMMSS", or None.
+
+    Fixed-width digit strings sort chronologically and their prefixes are
+    the hour, day, month and year buckets, so no integers are needed.
+    """
+    match = TIMESTAMP_RE.search(text)
+    if match is None:
+        return None
+    year, month, day, hour, minute, second = match.groups()
+    return f"{year}{month}{day}{hour or '00'}{minute or '00'}{second or '00'}"
+
+
+def snapshot_time(record, time_source="auto"):
+    if time_source != "otime":
+        found = parse_timestamp(record.path.rsplit("/", 1)[-1])
+        if found is not None or time_source == "name":
+            return found
+    return parse_timestamp(record.otime) if record.otime else None
+
+
+@dataclass
+class RetentionPlan:
+    # (record, reasons) for every dated snapshot that stays, newest first
+    keep: list = field(default_factory=list)
+    # Snapshots to delete, oldest first
+    delete: list = field(default_factory=list)
+    # Snapshots without a usable time; they are never deleted
+    undated: list = field(default_factory=list)
+
+    def summary(self):
+        return (f"{len(self.keep)} kept, {len(self.delete)} to delete, "
+                f"{len(self.undated)} without a timestamp (kept)")
+
+
+def snapshots_of(records, source):
+    """Snapshots taken of source, found through their parent UUID."""
+    return [record for record in records if source.uuid and record.parent_uuid == source.uuid]
+
+
+def plan_retention(snapshots, policy):
+    """Decide which snapshots to keep in one pass over them sorted newest first.
+
+    A snapshot is kept by a rule when it is the newest one in a bucket
+    (hour, day, week, month, year) and the rule still has buckets left,
+    the same semantics as borg and restic prune.
+    """
+    # [name, buckets left, stamp prefix length naming the bucket, last bucket seen];
+    # weeks have no prefix and are computed from the day
+    rules = [[name, count, width, None] for name, count, width in (
+        ("hourly", policy.keep_hourly, 10), ("daily", policy.keep_daily, 8),
+        ("weekly", policy.keep_weekly, None), ("monthly", policy.keep_monthly, 6),
+        ("yearly", policy.keep_yearly, 4)) if count > 0]
+    if policy.keep_last <= 0 and not rules:
+        raise ValueError("The retention policy keeps no snapshots")
+
+    plan = RetentionPlan()
+    dated = []
+    for record in snapshots:
+        if policy.name_filter and policy.name_filter not in record.path:
+            continue
+        stamp = snapshot_time(record, policy.time_source)
+        if stamp is None:
+            plan.undated.append(record)
+        else:
+            # The id breaks ties, so records themselves are never compared
+            dated.append((stamp, record.id, record))
+    dated.sort(reverse=True)
+
+    weeks = {}
+    kept_last = 0
+    for stamp, _, record in dated:
+        day = stamp[:8]
+        week = weeks.get(day)
+        if week is None:
+            try:
+                # Ordinal 1 is a Monday, so this numbers ISO weeks
+                week = weeks[day] = (date(int(day[:4]), int(day[4:6]), int(day[6:])).toordinal() - 1) // 7
+            except ValueError:
+                # Looked like a date but is not one, e.g. 2026-02-30
+                plan.undated.append(record)
+                continue
+        reasons = []
+        if kept_last < policy.keep_last:
+            kept_last += 1
+            reasons.append("last")
+        for rule in rules:
+            if not rule[1]:
+                continue
+            bucket = week if rule[2] is None else stamp[:rule[2]]
+            if bucket != rule[3]:
+                rule[3] = bucket
+                rule[1] -= 1
+                reasons.append(rule[0])
+        if reasons:
+            plan.keep.append((record, reasons))
+        else:
+            plan.delete.append(record)
+    plan.delete.reverse()
+    return plan
+
+
+def format_plan(plan, limit=200):
+    """Preview lines: every deletion (up to limit) and what each kept snapshot is kept for."""
+    lines = [f"Retention: {plan.summary()}"]
+    for record in plan.delete[:limit]:
+        lines.append(f"DELETE {record.path}")
+    if len(plan.delete) > limit:
+        lines.append(f"... and {len(plan.delete) - limit} more to delete")
+    for record, reasons in plan.keep[:limit]:
+        lines.append(f"KEEP   {record.path} ({', '.join(reasons)})")
+    if len(plan.keep) > limit:
+        lines.append(f"... and {len(plan.keep) - limit} more kept")
+    return lines
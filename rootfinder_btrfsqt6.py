@@ -0,0 +1,218 @@
+import sqlite3
+from PyQt6.QtCore import QObject, pyqtSignal
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, describe_finish
+from btrfsparsers_btrfsqt6 import FindRootParser, RestoreLogParser
+from restorejob_btrfsqt6 import source_concurrency
+from restoreindex_btrfsqt6 import device_identity
+
+# Newest roots probed per search; btrfs-find-root can report hundreds of old ones
+MAX_PROBES = 16
+# A probe stops once its dry run has listed this many paths
+PROBE_FILE_LIMIT = 50000
+# Seconds a probe may take; a stuck root is no better than a failed one
+PROBE_TIMEOUT = 120
+
+
+def rank_candidates(candidates):
+    """Best first: most paths listed, then the newest generation; roots not probed go last."""
+    return sorted(candidates, key=lambda candidate: (-candidate.files, -candidate.generation, candidate.bytenr))
+
+
+def probe_choice(candidates, count=MAX_PROBES):
+    """The candidates to probe: the newest count generations and the root the superblock names."""
+    chosen = candidates[:count]
+    chosen += [candidate for candidate in candidates[count:] if candidate.current]
+    return chosen
+
+
+class RootProbe(QObject):
+    """Count the paths one bounded `btrfs restore -D -o -v -t <bytenr>` lists.
+
+    The dry run is stopped at limit paths, or after timeout seconds, and
+    the candidate is then marked capped: its count is a lower bound.
+    """
+
+    finished = pyqtSignal(object)
+
+    def __init__(self, candidate, parent=None, btrfs=("btrfs",)):
+        super().__init__(parent)
+        self.candidate = candidate
+        self.btrfs = list(btrfs)
+        self.parser = RestoreLogParser()
+        self.count = 0
+        self.limit = 0
+        self.capped = False
+        self.errors = ""
+
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.output_received)
+        self.runner.error_received.connect(self.error_received)
+        self.runner.command_finished.connect(self.command_finished)
+
+    def start(self, device, target, limit=PROBE_FILE_LIMIT, timeout=PROBE_TIMEOUT):
+        self.limit = limit
+        # -o, or files already in target would be skipped and not counted
+        command = self.btrfs + ["restore", "-D", "-o", "-v", "-t", str(self.candidate.bytenr), device, target]
+        return self.runner.run(command, timeout)
+
+    def cancel(self):
+        self.runner.cancel()
+
+    def output_received(self, text):
+        if self.capped:
+            return
+        self.parser.feed_text(text)
+        self.count_entries(self.parser.take())
+
+    def count_entries(self, entries):
+        self.count += sum(1 for entry in entries if entry.kind == "restored")
+        if self.count >= self.limit and not self.capped:
+            self.capped = True
+            self.runner.cancel()
+
+    def error_received(self, text):
+        self.errors += text
+
+    def command_finished(self, exit_code, status):
+        if not self.capped:
+            self.count_entries(self.parser.finish())
+        candidate = self.candidate
+        candidate.files = min(self.count, self.limit)
+        candidate.capped = self.capped or status == "timeout"
+        candidate.error = ""
+        if not candidate.capped and exit_code != 0:
+            lines = self.errors.strip().splitlines()
+            candidate.error = lines[-1] if status == "exited" and lines else describe_finish(exit_code, status)
+        self.finished.emit(candidate)
+
+
+class RootFinder(QObject):
+    """Find tree root candidates with btrfs-find-root and rank them by what they can restore.
+
+    The newest MAX_PROBES candidates are probed with bounded dry runs,
+    several at once unless the device is rotational. The ranked list is
+    kept in the RestoreIndexStore, if one is given, per device.
+    """
+
+    output = pyqtSignal(str)
+    # Probes finished and probes in total
+    progress = pyqtSignal(int, int)
+    # The ranked RootCandidate list, or None, and a message
+    finished = pyqtSignal(object, str)
+
+    def __init__(self, store=None, parent=None, btrfs=("btrfs",), find_root=("btrfs-find-root",)):
+        super().__init__(parent)
+        self.store = store
+        self.btrfs = list(btrfs)
+        self.find_root = list(find_root)
+        self.device = ""
+        self.target = ""
+        self.candidates = []
+        self.pending = []
+        self.probes = []
+        self.total = 0
+        self.done = 0
+        self.workers = 1
+        self.cancelled = False
+        self.errors = ""
+        # btrfs-find-root reports on both streams
+        self.parsers = None
+
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(lambda text: self.parsers[0].feed_text(text))
+        self.runner.error_received.connect(self.find_root_error)
+        self.runner.command_finished.connect(self.find_root_finished)
+
+    def is_active(self):
+        return self.runner.is_running() or bool(self.probes)
+
+    def start(self, device, target, workers=1):
+        """Search device; target only prefixes the paths the probes list, nothing is written."""
+        if self.is_active():
+            return False
+        self.device = device
+        self.target = target
+        self.workers = source_concurrency(device, workers)
+        self.candidates = []
+        self.pending = []
+        self.total = 0
+        self.done = 0
+        self.cancelled = False
+        self.errors = ""
+        self.parsers = (FindRootParser(), FindRootParser())
+        return self.runner.run(self.find_root + [device])
+
+    def cancel(self):
+        self.cancelled = True
+        self.pending = []
+        self.runner.cancel()
+        for probe in self.probes:
+            probe.cancel()
+
+    def find_root_error(self, text):
+        self.errors += text
+        self.parsers[1].feed_text(text)
+
+    def find_root_finished(self, exit_code, status):
+        found = {}
+        for parser in self.parsers:
+            for candidate in parser.finish():
+                if candidate.bytenr not in found or candidate.current:
+                    found[candidate.bytenr] = candidate
+        self.candidates = sorted(found.values(), key=lambda candidate: (-candidate.generation, -candidate.bytenr))
+        if not self.candidates:
+            message = describe_finish(exit_code, status)
+            if status == "exited":
+                lines = self.errors.strip().splitlines()
+                message = lines[-1] if exit_code != 0 and lines else "btrfs-find-root found no tree roots."
+            self.finished.emit(None, message)
+            return
+        if self.cancelled:
+            self.finished.emit(None, describe_finish(-1, "cancelled"))
+            return
+        self.pending = probe_choice(self.candidates)
+        self.total = len(self.pending)
+        self.output.emit(f"Found {len(self.candidates)} tree roots; probing {self.total} "
+                         f"with {min(self.workers, self.total)} dry runs at a time.\n")
+        self.progress.emit(0, self.total)
+        while self.pending and len(self.probes) < self.workers:
+            self.start_probe()
+
+    def start_probe(self):
+        probe = RootProbe(self.pending.pop(0), self, self.btrfs)
+        probe.finished.connect(lambda candidate, probe=probe: self.probe_finished(probe, candidate))
+        self.probes.append(probe)
+        probe.start(self.device, self.target)
+
+    def probe_finished(self, probe, candidate):
+        self.probes.remove(probe)
+        probe.deleteLater()
+        self.done += 1
+        if candidate.error:
+            result = f"failed: {candidate.error}"
+        else:
+            result = f"{'at least ' if candidate.capped else ''}{candidate.files} paths"
+        self.output.emit(f"Root {candidate.bytenr} (generation {candidate.generation}): {result}\n")
+        self.progress.emit(self.done, self.total)
+        if self.pending and not self.cancelled:
+            self.start_probe()
+        elif not self.probes:
+            self.probes_done()
+
+    def probes_done(self):
+        if self.cancelled:
+            self.finished.emit(None, describe_finish(-1, "cancelled"))
+            return
+        ranked = rank_candidates(self.candidates)
+        if self.store is not None:
+            try:
+                self.store.save_root_candidates(device_identity(self.device), ranked)
+            except sqlite3.Error as error:
+                self.output.emit(f"The ranking is not kept: {error}\n")
+        best = ranked[0]
+        if best.files <= 0:
+            message = f"None of the {self.total} roots probed lists any files."
+        else:
+            message = (f"Best of {self.total} roots probed: {best.bytenr} (generation {best.generation}) "
+                       f"with {'at least ' if best.capped else ''}{best.files} paths.")
+        self.finished.emit(ranked, message)
@@ -0,0 +1,185 @@
+import time
+from collections import deque
+from dataclasses import dataclass
+from PyQt6.QtCore import QObject, QTimer, QPointF, pyqtSignal
+from PyQt6.QtGui import QPainter, QPen, QColor, QPolygonF
+from PyQt6.QtWidgets import QWidget
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, QUERY_TIMEOUT
+from btrfsparsers_btrfsqt6 import ScrubStatusParser, FilesystemShowParser
+
+
+@dataclass(slots=True)
+class ScrubProgress:
+    devid: int
+    path: str
+    status: str
+    bytes_scrubbed: int
+    allocated: int
+    rate: float
+    eta: float
+    errors: int
+    error_delta: int
+
+
+class ScrubRateTracker:
+    """Turn successive scrub status samples into rates, ETAs and error deltas.
+
+    Allocated bytes per device are read once (the baseline) and kept for the
+    whole run; only the previous sample per device is remembered.
+    """
+
+    # Weight of the newest sample in the smoothed rate
+    SMOOTHING = 0.3
+
+    def __init__(self, allocated=None):
+        self.allocated = dict(allocated or {})
+        self.previous = {}
+
+    def update(self, devices, now=None):
+        now = time.monotonic() if now is None else now
+        progress = []
+        for device in devices:
+            scrubbed = device.bytes_scrubbed
+            errors = device.total_errors
+            last = self.previous.get(device.devid)
+
+            rate = 0.0
+            error_delta = 0
+            if last is not None:
+                last_time, last_scrubbed, last_errors, last_rate = last
+                elapsed = now - last_time
+                if elapsed > 0:
+                    sample = max(scrubbed - last_scrubbed, 0) / elapsed
+                    rate = sample if last_rate == 0 else \
+                        self.SMOOTHING * sample + (1 - self.SMOOTHING) * last_rate
+                else:
+                    rate = last_rate
+                error_delta = errors - last_errors
+            elif device.duration:
+                # First sample: use the average rate since the scrub started
+                rate = scrubbed / device.duration
+
+            allocated = self.allocated.get(device.devid, 0)
+            if device.status and device.status != "running":
+                eta = 0.0
+            elif rate > 0 and allocated > scrubbed:
+                eta = (allocated - scrubbed) / rate
+            else:
+                eta = -1.0
+
+            self.previous[device.devid] = (now, scrubbed, errors, rate)
+            progress.append(ScrubProgress(device.devid, device.path, device.status, scrubbed,
+                                          allocated, rate, eta, errors, error_delta))
+        return progress
+
+
+class ScrubMonitor(QObject):
+    """Poll `btrfs scrub status -R -d` and report per-device progress."""
+
+    sample_ready = pyqtSignal(list)
+    monitor_error = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.path = ""
+        self.tracker = None
+        self.parser = None
+        self.errors = ""
+
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.output_received)
+        self.runner.error_received.connect(self.error_received)
+        self.runner.command_finished.connect(self.command_finished)
+
+        self.poll_timer = QTimer(self)
+        self.poll_timer.timeout.connect(self.poll)
+
+    def is_active(self):
+        return self.tracker is not None
+
+    def start(self, path, interval):
+        """Read the allocation baseline once, then poll every interval seconds."""
+        self.stop()
+        self.path = path
+        self.tracker = ScrubRateTracker()
+        self.poll_timer.setInterval(int(interval * 1000))
+        self.run(FilesystemShowParser(), ['sudo', 'btrfs', 'filesystem', 'show', '--raw', path])
+
+    def stop(self):
+        self.poll_timer.stop()
+        self.tracker = None
+        self.runner.cancel()
+
+    def set_interval(self, interval):
+        self.poll_timer.setInterval(int(interval * 1000))
+
+    def poll(self):
+        # Skip a tick rather than queue polls behind a slow status call
+        if self.tracker is not None and not self.runner.is_running():
+            self.run(ScrubStatusParser(), ['sudo', 'btrfs', 'scrub', 'status', '-R', '-d', self.path])
+
+    def run(self, parser, command):
+        self.parser = parser
+        self.errors = ""
+        self.runner.run(command, QUERY_TIMEOUT)
+
+    def output_received(self, text):
+        self.parser.feed_text(text)
+
+    def error_received(self, text):
+        self.errors += text
+
+    def command_finished(self, exit_code, status):
+        if self.tracker is None:
+            return
+        records = self.parser.finish()
+
+        if isinstance(self.parser, FilesystemShowParser):
+            if exit_code == 0:
+                self.tracker.allocated = {device.devid: device.used for device in records}
+            else:
+                self.monitor_error.emit(f"Could not read allocated space, ETA unavailable: {self.errors.strip()}")
+            self.poll_timer.start()
+            self.poll()
+            return
+
+        if exit_code != 0:
+            self.monitor_error.emit(self.errors.strip() or f"scrub status exited with status {exit_code}")
+            return
+        self.sample_ready.emit(self.tracker.update(records))
+
+
+class ScrubSparkline(QWidget):
+    """Small line chart of the most recent throughput samples."""
+
+    def __init__(self, parent=None, capacity=120):
+        super().__init__(parent)
+        self.samples = deque(maxlen=capacity)
+        self.setMinimumHeight(40)
+
+    def add_sample(self, value):
+        self.samples.append(value)
+        self.update()
+
+    def clear(self):
+        self.samples.clear()
+        self.update()
+
+    def paintEvent(self, event):
+        if len(self.samples) < 2:
+            return
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(QPen(QColor("#4A90E2"), 2))
+
+        width = self.width() - 2
+        height = self.height() - 4
+        peak = max(self.samples) or 1
+        step = width / (self.samples.maxlen - 1)
+        offset = width - step * (len(self.samples) - 1)
+        points = QPolygonF([
+            QPointF(1 + offset + i * step, 2 + height - value / peak * height)
+            for i, value in enumerate(self.samples)
+        ])
+        painter.drawPolyline(points)
+        painter.end()
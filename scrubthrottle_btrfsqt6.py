@@ -0,0 +1,222 @@
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from PyQt6.QtCore import QObject, pyqtSignal
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, QUERY_TIMEOUT, describe_finish
+from btrfsparsers_btrfsqt6 import ScrubLimitParser, format_bytes
+from iopressure_btrfsqt6 import DISKSTATS, read_diskstats, DiskLatencyTracker
+
+# ioprio classes accepted by `btrfs scrub start -c`
+IOPRIO_CLASSES = {"realtime": 1, "best-effort": 2, "idle": 3}
+
+
+def scrub_start_command(path, ioprio_class=None, ioprio_level=None):
+    """Build `btrfs scrub start` arguments with an optional I/O priority.
+
+    The class and level only take effect with an I/O scheduler that honours
+    priorities (BFQ); other schedulers ignore them.
+    """
+    command = ["scrub", "start"]
+    if ioprio_class:
+        command += ["-c", str(IOPRIO_CLASSES[ioprio_class])]
+        if ioprio_class != "idle" and ioprio_level is not None:
+            command += ["-n", str(ioprio_level)]
+    return command + [path]
+
+
+def kernel_name(device_path):
+    """Map /dev/sda or /dev/mapper/x to the name used in /proc/diskstats."""
+    return os.path.basename(os.path.realpath(device_path))
+
+
+@dataclass(slots=True)
+class ThrottleSettings:
+    # Keep each device's average I/O latency around this while scrubbing
+    target_await_ms: float = 20.0
+    # Seconds from start by which the scrub must finish; 0 means no deadline
+    deadline: float = 0.0
+    # Never throttle below this rate, bytes per second
+    min_rate: int = 4 * 1024 ** 2
+    # Multiplicative decrease when latency is too high, increase when it is low
+    decrease: float = 0.7
+    increase: float = 1.25
+    # Ignore limit changes smaller than this fraction to avoid churn
+    min_change: float = 0.1
+
+
+class ScrubLimitPolicy:
+    """Compute the next per-device scrub limit from latency and progress.
+
+    Multiplicative decrease above the target await, gentle increase below
+    half of it, never below the rate needed to meet the deadline. A limit
+    that grows past twice the fastest rate seen for the device is lifted,
+    or held at ceiling when the device already had a limit of its own.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.peak_rate = {}
+
+    def next_limit(self, devid, current, rate, await_ms, remaining, time_left, ceiling=0):
+        settings = self.settings
+        self.peak_rate[devid] = max(self.peak_rate.get(devid, 0.0), rate)
+
+        floor = settings.min_rate
+        if settings.deadline:
+            if time_left <= 0:
+                # Past the deadline: finish as fast as allowed
+                return ceiling
+            floor = max(floor, remaining / time_left * 1.1)
+
+        if await_ms > settings.target_await_ms:
+            base = current if current else rate
+            if not base:
+                return current
+            limit = base * settings.decrease
+        elif await_ms < settings.target_await_ms / 2 and current:
+            limit = current * settings.increase
+            if ceiling and limit >= ceiling:
+                return ceiling
+            if limit > 2 * self.peak_rate[devid]:
+                return 0
+        else:
+            limit = current
+        if not limit:
+            return 0
+        return int(max(limit, floor))
+
+
+class AdaptiveScrubLimiter(QObject):
+    """Adjust `btrfs scrub limit` for every device of a running scrub.
+
+    Feed it the ScrubMonitor samples through update(); each sample is paired
+    with a /proc/diskstats reading for the same devices. The limits found
+    when the limiter started are restored when it stops.
+    """
+
+    log = pyqtSignal(str)
+    limits_changed = pyqtSignal(dict)
+
+    def __init__(self, parent=None, btrfs=("sudo", "btrfs"), diskstats_path=DISKSTATS):
+        super().__init__(parent)
+        self.btrfs = list(btrfs)
+        self.diskstats_path = diskstats_path
+        self.path = ""
+        self.settings = ThrottleSettings()
+        self.policy = None
+        self.latency = None
+        self.started = 0.0
+        self.original = {}
+        self.limits = {}
+        self.queue = deque()
+        self.parser = None
+        self.errors = ""
+        self.active = False
+
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.output_received)
+        self.runner.error_received.connect(self.error_received)
+        self.runner.command_finished.connect(self.command_finished)
+
+    def is_active(self):
+        return self.active
+
+    def start(self, path, settings=None):
+        """Read the current limits, then follow the samples passed to update()."""
+        self.stop()
+        self.path = path
+        self.settings = settings or ThrottleSettings()
+        self.policy = ScrubLimitPolicy(self.settings)
+        self.latency = DiskLatencyTracker()
+        self.started = time.monotonic()
+        self.original = {}
+        self.limits = {}
+        self.active = True
+        self.parser = ScrubLimitParser()
+        self.errors = ""
+        self.runner.run(self.btrfs + ["scrub", "limit", "--raw", path], QUERY_TIMEOUT)
+
+    def stop(self):
+        """Stop adjusting and put back the limits the devices had before."""
+        if not self.active:
+            return
+        self.active = False
+        self.queue.clear()
+        restore = {devid: limit for devid, limit in self.original.items()
+                   if self.limits.get(devid, limit) != limit}
+        for devid, limit in restore.items():
+            self.queue.append((devid, limit))
+        if restore:
+            self.log.emit("Restoring the scrub limits found at start.")
+        self.limits = dict(self.original)
+        self.run_next()
+
+    def update(self, progress, now=None):
+        """Take one ScrubMonitor sample (a list of ScrubProgress)."""
+        if not self.active or self.parser is not None:
+            return
+        now = time.monotonic() if now is None else now
+        names = {kernel_name(record.path): record for record in progress}
+        latencies = {latency.name: latency for latency in
+                     self.latency.update(read_diskstats(set(names), self.diskstats_path), now)}
+        time_left = self.settings.deadline - (now - self.started)
+
+        for name, record in names.items():
+            if record.status and record.status != "running":
+                continue
+            latency = latencies.get(name)
+            if latency is None:
+                continue
+            current = self.limits.get(record.devid, 0)
+            remaining = max(record.allocated - record.bytes_scrubbed, 0)
+            limit = self.policy.next_limit(record.devid, current, record.rate, latency.await_ms,
+                                           remaining, time_left, self.original.get(record.devid, 0))
+            if limit == current:
+                continue
+            if limit and current and abs(limit - current) < current * self.settings.min_change:
+                continue
+            self.log.emit(f"Device {record.devid}: await {latency.await_ms:.1f} ms, "
+                          f"limit {self.describe(current)} -> {self.describe(limit)}")
+            self.limits[record.devid] = limit
+            self.queue.append((record.devid, limit))
+        self.limits_changed.emit(dict(self.limits))
+        self.run_next()
+
+    def describe(self, limit):
+        return f"{format_bytes(limit)}/s" if limit else "unlimited"
+
+    def run_next(self):
+        if self.runner.is_running() or not self.queue:
+            return
+        devid, limit = self.queue.popleft()
+        self.errors = ""
+        self.runner.run(self.btrfs + ["scrub", "limit", "-d", str(devid), "-l", str(limit), self.path],
+                        QUERY_TIMEOUT)
+
+    def output_received(self, text):
+        if self.parser is not None:
+            self.parser.feed_text(text)
+
+    def error_received(self, text):
+        self.errors += text
+
+    def command_finished(self, exit_code, status):
+        if self.parser is not None:
+            limits = self.parser.finish()
+            self.parser = None
+            if not self.active:
+                # Stopped before the current limits were known; nothing was changed
+                self.run_next()
+                return
+            if exit_code != 0:
+                self.log.emit(f"Cannot read scrub limits, adaptive limiting disabled: "
+                              f"{self.errors.strip() or describe_finish(exit_code, status)}")
+                self.active = False
+                return
+            self.original = {limit.devid: limit.limit for limit in limits}
+            self.limits = dict(self.original)
+            self.limits_changed.emit(dict(self.limits))
+        elif exit_code != 0:
+            self.log.emit(f"scrub limit failed: {self.errors.strip() or describe_finish(exit_code, status)}")
+        self.run_next()
@@ -1,14 +1,57 @@
 import sys
-import subprocess
-from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QTextEdit, QComboBox, QLineEdit
-from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import (
+    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QComboBox, QLineEdit,
+    QTreeView, QCheckBox, QGroupBox, QFormLayout, QSpinBox, QDoubleSpinBox, QProgressBar, QAbstractItemView
+)
+import os
+import time
+from PyQt6.QtCore import Qt, pyqtSignal
+from commandrunner_btrfsqt6 import BtrfsCommandRunner, QUERY_TIMEOUT, describe_finish
+from outputconsole_btrfsqt6 import BtrfsOutputConsole
+from blockinventory_btrfsqt6 import get_inventory, subvolume_relative_path
+from btrfsparsers_btrfsqt6 import SubvolumeListParser, format_bytes, format_duration
+from subvolumemodel_btrfsqt6 import SubvolumeTreeModel
+from bulkops_btrfsqt6 import BulkDeleteJob, BulkSnapshotJob
+from cleanermonitor_btrfsqt6 import CleanerWatcher
+from retention_btrfsqt6 import (
+    RetentionPolicy, TIME_SOURCES, load_retention_policy, save_retention_policy,
+    snapshots_of, plan_retention, format_plan
+)
 
 class BtrfsSubvolumeGUI(QWidget):
+    # Emitted when the user asks to return to the main menu
+    back_requested = pyqtSignal()
+
     def __init__(self):
         super().__init__()
 
         self.setWindowTitle("Btrfs Subvolume Management")
-        self.setGeometry(200, 200, 600, 500)
+        self.setGeometry(200, 200, 800, 700)
+
+        # Set while `subvolume list` output is parsed into the browser instead of shown
+        self.list_parser = None
+        self.list_records = []
+
+        # Asynchronous command runner
+        self.runner = BtrfsCommandRunner(self)
+        self.runner.output_received.connect(self.append_output)
+        self.runner.error_received.connect(self.append_error)
+        self.runner.command_finished.connect(self.command_finished)
+
+        # Bulk operations on the subvolumes selected in the browser
+        self.bulk_delete = BulkDeleteJob(self)
+        self.bulk_snapshot = BulkSnapshotJob(self)
+        for job in (self.bulk_delete, self.bulk_snapshot):
+            job.progress.connect(self.show_bulk_progress)
+            job.item_failed.connect(self.bulk_item_failed)
+            job.log.connect(self.append_line)
+            job.finished.connect(self.bulk_finished)
+
+        # Backlog of deleted subvolumes the kernel cleaner has not reclaimed yet
+        self.cleaner = CleanerWatcher(self)
+        self.cleaner.progress.connect(self.show_cleaner_progress)
+        self.cleaner.space_reclaimed.connect(self.cleaner_done)
+        self.cleaner.watch_error.connect(self.append_line)
 
         self.initUI()
 
@@ -29,8 +72,8 @@ class BtrfsSubvolumeGUI(QWidget):
         # Device Selection ComboBox
         self.device_combo = QComboBox(self)
         self.device_combo.setStyleSheet(self.get_styles())
-        self.device_combo.addItem("Select a device")
         self.populate_devices()
+        get_inventory().changed.connect(self.populate_devices)
         main_layout.addWidget(self.device_combo)
 
         # Subvolume Path Input
@@ -69,10 +112,134 @@ class BtrfsSubvolumeGUI(QWidget):
         self.snapshot_subvol_button.clicked.connect(self.snapshot_subvolume_action)
         main_layout.addWidget(self.snapshot_subvol_button)
 
+        # Cancel Command Button
+        self.cancel_button = QPushButton("Cancel Command", self)
+        self.cancel_button.setStyleSheet(self.get_styles())
+        self.cancel_button.clicked.connect(self.runner.cancel)
+        main_layout.addWidget(self.cancel_button)
+
+        # Subvolume Browser
+        search_layout = QHBoxLayout()
+        self.search_input = QLineEdit(self)
+        self.search_input.setStyleSheet(self.get_styles())
+        self.search_input.setPlaceholderText("Search subvolume paths")
+        self.search_input.textChanged.connect(self.search_subvolumes)
+        search_layout.addWidget(self.search_input)
+        self.prefix_check = QCheckBox("Prefix match", self)
+        self.prefix_check.toggled.connect(self.search_subvolumes)
+        search_layout.addWidget(self.prefix_check)
+        main_layout.addLayout(search_layout)
+
+        self.subvolume_model = SubvolumeTreeModel(self)
+        self.subvolume_view = QTreeView(self)
+        self.subvolume_view.setStyleSheet(self.get_styles())
+        self.subvolume_view.setModel(self.subvolume_model)
+        # Rows have a fixed height, so Qt does not measure every row on layout
+        self.subvolume_view.setUniformRowHeights(True)
+        self.subvolume_view.setSortingEnabled(True)
+        self.subvolume_view.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.subvolume_view.sortByColumn(0, Qt.SortOrder.AscendingOrder)
+        self.subvolume_view.clicked.connect(self.subvolume_selected)
+        main_layout.addWidget(self.subvolume_view, 2)
+
+        # Bulk Operations
+        bulk_group = QGroupBox("Bulk Operations on Selected Subvolumes")
+        bulk_layout = QFormLayout()
+        self.batch_size = QSpinBox()
+        self.batch_size.setRange(1, 10000)
+        self.batch_size.setValue(BulkDeleteJob.DEFAULT_BATCH_SIZE)
+        self.batch_size.setToolTip("Subvolumes per `subvolume delete --commit-after` call")
+        bulk_layout.addRow("Delete batch size:", self.batch_size)
+        self.snapshot_concurrency = QSpinBox()
+        self.snapshot_concurrency.setRange(1, 16)
+        self.snapshot_concurrency.setValue(BulkSnapshotJob.DEFAULT_CONCURRENCY)
+        bulk_layout.addRow("Parallel snapshots:", self.snapshot_concurrency)
+        self.bulk_pacing = QDoubleSpinBox()
+        self.bulk_pacing.setRange(0, 600)
+        self.bulk_pacing.setValue(1.0)
+        self.bulk_pacing.setSuffix(" s")
+        self.bulk_pacing.setToolTip("Pause between delete batches and between snapshot starts;\n"
+                                    "each one commits a transaction")
+        bulk_layout.addRow("Pacing:", self.bulk_pacing)
+        self.snapshot_readonly = QCheckBox("Read-only snapshots")
+        bulk_layout.addRow(self.snapshot_readonly)
+
+        bulk_buttons = QHBoxLayout()
+        self.bulk_delete_button = QPushButton("Delete Selected", self)
+        self.bulk_delete_button.clicked.connect(self.bulk_delete_action)
+        bulk_buttons.addWidget(self.bulk_delete_button)
+        self.bulk_snapshot_button = QPushButton("Snapshot Selected", self)
+        self.bulk_snapshot_button.setToolTip("Snapshots go into the subvolume name field's directory,\n"
+                                             "or next to each source when it is empty")
+        self.bulk_snapshot_button.clicked.connect(self.bulk_snapshot_action)
+        bulk_buttons.addWidget(self.bulk_snapshot_button)
+        self.bulk_cancel_button = QPushButton("Cancel Bulk", self)
+        self.bulk_cancel_button.clicked.connect(self.bulk_cancel_action)
+        bulk_buttons.addWidget(self.bulk_cancel_button)
+        bulk_layout.addRow(bulk_buttons)
+
+        self.bulk_progress = QProgressBar()
+        self.bulk_progress.setRange(0, 1)
+        self.bulk_progress.setValue(0)
+        bulk_layout.addRow(self.bulk_progress)
+        bulk_group.setLayout(bulk_layout)
+        bulk_group.setStyleSheet(self.get_styles())
+        main_layout.addWidget(bulk_group)
+
+        # Snapshot Retention for the subvolume in the path field
+        retention_group = QGroupBox("Snapshot Retention")
+        retention_layout = QFormLayout()
+        keep_layout = QHBoxLayout()
+        self.retention_spins = {}
+        for name, label in (("keep_last", "Last"), ("keep_hourly", "Hourly"), ("keep_daily", "Daily"),
+                            ("keep_weekly", "Weekly"), ("keep_monthly", "Monthly"),
+                            ("keep_yearly", "Yearly")):
+            spin = QSpinBox()
+            spin.setRange(0, 100000)
+            spin.setPrefix(f"{label} ")
+            keep_layout.addWidget(spin)
+            self.retention_spins[name] = spin
+        retention_layout.addRow("Keep:", keep_layout)
+        self.retention_time_source = QComboBox()
+        self.retention_time_source.addItems(TIME_SOURCES)
+        self.retention_time_source.setToolTip("Take snapshot times from the name, the otime, "
+                                              "or the name with otime as fallback")
+        retention_layout.addRow("Snapshot time:", self.retention_time_source)
+        self.retention_filter = QLineEdit()
+        self.retention_filter.setPlaceholderText("Only snapshots whose path contains this text")
+        retention_layout.addRow("Filter:", self.retention_filter)
+        retention_buttons = QHBoxLayout()
+        self.retention_preview_button = QPushButton("Preview Retention", self)
+        self.retention_preview_button.clicked.connect(self.retention_preview_action)
+        retention_buttons.addWidget(self.retention_preview_button)
+        self.retention_apply_button = QPushButton("Apply Retention", self)
+        self.retention_apply_button.clicked.connect(self.retention_apply_action)
+        retention_buttons.addWidget(self.retention_apply_button)
+        retention_layout.addRow(retention_buttons)
+        retention_group.setLayout(retention_layout)
+        retention_group.setStyleSheet(self.get_styles())
+        main_layout.addWidget(retention_group)
+
+        # Cleaner Backlog
+        cleaner_group = QGroupBox("Cleaner Backlog")
+        cleaner_layout = QVBoxLayout()
+        self.cleaner_progress = QProgressBar()
+        self.cleaner_progress.setRange(0, 1)
+        self.cleaner_progress.setValue(0)
+        cleaner_layout.addWidget(self.cleaner_progress)
+        self.cleaner_label = QLabel("Not watching")
+        cleaner_layout.addWidget(self.cleaner_label)
+        self.cleaner_button = QPushButton("Watch Cleaner")
+        self.cleaner_button.clicked.connect(self.toggle_cleaner)
+        cleaner_layout.addWidget(self.cleaner_button)
+        cleaner_group.setLayout(cleaner_layout)
+        cleaner_group.setStyleSheet(self.get_styles())
+        main_layout.addWidget(cleaner_group)
+        self.show_retention_policy(RetentionPolicy())
+
         # Output Display Area
-        self.output_display = QTextEdit(self)
+        self.output_display = BtrfsOutputConsole(self)
         self.output_display.setStyleSheet(self.get_styles())
-        self.output_display.setReadOnly(True)
         main_layout.addWidget(self.output_display)
 
         # Set Layout
@@ -115,7 +282,21 @@ class BtrfsSubvolumeGUI(QWidget):
                 padding: 10px;
             }
 
-            QTextEdit {
+            QTreeView {
+                background-color: #444A53;
+                color: white;
+                border: 1px solid #555;
+                border-radius: 8px;
+            }
+
+            QGroupBox {
+                border: 1px solid #555;
+                border-radius: 10px;
+                margin-top: 20px;
+                padding: 15px;
+            }
+
+            QTextEdit, QPlainTextEdit {
                 background-color: #444A53;
                 color: white;
                 font-family: Consolas, monospace;
@@ -127,30 +308,19 @@ class BtrfsSubvolumeGUI(QWidget):
         """
 
     def populate_devices(self):
-        """Populate the ComboBox with block devices from lsblk."""
-        try:
-            result = subprocess.run(['lsblk', '--output', 'NAME,MOUNTPOINT'], capture_output=True, text=True)
-            if result.returncode == 0:
-                # Parse the output to get the list of devices with mount points
-                devices = []
-                for line in result.stdout.splitlines()[1:]:  # Skip the header line
-                    parts = line.split()
-                    if len(parts) > 1 and parts[1]:  # Ensure it has a mount point
-                        devices.append(parts[1])  # Add the mount point to the list
-                for device in devices:
-                    self.device_combo.addItem(device)
-            else:
-                self.output_display.setPlainText(f"Error: {result.stderr}")
-        except Exception as e:
-            self.output_display.setPlainText(f"Error fetching devices: {e}")
+        """Populate the ComboBox with mounted btrfs filesystems, keeping the selection."""
+        current = self.device_combo.currentText()
+        self.device_combo.clear()
+        self.device_combo.addItem("Select a device")
+        self.device_combo.addItems(get_inventory().btrfs_mount_points())
+        index = self.device_combo.findText(current)
+        if index > 0:
+            self.device_combo.setCurrentIndex(index)
 
     def execute_back_command(self):
-        try:
-            result = subprocess.run(["./main-btrfsqt6"], check=True, text=True, capture_output=True)
-            self.output_label.setText(f"Back command executed successfully: {result.stdout}")
-        except subprocess.CalledProcessError as e:
-            self.output_label.setText(f"Error executing back command: {e.stderr}")
-    
+        """Return to the main menu."""
+        self.back_requested.emit()
+
     def create_subvolume_action(self):
         device = self.device_combo.currentText()
         path = self.subvol_path_input.text().strip()
@@ -170,10 +340,110 @@ class BtrfsSubvolumeGUI(QWidget):
 
     def list_subvolumes_action(self):
         device = self.device_combo.currentText()
-        if device != "Select a device":
-            self.run_btrfs_command(f"subvolume list {device}")
-        else:
+        if device == "Select a device":
             self.output_display.setPlainText("Please select a device.")
+            return
+        if self.runner.is_running():
+            self.output_display.append_line("A command is already running. Cancel it first.")
+            return
+        self.output_display.clear()
+        self.output_display.append_line(f"Listing subvolumes of {device}...")
+        # Parent ids for the tree, creation generation, UUIDs for snapshot origins
+        self.list_records = []
+        self.list_parser = SubvolumeListParser()
+        self.runner.run(['sudo', 'btrfs', 'subvolume', 'list', '-p', '-c', '-u', '-q', '-R', device],
+                        QUERY_TIMEOUT, cache=True)
+
+    def list_snapshot_times(self, device):
+        """Second pass: only `list -s` reports otime, and only for snapshots."""
+        self.list_parser = SubvolumeListParser()
+        self.runner.run(['sudo', 'btrfs', 'subvolume', 'list', '-s', device], QUERY_TIMEOUT, cache=True)
+
+    def show_subvolumes(self, records):
+        self.subvolume_model.set_subvolumes(records)
+        self.search_subvolumes()
+        snapshots = sum(1 for record in records if record.parent_uuid)
+        self.output_display.append_line(f"{len(records)} subvolumes, {snapshots} of them snapshots.")
+
+    def search_subvolumes(self):
+        text = self.search_input.text().strip()
+        if not text and not self.subvolume_model.searching:
+            return
+        count = self.subvolume_model.set_search(text, self.prefix_check.isChecked())
+        if text:
+            self.output_display.append_line(f"{count} subvolumes match \"{text}\".")
+
+    def subvolume_selected(self, index):
+        record = self.subvolume_model.record(index)
+        if record is not None:
+            self.subvol_path_input.setText(record.path)
+            device = self.device_combo.currentText()
+            if device != "Select a device":
+                self.show_retention_policy(load_retention_policy(device, record.path))
+
+    def show_retention_policy(self, policy):
+        for name, spin in self.retention_spins.items():
+            spin.setValue(getattr(policy, name))
+        self.retention_time_source.setCurrentText(policy.time_source)
+        self.retention_filter.setText(policy.name_filter)
+        self.batch_size.setValue(policy.batch_size)
+        self.bulk_pacing.setValue(policy.pacing)
+
+    def retention_policy(self):
+        policy = RetentionPolicy(**{name: spin.value() for name, spin in self.retention_spins.items()})
+        policy.time_source = self.retention_time_source.currentText()
+        policy.name_filter = self.retention_filter.text().strip()
+        policy.batch_size = self.batch_size.value()
+        policy.pacing = self.bulk_pacing.value()
+        return policy
+
+    def retention_plan(self):
+        """Plan retention for the subvolume in the path field and save its policy, or None."""
+        device = self.device_combo.currentText()
+        path = self.subvol_path_input.text().strip().strip("/")
+        source = next((record for record in self.list_records if record.path == path), None)
+        if source is None and device != "Select a device":
+            # Also take the path as relative to the mount point
+            mount = get_inventory().mount_at(device)
+            source = next((record for record in self.list_records
+                           if mount and subvolume_relative_path(mount, record.path) == path), None)
+            if source is not None:
+                path = source.path
+        if device == "Select a device" or source is None:
+            self.output_display.setPlainText("Please list the subvolumes and select the snapshotted subvolume.")
+            return None
+        policy = self.retention_policy()
+        try:
+            plan = plan_retention(snapshots_of(self.list_records, source), policy)
+        except ValueError as error:
+            self.output_display.setPlainText(str(error))
+            return None
+        save_retention_policy(device, path, policy)
+        return plan
+
+    def retention_preview_action(self):
+        plan = self.retention_plan()
+        if plan is not None:
+            self.output_display.setPlainText("\n".join(format_plan(plan)))
+
+    def retention_apply_action(self):
+        if self.bulk_busy():
+            return
+        plan = self.retention_plan()
+        if plan is None:
+            return
+        self.output_display.clear()
+        self.output_display.append_line(f"Retention: {plan.summary()}")
+        if not plan.delete:
+            return
+        device = self.device_combo.currentText()
+        paths = [path for _, path in self.mounted_paths(device, plan.delete)]
+        if not paths:
+            return
+        self.bulk_progress.setRange(0, len(paths))
+        self.bulk_progress.setValue(0)
+        # Oldest first, in small paced batches so the cleaner backlog stays short
+        self.bulk_delete.start(paths, self.batch_size.value(), self.bulk_pacing.value())
 
     def snapshot_subvolume_action(self):
         device = self.device_combo.currentText()
@@ -184,19 +454,183 @@ class BtrfsSubvolumeGUI(QWidget):
         else:
             self.output_display.setPlainText("Please provide a valid subvolume path, name, and select a device.")
 
-    def run_btrfs_command(self, command):
-        """Run the btrfs command and display the output."""
-        try:
-            result = subprocess.run(['sudo', 'btrfs'] + command.split(), capture_output=True, text=True)
-            if result.returncode == 0:
-                self.output_display.setPlainText(result.stdout)
+    def selected_records(self):
+        rows = self.subvolume_view.selectionModel().selectedRows()
+        records = [self.subvolume_model.record(index) for index in rows]
+        return [record for record in records if record is not None]
+
+    def mounted_paths(self, device, records):
+        """(record, path below the mount point device) pairs; records outside the mounted subvolume are left out."""
+        mount = get_inventory().mount_at(device)
+        pairs = []
+        outside = []
+        for record in records:
+            relative = subvolume_relative_path(mount, record.path) if mount else record.path
+            if relative is None:
+                outside.append(record.path)
             else:
-                self.output_display.setPlainText(f"Error: {result.stderr}")
-        except Exception as e:
-            self.output_display.setPlainText(f"Error executing command: {e}")
+                pairs.append((record, os.path.join(device, relative) if relative else device))
+        if outside:
+            self.output_display.append_line(
+                f"Left out {len(outside)} subvolumes outside {mount.subvol} mounted at {device}: "
+                + ", ".join(outside[:5]) + (", ..." if len(outside) > 5 else ""))
+        return pairs
+
+    def bulk_busy(self):
+        if self.bulk_delete.is_active() or self.bulk_snapshot.is_active():
+            self.output_display.append_line("A bulk operation is already running. Cancel it first.")
+            return True
+        return False
+
+    def bulk_delete_action(self):
+        device = self.device_combo.currentText()
+        records = self.selected_records()
+        if device == "Select a device" or not records:
+            self.output_display.setPlainText("Please select a device and subvolumes in the list.")
+            return
+        if self.bulk_busy():
+            return
+        # Children first: a subvolume that still contains others cannot be deleted
+        records.sort(key=lambda record: record.path.count("/"), reverse=True)
+        paths = [path for _, path in self.mounted_paths(device, records)]
+        if not paths:
+            return
+        self.bulk_progress.setRange(0, len(paths))
+        self.bulk_progress.setValue(0)
+        self.bulk_delete.start(paths, self.batch_size.value(), self.bulk_pacing.value())
+
+    def bulk_snapshot_action(self):
+        device = self.device_combo.currentText()
+        records = self.selected_records()
+        if device == "Select a device" or not records:
+            self.output_display.setPlainText("Please select a device and subvolumes in the list.")
+            return
+        if self.bulk_busy():
+            return
+        target = self.subvol_name_input.text().strip().strip("/")
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        pairs = []
+        for record, path in self.mounted_paths(device, records):
+            directory = f"{device}/{target}" if target else os.path.dirname(path)
+            pairs.append((path, f"{directory}/{os.path.basename(path)}-{stamp}"))
+        if not pairs:
+            return
+        self.bulk_progress.setRange(0, len(pairs))
+        self.bulk_progress.setValue(0)
+        self.bulk_snapshot.start(pairs, self.snapshot_readonly.isChecked(),
+                                 self.snapshot_concurrency.value(), self.bulk_pacing.value())
+
+    def bulk_cancel_action(self):
+        for job in (self.bulk_delete, self.bulk_snapshot):
+            if job.is_active():
+                job.cancel()
+
+    def show_bulk_progress(self, done, total):
+        self.bulk_progress.setRange(0, max(total, 1))
+        self.bulk_progress.setValue(done)
+
+    def bulk_item_failed(self, path, message):
+        self.output_display.append_line(f"FAILED {path}: {message}")
+
+    def bulk_finished(self, succeeded, failed):
+        self.output_display.append_line(f"Bulk operation finished: {succeeded} succeeded, {failed} failed. "
+                                        "List the subvolumes again to see the result.")
+        device = self.device_combo.currentText()
+        if self.sender() is self.bulk_delete and succeeded and device != "Select a device":
+            # Space only comes back as the cleaner gets through the deleted subvolumes
+            self.start_cleaner(device)
+
+    def toggle_cleaner(self):
+        if self.cleaner.is_active():
+            self.cleaner.stop()
+            self.cleaner_button.setText("Watch Cleaner")
+            self.cleaner_label.setText("Not watching")
+            return
+        device = self.device_combo.currentText()
+        if device == "Select a device":
+            self.output_display.setPlainText("Please select a device.")
+            return
+        self.start_cleaner(device)
+
+    def start_cleaner(self, device):
+        self.cleaner.start(device)
+        self.cleaner_button.setText("Stop Watching")
+        self.cleaner_label.setText(f"Watching the cleaner on {device}...")
+
+    def show_cleaner_progress(self, progress):
+        self.cleaner_progress.setRange(0, max(progress.pending + progress.cleaned, 1))
+        self.cleaner_progress.setValue(progress.cleaned)
+        text = f"{progress.pending} deleted subvolumes pending, {progress.cleaned} cleaned"
+        if progress.subvolumes_per_minute > 0:
+            text += f", {progress.subvolumes_per_minute:.1f}/min"
+        text += f", {format_bytes(progress.bytes_freed)} freed"
+        if progress.bytes_per_second > 0:
+            text += f" ({format_bytes(progress.bytes_per_second)}/s)"
+        if progress.pending and progress.eta >= 0:
+            text += f", ETA {format_duration(progress.eta)}"
+        self.cleaner_label.setText(text)
+
+    def cleaner_done(self, path, freed):
+        self.cleaner_button.setText("Watch Cleaner")
+        self.output_display.append_line(f"Cleaner finished on {path}: {format_bytes(freed)} reclaimed.")
+
+    def append_line(self, text):
+        self.output_display.append_line(text)
+
+    def run_btrfs_command(self, command, timeout=None):
+        """Start the btrfs command and stream its output into the display."""
+        if self.runner.is_running():
+            self.output_display.append_line("A command is already running. Cancel it first.")
+            return
+        self.output_display.clear()
+        self.runner.run(['sudo', 'btrfs'] + command.split(), timeout, cache=True)
+
+    def append_output(self, text):
+        if self.list_parser is not None:
+            self.list_parser.feed_text(text)
+        else:
+            self.output_display.append_text(text)
+
+    def append_error(self, text):
+        self.output_display.append_text(text)
+
+    def command_finished(self, exit_code, status):
+        if self.list_parser is not None:
+            self.list_finished(exit_code, status)
+            return
+        self.output_display.finish()
+        if self.runner.from_cache:
+            self.output_display.append_line(f"(cached result from {self.runner.cache_age():.0f}s ago)")
+        message = describe_finish(exit_code, status)
+        if message:
+            self.output_display.append_line(message)
+
+    def list_finished(self, exit_code, status):
+        records = self.list_parser.finish()
+        self.list_parser = None
+        self.output_display.finish()
+        message = describe_finish(exit_code, status)
+        if exit_code != 0:
+            if message:
+                self.output_display.append_line(message)
+            # The first pass is enough for the tree; the otime pass is optional
+            if self.list_records:
+                self.show_subvolumes(self.list_records)
+            return
+        if self.runner.from_cache:
+            self.output_display.append_line(f"(cached result from {self.runner.cache_age():.0f}s ago)")
+        if '-s' not in self.runner.argv:
+            self.list_records = records
+            self.list_snapshot_times(self.runner.argv[-1])
+            return
+        otimes = {record.id: record.otime for record in records}
+        for record in self.list_records:
+            record.otime = otimes.get(record.id, record.otime)
+        self.show_subvolumes(self.list_records)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = BtrfsSubvolumeGUI()
+    window.back_requested.connect(window.close)
     window.show()
     sys.exit(app.exec())
@@ -0,0 +1,246 @@
+from bisect import bisect_left, bisect_right
+from PyQt6.QtCore import Qt, QAbstractItemModel, QModelIndex
+
+
+class SubvolumeNode:
+    """One subvolume in the tree; children are attached to the model lazily."""
+
+    __slots__ = ("record", "parent", "children", "loaded", "row")
+
+    def __init__(self, record, parent=None):
+        self.record = record
+        self.parent = parent
+        self.children = []
+        # Number of children already exposed to views through fetchMore()
+        self.loaded = 0
+        self.row = 0
+
+
+class PathIndex:
+    """Search the paths of every subvolume without walking the tree.
+
+    Prefix search bisects a sorted path list; substring search scans one
+    joined string with str.find, which runs in C, and maps each hit back
+    to its path through the sorted line offsets.
+    """
+
+    def __init__(self, records):
+        pairs = sorted((record.path, record.id) for record in records)
+        self.paths = [path for path, _ in pairs]
+        self.ids = [subvolume_id for _, subvolume_id in pairs]
+        self.offsets = []
+        offset = 0
+        for path in self.paths:
+            self.offsets.append(offset)
+            offset += len(path) + 1
+        self.joined = "\n".join(self.paths)
+        self.folded = self.joined.lower()
+
+    def prefix(self, text, limit=None):
+        start = bisect_left(self.paths, text)
+        # Every path with this prefix sorts before text + U+10FFFF
+        end = bisect_right(self.paths, text + "\U0010ffff", start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return self.ids[start:end]
+
+    def substring(self, text, limit=None):
+        """Case-insensitive substring search, ids in path order."""
+        text = text.lower()
+        matches = []
+        if not text or "\n" in text:
+            return matches
+        position = self.folded.find(text)
+        while position >= 0:
+            line = bisect_right(self.offsets, position) - 1
+            matches.append(self.ids[line])
+            if limit is not None and len(matches) >= limit:
+                break
+            # Continue after the end of this path so every path matches once
+            next_line = line + 1
+            if next_line >= len(self.offsets):
+                break
+            position = self.folded.find(text, self.offsets[next_line])
+        return matches
+
+
+class SubvolumeTreeModel(QAbstractItemModel):
+    """Subvolumes as a tree built from parent ids, loaded into views in batches.
+
+    A node only reports FETCH_BATCH more children each time the view asks
+    through canFetchMore()/fetchMore(), so expanding a directory of
+    100k snapshots costs as much as showing the rows on screen. Sorting
+    reorders the children in memory; nothing is queried again.
+    """
+
+    COLUMNS = ["Path", "ID", "Gen", "CGen", "Otime", "Snapshot Of", "UUID"]
+    SORT_KEYS = [
+        lambda record: record.path,
+        lambda record: record.id,
+        lambda record: record.gen,
+        lambda record: record.cgen,
+        lambda record: record.otime,
+        lambda record: record.parent_uuid,
+        lambda record: record.uuid,
+    ]
+    FETCH_BATCH = 500
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # tree_root holds the tree; root is what views see, the tree or search results
+        self.tree_root = SubvolumeNode(None)
+        self.root = self.tree_root
+        self.nodes = {}
+        self.by_uuid = {}
+        self.path_index = PathIndex([])
+        self.searching = False
+        self.sort_column = 0
+        self.sort_order = Qt.SortOrder.AscendingOrder
+
+    # Loading
+
+    def set_subvolumes(self, records):
+        """Replace the tree with records from SubvolumeListParser."""
+        self.beginResetModel()
+        self.tree_root = self.root = SubvolumeNode(None)
+        self.nodes = {record.id: SubvolumeNode(record) for record in records}
+        self.by_uuid = {record.uuid: record for record in records if record.uuid}
+        for node in self.nodes.values():
+            record = node.record
+            # -p gives the containing subvolume; top level is the fallback
+            parent = self.nodes.get(record.parent or record.top_level, self.root)
+            if parent is node:
+                parent = self.root
+            node.parent = parent
+            parent.children.append(node)
+        self.path_index = PathIndex(records)
+        self.searching = False
+        self.sort_tree()
+        self.endResetModel()
+
+    def sort_children(self, node):
+        key = self.SORT_KEYS[self.sort_column]
+        if len(node.children) > 1:
+            node.children.sort(key=lambda child: key(child.record),
+                               reverse=self.sort_order == Qt.SortOrder.DescendingOrder)
+        node.loaded = 0
+
+    def sort_tree(self):
+        for node in [self.tree_root, *self.nodes.values()]:
+            self.sort_children(node)
+            for row, child in enumerate(node.children):
+                child.row = row
+
+    def set_search(self, text, prefix=False):
+        """Show only the subvolumes whose path matches, as a flat list; "" restores the tree."""
+        self.beginResetModel()
+        if text:
+            ids = self.path_index.prefix(text) if prefix else self.path_index.substring(text)
+            # Results keep their place in the tree; they are only listed under a separate root
+            self.root = SubvolumeNode(None)
+            self.root.children = [self.nodes[subvolume_id] for subvolume_id in ids]
+            self.searching = True
+            self.sort_children(self.root)
+        else:
+            self.root = self.tree_root
+            self.searching = False
+            self.sort_tree()
+        self.endResetModel()
+        return len(self.root.children)
+
+    def record(self, index):
+        node = self.node(index)
+        return node.record if node is not self.root else None
+
+    def node(self, index):
+        return index.internalPointer() if index.isValid() else self.root
+
+    # QAbstractItemModel
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self.node(parent)
+        if row < 0 or row >= node.loaded or column < 0 or column >= len(self.COLUMNS):
+            return QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        node = index.internalPointer()
+        if self.searching or node.parent is None or node.parent is self.tree_root:
+            return QModelIndex()
+        return self.createIndex(node.parent.row, 0, node.parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        node = self.node(parent)
+        if self.searching and node is not self.root:
+            return 0
+        return node.loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.COLUMNS)
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self.node(parent)
+        if self.searching and node is not self.root:
+            return False
+        return bool(node.children)
+
+    def canFetchMore(self, parent):
+        node = self.node(parent)
+        if self.searching and node is not self.root:
+            return False
+        return node.loaded < len(node.children)
+
+    def fetchMore(self, parent):
+        node = self.node(parent)
+        count = min(self.FETCH_BATCH, len(node.children) - node.loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(parent, node.loaded, node.loaded + count - 1)
+        node.loaded += count
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return None
+        record = index.internalPointer().record
+        column = index.column()
+        if column == 0:
+            if role == Qt.ItemDataRole.ToolTipRole or self.searching:
+                return record.path
+            parent = index.internalPointer().parent.record
+            # Show the path relative to the containing subvolume
+            if parent is not None and record.path.startswith(parent.path + "/"):
+                return record.path[len(parent.path) + 1:]
+            return record.path
+        if column == 1:
+            return str(record.id)
+        if column == 2:
+            return str(record.gen)
+        if column == 3:
+            return str(record.cgen) if record.cgen else ""
+        if column == 4:
+            return record.otime
+        if column == 5:
+            origin = self.by_uuid.get(record.parent_uuid)
+            return origin.path if origin is not None else record.parent_uuid
+        return record.uuid
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        """Reorder every child list in memory; views refetch from the first batch."""
+        self.beginResetModel()
+        self.sort_column = column
+        self.sort_order = order
+        if self.searching:
+            self.sort_children(self.root)
+        else:
+            self.sort_tree()
+        self.endResetModel()